@@ -1,57 +1,125 @@
 from __future__ import annotations
 
-import time
-from typing import Callable, Generator
+import asyncio
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, ContextManager, Generator, Iterator, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import StreamingResponse
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.db.models import ChatMessage, ChatSession
-from app.db.session import get_session
+from app.core.deadline import Deadline
+from app.core.rate_limit import RateLimiter, build_rate_limit_store
+from app.db.models import ChatSession
+from app.db.session import engine, get_session, pool_stats, read_engine
+from app.db.writer import WriteBehindWriter
+from app.llm.admission import AdmissionControlledLLMClient, AdmissionController, AdmissionRejected
+from app.llm.hedged import HedgedLLMClient, LLMBackend, latency_registry
 from app.llm.mock_provider import MockProvider
 from app.llm.openai_provider import OpenAIProvider
+from app.llm.routing import ModelRouter
 from app.llm.embeddings import EmbeddingClient, OpenAIEmbeddingClient, MockEmbeddingClient
+from app.llm.fixtures import RecordingEmbeddingClient, RecordingLLMClient, open_fixture_store
 from app.schemas.chat import (
+    BatchChatRequest,
     ChatRequest,
     ChatResponse,
+    MessagePage,
     MessageSchema,
     SessionCreateResponse,
     SessionSchema,
 )
-from app.services.entity_resolver import EntityResolver, LLMEntityResolver
-from app.services.orchestrator import ChatOrchestrator
+from app.services.entity_resolver import EntityCandidateCache, EntityResolver, LLMEntityResolver
+from app.services.followup import FollowUpTracker
+from app.services.history import HistoryCache, HistoryService
+from app.services.orchestrator import ChatOrchestrator, ConversationContext
 from app.services.retrieval import RetrievalService
 from app.services.query_classifier import QueryClassifier
+from app.services.quota import TokenQuota
+from app.services.sessions import authorize_session, decode_cursor, load_session_page
+from app.services.stream_buffer import InMemoryStreamBuffer, ResumableStreams, StreamsBusy, parse_last_event_id
 
 
 router = APIRouter(prefix="/v1")
 
 
-class RateLimiter:
-    """Simple in-memory rate limiter. TODO: replace with Redis/centralized store."""
-    def __init__(self, limit: int = 60):
-        self.limit = limit
-        self.bucket = {}
-
-    def check(self, key: str) -> None:
-        now = time.time()
-        window_start = now - 60
-        timestamps = [t for t in self.bucket.get(key, []) if t > window_start]
-        if len(timestamps) >= self.limit:
-            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Rate limit exceeded")
-        timestamps.append(now)
-        self.bucket[key] = timestamps
-
-
-rate_limiter = RateLimiter(limit=settings.rate_limit_per_minute)
+rate_limiter = RateLimiter(
+    build_rate_limit_store(
+        settings.rate_limit_backend,
+        settings.rate_limit_redis_url,
+        shards=settings.rate_limit_shards,
+        max_keys=settings.rate_limit_max_keys,
+    ),
+    limit=settings.rate_limit_per_minute,
+    burst=settings.rate_limit_burst or None,
+    scopes=settings.rate_limit_keys,
+)
+token_quota = (
+    TokenQuota(
+        rate_limiter.store,
+        tokens=settings.token_quota_tokens,
+        window=settings.token_quota_window_seconds,
+        scopes=settings.token_quota_keys,
+    )
+    if settings.token_quota_tokens
+    else None
+)
+resumable_streams = ResumableStreams(
+    InMemoryStreamBuffer(
+        max_events=settings.stream_buffer_max_events,
+        ttl_seconds=settings.stream_buffer_ttl_seconds,
+        max_streams=settings.stream_buffer_max_streams,
+    ),
+    heartbeat_interval=settings.stream_heartbeat_seconds,
+    max_producers=settings.stream_max_producers,
+)
+admission_controller = AdmissionController(
+    global_limit=settings.llm_max_concurrency,
+    provider_limits=settings.llm_provider_max_concurrency,
+    max_queue=settings.llm_max_queue,
+    max_wait=settings.llm_queue_timeout_ms / 1000,
+)
+chat_writer = (
+    WriteBehindWriter(
+        get_session,
+        batch_size=settings.persistence_batch_size,
+        flush_interval=settings.persistence_flush_interval_ms / 1000,
+        max_queue=settings.persistence_max_queue,
+        max_retries=settings.persistence_max_retries,
+        retry_backoff=settings.persistence_retry_backoff_ms / 1000,
+    )
+    if settings.persistence_enabled
+    else None
+)
+entity_candidate_cache = EntityCandidateCache(
+    ttl_seconds=settings.entity_candidate_cache_ttl_seconds,
+    max_keys=settings.entity_candidate_cache_max_keys,
+)
+history_cache = HistoryCache(max_sessions=settings.history_cache_sessions)
+followup_tracker = FollowUpTracker(
+    max_sessions=settings.followup_cache_sessions,
+    reuse_similarity=settings.followup_reuse_similarity,
+    delta_similarity=settings.followup_delta_similarity,
+    delta_limit=settings.followup_delta_limit,
+)
+_ws_turn_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="ws-turn")
 
 
 def rate_limit_dependency(request: Request):
     client_ip = request.client.host if request.client else "unknown"
-    rate_limiter.check(client_ip)
+    rate_limiter.check_scopes(ip=client_ip)
+
+
+def _request_deadline(deadline_ms: Optional[int]) -> Deadline:
+    """Deadline starting now: the client's budget if given, capped at the configured maximum."""
+    budget_ms = deadline_ms if deadline_ms and deadline_ms > 0 else settings.request_deadline_ms
+    return Deadline(min(budget_ms, settings.request_deadline_max_ms) / 1000)
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -59,39 +127,94 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
-def get_llm_client():
-    if settings.llm_provider == "openai":
+def get_session_factory() -> Callable[[], ContextManager[Session]]:
+    """Factory for handlers that need one DB session per worker thread."""
+    return get_session
+
+
+def _build_provider(provider: str):
+    if provider == "openai":
         if not settings.openai_api_key:
             raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-        return OpenAIProvider(api_key=settings.openai_api_key)
-    return MockProvider()
+        client = OpenAIProvider(api_key=settings.openai_api_key, timeout=settings.llm_timeout_seconds)
+        if settings.mock_fixture_mode == "record" and settings.mock_fixture_dir:
+            return RecordingLLMClient(client, open_fixture_store(settings.mock_fixture_dir))
+        return client
+    return MockProvider.from_settings()
+
+
+def _with_admission(client, provider: str):
+    return AdmissionControlledLLMClient(client, admission_controller, provider=provider)
+
+
+def get_llm_client():
+    primary = _build_provider(settings.llm_provider)
+    if not settings.llm_fallback_models:
+        return primary
+    backends = [LLMBackend(name=settings.llm_provider, client=_with_admission(primary, settings.llm_provider))]
+    for spec in settings.llm_fallback_models:
+        provider, _, model = spec.partition(":")
+        backends.append(
+            LLMBackend(
+                name=spec,
+                client=_with_admission(_build_provider(provider), provider),
+                model=model or None,
+            )
+        )
+    return HedgedLLMClient(
+        backends,
+        hedge_enabled=settings.llm_hedge_enabled,
+        hedge_min_delay=settings.llm_hedge_min_delay_ms / 1000,
+        hedge_default_delay=settings.llm_hedge_default_delay_ms / 1000,
+    )
 
 
 def get_embedding_client() -> EmbeddingClient:
     if settings.llm_provider == "openai":
         if not settings.openai_api_key:
             raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-        return OpenAIEmbeddingClient(api_key=settings.openai_api_key, model=settings.embedding_model)
-    return MockEmbeddingClient()
+        client = OpenAIEmbeddingClient(api_key=settings.openai_api_key, model=settings.embedding_model)
+        if settings.mock_fixture_mode == "record" and settings.mock_fixture_dir:
+            return RecordingEmbeddingClient(client, open_fixture_store(settings.mock_fixture_dir))
+        return client
+    return MockEmbeddingClient.from_settings()
 
 
 def get_orchestrator():
     llm_client = get_llm_client()
+    if not isinstance(llm_client, HedgedLLMClient):
+        # Hedged backends are admitted one by one in get_llm_client.
+        llm_client = _with_admission(llm_client, settings.llm_provider)
     embedding_client = get_embedding_client()
+    router = ModelRouter()
     if settings.entity_resolution_mode == "llm":
         resolver = LLMEntityResolver(
             llm_client=llm_client,
             candidate_limit=settings.entity_resolution_candidate_limit,
+            router=router,
+            candidate_cache=entity_candidate_cache,
         )
     else:
-        resolver = EntityResolver()
+        resolver = EntityResolver(candidate_cache=entity_candidate_cache)
 
     return ChatOrchestrator(
         entity_resolver=resolver,
         retrieval_service=RetrievalService(),
-        query_classifier=QueryClassifier(llm_client),
+        query_classifier=QueryClassifier(llm_client, router=router),
         llm_client=llm_client,
         embedding_client=embedding_client,
+        router=router,
+        writer=chat_writer,
+        history_service=HistoryService(
+            history_cache,
+            llm_client=llm_client,
+            router=router,
+            writer=chat_writer,
+            token_budget=settings.history_token_budget,
+            max_messages=settings.history_window,
+        ),
+        followups=followup_tracker,
+        token_quota=token_quota,
     )
 
 
@@ -107,48 +230,321 @@ def create_session(
     return SessionCreateResponse(session_id=str(session.id))
 
 
+def _parse_session_id(session_id: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(session_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+
+def _session_page(db: Session, session_id: str, user_id: Optional[str], limit: int, before: Optional[str]):
+    """One page of a session's messages, after the same owner check as a chat turn (404/403)."""
+    authorize_session(db, session_id, user_id, claim=False)
+    cursor = None
+    if before:
+        try:
+            cursor = decode_cursor(before)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+    page = load_session_page(db, _parse_session_id(session_id), limit, before=cursor)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return page
+
+
 @router.get("/sessions/{session_id}", response_model=SessionSchema)
 def get_session_detail(
     session_id: str,
+    limit: Optional[int] = Query(default=None, ge=1),
+    user_id: Optional[str] = None,
     db: Session = Depends(get_db),
     _: None = Depends(rate_limit_dependency),
 ):
-    session = db.get(ChatSession, session_id)
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-    stmt = (
-        select(ChatMessage)
-        .where(ChatMessage.session_id == session_id)
-        .order_by(ChatMessage.created_at.desc())
-        .limit(settings.history_window)
+    page = _session_page(
+        db, session_id, user_id, min(limit or settings.history_window, settings.messages_page_max), None
+    )
+    return JSONResponse(
+        jsonable_encoder({**page.session, "messages": page.messages, "next_cursor": page.next_cursor})
+    )
+
+
+@router.get("/sessions/{session_id}/messages", response_model=MessagePage)
+def list_session_messages(
+    session_id: str,
+    limit: int = Query(default=50, ge=1),
+    before: Optional[str] = None,
+    user_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+    _: None = Depends(rate_limit_dependency),
+):
+    """Messages oldest-first; pass `next_cursor` back as `before` to page further into the past."""
+    page = _session_page(db, session_id, user_id, min(limit, settings.messages_page_max), before)
+    return JSONResponse(jsonable_encoder({"messages": page.messages, "next_cursor": page.next_cursor}))
+
+
+def _sse_response(stream_id: str, after_seq: int = -1) -> StreamingResponse:
+    return StreamingResponse(
+        resumable_streams.subscribe(stream_id, after_seq),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Stream-Id": stream_id,
+        },
     )
-    messages = list(reversed(db.scalars(stmt).all()))
-    session.messages = messages
-    return session
 
 
 @router.post("/chat", response_model=ChatResponse)
 def chat(
     payload: ChatRequest,
+    request: Request,
     db: Session = Depends(get_db),
+    session_factory: Callable[[], ContextManager[Session]] = Depends(get_session_factory),
     orchestrator: ChatOrchestrator = Depends(get_orchestrator),
+    last_event_id: Optional[str] = Header(default=None),
+    x_request_deadline_ms: Optional[int] = Header(default=None),
     _: None = Depends(rate_limit_dependency),
 ):
+    rate_limiter.check_scopes(user=payload.user_id, session=payload.session_id)
+    deadline = _request_deadline(x_request_deadline_ms)
+    client_ip = request.client.host if request.client else None
+    if payload.stream:
+        # A reconnect resumes the buffered (or still running) generation instead of paying for a new one.
+        resume = parse_last_event_id(last_event_id)
+        if resume and resumable_streams.exists(resume[0]):
+            return _sse_response(*resume)
+    # Shed load before doing any work if the LLM queue is already past its deadline.
+    admission_controller.precheck(settings.llm_provider)
     try:
         if payload.stream:
-            return StreamingResponse(
-                orchestrator.stream_chat(db, payload),
-                media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "X-Accel-Buffering": "no",
-                },
-            )
-        return orchestrator.handle_chat(db, payload)
+            # Checked here too so a bad session gets a 404/403 status rather than an error event.
+            with session_factory() as check_db:
+                authorize_session(check_db, payload.session_id, payload.user_id)
+            stream_id = uuid.uuid4().hex
+
+            def events():
+                with session_factory() as stream_db:
+                    yield from orchestrator.stream_events(stream_db, payload, deadline=deadline, client_ip=client_ip)
+
+            try:
+                resumable_streams.start(stream_id, events)
+            except StreamsBusy as exc:
+                raise HTTPException(
+                    status_code=503, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+                ) from exc
+            return _sse_response(stream_id)
+        return orchestrator.handle_chat(db, payload, deadline, client_ip=client_ip)
     except ValueError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
 
 
+@router.get("/chat/streams/{stream_id}")
+def resume_stream(
+    stream_id: str,
+    after: Optional[int] = None,
+    last_event_id: Optional[str] = Header(default=None),
+    _: None = Depends(rate_limit_dependency),
+):
+    if not resumable_streams.exists(stream_id):
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    resume = parse_last_event_id(last_event_id)
+    after_seq = after if after is not None else (resume[1] if resume and resume[0] == stream_id else -1)
+    return _sse_response(stream_id, after_seq)
+
+
+@router.post("/chat/batch")
+def chat_batch(
+    payload: BatchChatRequest,
+    session_factory: Callable[[], ContextManager[Session]] = Depends(get_session_factory),
+    orchestrator: ChatOrchestrator = Depends(get_orchestrator),
+    _: None = Depends(rate_limit_dependency),
+):
+    if len(payload.requests) > settings.batch_max_requests:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {settings.batch_max_requests} requests",
+        )
+    admission_controller.precheck(settings.llm_provider)
+    concurrency = min(payload.concurrency or settings.batch_concurrency, settings.batch_max_concurrency)
+
+    def results() -> Generator[str, None, None]:
+        for index, result in orchestrator.handle_batch(session_factory, payload.requests, concurrency):
+            if isinstance(result, Exception):
+                line = {"index": index, "error": str(result), "error_type": type(result).__name__}
+            else:
+                line = {"index": index, "response": result.model_dump(by_alias=True)}
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+# Close codes for a failed bind; 4000-4999 are reserved for applications.
+_WS_CLOSE_CODES = {403: 4403, 404: 4404, 429: 1008}
+
+
+def _bind_session(session_factory: Callable[[], ContextManager[Session]], message: Any) -> Tuple[str, Optional[str]]:
+    """(session_id, user_id) the connection is bound to; every turn runs as that user."""
+    if not isinstance(message, dict) or message.get("type") != "bind" or not message.get("session_id"):
+        raise HTTPException(status_code=400, detail="First message must be {\"type\": \"bind\", \"session_id\": ...}")
+    with session_factory() as db:
+        session = authorize_session(db, message["session_id"], message.get("user_id"))
+        return str(session.id), session.user_id
+
+
+async def _run_turn(
+    websocket: WebSocket,
+    turn_id: str,
+    events_factory: Callable[[], Iterator[Tuple[str, Any]]],
+    cancelled: threading.Event,
+) -> None:
+    """Run one blocking turn in a worker thread and forward its events to the socket."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def put(item) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # Event loop already closed; the connection is gone.
+            cancelled.set()
+
+    def produce() -> None:
+        events = events_factory()
+        try:
+            for event, data in events:
+                if cancelled.is_set():
+                    put(("cancelled", {}))
+                    return
+                put((event, data))
+        except Exception as exc:
+            put(("error", {"detail": str(exc) or type(exc).__name__}))
+        finally:
+            # Closing the generator stops the upstream LLM stream as well.
+            events.close()
+            put(None)
+
+    loop.run_in_executor(_ws_turn_executor, produce)
+    try:
+        while (item := await queue.get()) is not None:
+            event, data = item
+            await websocket.send_json({"type": "event", "turn_id": turn_id, "event": event, "data": data})
+    except Exception:
+        cancelled.set()
+        raise
+
+
+@router.websocket("/ws/chat")
+async def chat_websocket(
+    websocket: WebSocket,
+    session_factory: Callable[[], ContextManager[Session]] = Depends(get_session_factory),
+    orchestrator: ChatOrchestrator = Depends(get_orchestrator),
+):
+    """Multi-turn chat over one connection.
+
+    The client binds a session once with `{"type": "bind", "session_id", "user_id"}`,
+    then sends `{"type": "chat", "message", "city", "state", "deadline_ms"}` per turn and may send
+    `{"type": "cancel"}` to stop the turn in progress. Entity and retrieval state
+    stay warm between turns of the connection.
+    """
+    await websocket.accept()
+    client_ip = websocket.client.host if websocket.client else "unknown"
+    try:
+        rate_limiter.check_scopes(ip=client_ip)
+        session_id, user_id = await run_in_threadpool(_bind_session, session_factory, await websocket.receive_json())
+    except HTTPException as exc:
+        await websocket.send_json({"type": "error", "status": exc.status_code, "detail": exc.detail})
+        await websocket.close(code=_WS_CLOSE_CODES.get(exc.status_code, 1008))
+        return
+    except (WebSocketDisconnect, ValueError):
+        return
+    await websocket.send_json({"type": "bound", "session_id": session_id})
+
+    conversation = orchestrator.for_connection()
+    context = ConversationContext()
+    turn: Optional[asyncio.Task] = None
+    cancelled = threading.Event()
+    try:
+        while True:
+            message = await websocket.receive_json()
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "cancel":
+                cancelled.set()
+                continue
+            if kind != "chat":
+                await websocket.send_json({"type": "error", "status": 400, "detail": f"Unknown message type: {kind}"})
+                continue
+            if turn is not None and not turn.done():
+                await websocket.send_json({"type": "error", "status": 409, "detail": "A turn is already in progress"})
+                continue
+            try:
+                rate_limiter.check_scopes(ip=client_ip, user=user_id, session=session_id)
+                admission_controller.precheck(settings.llm_provider)
+                payload = ChatRequest(
+                    session_id=session_id,
+                    user_id=user_id,
+                    message=message.get("message", ""),
+                    city=message.get("city"),
+                    state=message.get("state"),
+                    stream=True,
+                )
+                deadline_ms = message.get("deadline_ms")
+                if deadline_ms is not None and type(deadline_ms) is not int:
+                    raise ValueError("deadline_ms must be an integer number of milliseconds")
+                turn_deadline = _request_deadline(deadline_ms)
+            except HTTPException as exc:
+                await websocket.send_json({"type": "error", "status": exc.status_code, "detail": exc.detail})
+                continue
+            except AdmissionRejected as exc:
+                await websocket.send_json(
+                    {"type": "error", "status": 503, "detail": str(exc), "retry_after": exc.retry_after_seconds}
+                )
+                continue
+            except ValueError as exc:
+                await websocket.send_json({"type": "error", "status": 422, "detail": str(exc)})
+                continue
+
+            def events(payload: ChatRequest = payload, deadline: Deadline = turn_deadline):
+                with session_factory() as db:
+                    yield from conversation.stream_events(
+                        db, payload, context=context, deadline=deadline, client_ip=client_ip
+                    )
+
+            cancelled = threading.Event()
+            turn_id = uuid.uuid4().hex
+            await websocket.send_json({"type": "turn", "turn_id": turn_id})
+            turn = asyncio.create_task(_run_turn(websocket, turn_id, events, cancelled))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        cancelled.set()
+        if turn is not None and not turn.done():
+            turn.cancel()
+
+
+@router.get("/llm/stats")
+def llm_stats(_: None = Depends(rate_limit_dependency)):
+    return {
+        "admission": admission_controller.stats(),
+        "latency": latency_registry.snapshot(),
+        "streams": resumable_streams.stats(),
+    }
+
+
+@router.get("/persistence/stats")
+def persistence_stats(_: None = Depends(rate_limit_dependency)):
+    if chat_writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **chat_writer.stats()}
+
+
+@router.get("/db/stats")
+def db_stats(_: None = Depends(rate_limit_dependency)):
+    stats = {"primary": pool_stats(engine)}
+    if read_engine is not engine:
+        stats["replica"] = pool_stats(read_engine)
+    return stats
+
+
 @router.get("/healthz")
 def healthcheck():
     return {"status": "ok"}
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's time budget runs out; `stage` names the step that hit it."""
+
+    def __init__(self, stage: str, budget: float, elapsed: float):
+        self.stage = stage
+        self.budget = budget
+        self.elapsed = elapsed
+        super().__init__(f"Request deadline of {budget:.1f}s exceeded during {stage}")
+
+
+class Deadline:
+    """Time budget for one request, shared by every stage of the pipeline.
+
+    The orchestrator calls `begin` as it enters each stage; anything that runs
+    out of time afterwards reports that stage. Blocking calls (HTTP requests,
+    SQL statements) are bounded with `timeout`.
+    """
+
+    def __init__(self, budget: float, clock=time.monotonic):
+        self.budget = budget
+        self.stage = "request"
+        self._clock = clock
+        self.started = clock()
+
+    def elapsed(self) -> float:
+        return self._clock() - self.started
+
+    def remaining(self) -> float:
+        return max(0.0, self.budget - self.elapsed())
+
+    def exceeded(self) -> DeadlineExceeded:
+        return DeadlineExceeded(self.stage, self.budget, self.elapsed())
+
+    def check(self) -> None:
+        if self.remaining() <= 0:
+            raise self.exceeded()
+
+    def begin(self, stage: str) -> None:
+        self.stage = stage
+        self.check()
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Seconds a call may block: what is left of the budget, at most `cap`."""
+        self.check()
+        remaining = self.remaining()
+        return min(remaining, cap) if cap is not None else remaining
+
+    def max_tokens(self, requested: int, tokens_per_second: float, minimum: int = 16) -> int:
+        """Shrink `requested` to what can be generated in the remaining time.
+
+        Raises `DeadlineExceeded` when not even `minimum` tokens would fit, since
+        such an answer would be cut off mid-sentence anyway.
+        """
+        if tokens_per_second <= 0:
+            self.check()
+            return requested
+        affordable = int(self.timeout() * tokens_per_second)
+        if affordable < min(minimum, requested):
+            raise self.exceeded()
+        return min(requested, affordable)
+
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline of the request being handled in this context, if any."""
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Make `deadline` visible to clients (LLM, embeddings) called inside the block."""
+    previous = _current.get()
+    # set() rather than a reset token: generators may resume the block in another context.
+    _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.set(previous)
+
+
+def call_timeout(default: Optional[float]) -> Optional[float]:
+    """Per-call client timeout: the configured default, tightened by the current deadline."""
+    deadline = current_deadline()
+    if deadline is None:
+        return default
+    return deadline.timeout(default)
+
+
+def bounded_sleep(seconds: float) -> None:
+    """time.sleep that gives up, raising DeadlineExceeded, once the current deadline passes."""
+    deadline = current_deadline()
+    if deadline is None or seconds <= deadline.remaining():
+        time.sleep(seconds)
+        return
+    time.sleep(deadline.remaining())
+    raise deadline.exceeded()
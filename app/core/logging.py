@@ -1,39 +1,123 @@
+"""structlog setup: sampled events, bounded payloads and background log shipping.
+
+Request threads only run the cheap processors (level filter, sampling,
+timestamp) and put the record on a bounded queue. A `QueueListener` thread
+renders it to JSON and writes it to stdout. When the queue is full, records
+are dropped and counted in `log_records_dropped_total`, so a slow stdout
+never blocks a request.
+"""
+
 from __future__ import annotations
 
+import atexit
+import heapq
 import logging
+import queue
+import random
 import sys
 import uuid
-from typing import Callable
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, List, Mapping, Optional, Sequence
 
 import structlog
 from fastapi import Request
 
 from app.core.config import settings
+from app.core.metrics import registry
+
+
+log_records_dropped = registry.counter("log_records_dropped", "Log records dropped because the log queue was full")
+
+_listener: Optional[QueueListener] = None
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Enqueues records unformatted and drops them instead of blocking when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc()
+
+
+def sample_events(rates: Mapping[str, float], rng: Callable[[], float] = random.random):
+    """Processor that keeps each event named in `rates` with that probability."""
+
+    def processor(logger, method_name, event_dict):
+        rate = rates.get(event_dict.get("event"))
+        if rate is not None and rng() >= rate:
+            raise structlog.DropEvent
+        return event_dict
+
+    return processor
+
+
+def top_candidates(candidates: Sequence[Dict], k: int) -> List[Dict]:
+    """The `k` best-scored candidates (input order among ties); everything when `k` <= 0."""
+    if k <= 0 or len(candidates) <= k:
+        return list(candidates)
+    return heapq.nlargest(k, candidates, key=lambda candidate: candidate.get("score") or 0)
 
 
 def configure_logging() -> None:
-    logging.basicConfig(
-        level=getattr(logging, settings.log_level.upper(), logging.INFO),
-        format="%(message)s",
-        stream=sys.stdout,
+    global _listener
+    level = getattr(logging, settings.log_level.upper(), logging.INFO)
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(
+        structlog.stdlib.ProcessorFormatter(
+            processors=[
+                structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+                structlog.processors.JSONRenderer(),
+            ],
+            foreign_pre_chain=[structlog.processors.TimeStamper(fmt="iso"), structlog.stdlib.add_log_level],
+        )
     )
+    shutdown_logging()
+    if settings.log_queue_size > 0:
+        records: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=settings.log_queue_size)
+        handler: logging.Handler = DroppingQueueHandler(records)
+        _listener = QueueListener(records, stream_handler, respect_handler_level=False)
+        _listener.start()
+    else:
+        handler = stream_handler
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
 
     structlog.configure(
         processors=[
+            sample_events(settings.log_sample_rates),
             structlog.processors.TimeStamper(fmt="iso"),
             structlog.stdlib.add_log_level,
             structlog.processors.StackInfoRenderer(),
             structlog.processors.format_exc_info,
-            structlog.processors.JSONRenderer(),
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
         ],
-        wrapper_class=structlog.make_filtering_bound_logger(
-            getattr(logging, settings.log_level.upper(), logging.INFO)
-        ),
+        wrapper_class=structlog.make_filtering_bound_logger(level),
         logger_factory=structlog.stdlib.LoggerFactory(),
         cache_logger_on_first_use=True,
     )
 
 
+def shutdown_logging() -> None:
+    """Drain the queue and stop the writer thread; later records are written inline."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().handlers = list(_listener.handlers)
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
 def request_id_middleware(app):
     @app.middleware("http")
     async def add_request_id(request: Request, call_next: Callable):
@@ -0,0 +1,231 @@
+"""Opt-in per-request profiling with collapsed-stack output.
+
+A request is profiled when it carries `X-Profile-Token: <PROFILING_TOKEN>`, or
+at random with probability `PROFILING_SAMPLE_RATE`. While it runs, a sampler
+thread records the Python stacks of the threads working on that request. Those
+are the request thread and the stream producer, which joins through
+`attach()`. The same request also gets per-statement SQL timings.
+
+Each profile writes two files to `PROFILING_DIR`:
+- `<name>.folded`: collapsed stacks, the input format of flamegraph.pl and speedscope.
+- `<name>.json`: the request, the sample count and the SQL summary.
+
+Only one request is profiled at a time. Only the newest
+`PROFILING_MAX_PROFILES` profiles are kept.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import hmac
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+import structlog
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.background import BackgroundTasks
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+
+log = structlog.get_logger()
+
+_current: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("profile", default=None)
+_active = threading.Lock()
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+
+def collapse(frame) -> str:
+    """Root-first `module.func;module.func` stack of `frame`."""
+    names: List[str] = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RequestProfile:
+    """Stack samples and SQL timings for one request."""
+
+    def __init__(self, label: str, interval: float):
+        self.label = label
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.sql: Dict[str, Dict[str, float]] = {}
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self._threads: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._sampler.start()
+
+    def stop(self) -> bool:
+        """Stop sampling; False if the profile was already stopped."""
+        with self._lock:
+            if self._stop.is_set():
+                return False
+            self._stop.set()
+        self._sampler.join()
+        self.elapsed = time.perf_counter() - self.started
+        return True
+
+    def add_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads.add(ident)
+
+    def remove_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads.discard(ident)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                threads = list(self._threads)
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[collapse(frame)] += 1
+
+    def record_sql(self, statement: str, seconds: float) -> None:
+        key = " ".join(statement.split())[:300]
+        with self._lock:
+            entry = self.sql.setdefault(key, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += seconds * 1000
+            entry["max_ms"] = max(entry["max_ms"], seconds * 1000)
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        statements = sorted(self.sql.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+        return {
+            "request": self.label,
+            "elapsed_ms": round(self.elapsed * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": sum(self.stacks.values()),
+            "sql_total_ms": round(sum(entry["total_ms"] for _, entry in statements), 1),
+            "sql": [
+                {"statement": statement, **{name: round(value, 2) for name, value in entry.items()}}
+                for statement, entry in statements
+            ],
+        }
+
+
+@contextmanager
+def attach() -> Iterator[None]:
+    """Include the calling thread in the current request's profile, if there is one."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    ident = threading.get_ident()
+    profile.add_thread(ident)
+    try:
+        yield
+    finally:
+        profile.remove_thread(ident)
+
+
+def write_profile(profile: RequestProfile, directory: Path, max_profiles: int) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    (directory / f"{name}.folded").write_text(profile.folded(), encoding="utf-8")
+    (directory / f"{name}.json").write_text(json.dumps(profile.summary(), indent=2), encoding="utf-8")
+    profiles = sorted(directory.glob("*.folded"), key=lambda path: path.stat().st_mtime)
+    for stale in profiles[: max(0, len(profiles) - max(1, max_profiles))]:
+        stale.unlink(missing_ok=True)
+        stale.with_suffix(".json").unlink(missing_ok=True)
+    return directory / f"{name}.folded"
+
+
+def _wanted(request: Request) -> bool:
+    token = request.headers.get("x-profile-token")
+    if token and settings.profiling_token and hmac.compare_digest(token, settings.profiling_token):
+        return True
+    return settings.profiling_sample_rate > 0 and random.random() < settings.profiling_sample_rate
+
+
+def _finish(profile: RequestProfile) -> None:
+    """Stop `profile`, free the profiling slot and write it out; later calls are no-ops."""
+    if not profile.stop():
+        return
+    _active.release()
+    path = write_profile(profile, Path(settings.profiling_dir), settings.profiling_max_profiles)
+    log.info("profiling.written", path=str(path), request=profile.label, elapsed_ms=round(profile.elapsed * 1000, 1))
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time each statement run on behalf of a profiled request."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            context._profile_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_profile_started", None)
+        profile = _current.get()
+        if started is not None and profile is not None:
+            profile.record_sql(statement, time.perf_counter() - started)
+
+
+def configure_profiling(app, engines) -> None:
+    if not (settings.profiling_token or settings.profiling_sample_rate > 0):
+        return
+    for engine in engines:
+        instrument_engine(engine)
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if not _wanted(request) or not _active.acquire(blocking=False):
+            return await call_next(request)
+        profile = RequestProfile(f"{request.method} {request.url.path}", settings.profiling_interval_ms / 1000)
+        token = _current.set(profile)
+        profile.start()
+        handed_off = False
+        try:
+            response = await call_next(request)
+            # The body (SSE in particular) is still being produced after the headers go out,
+            # so the profile ends with the body, or after sending if the body is never iterated.
+            body = response.body_iterator
+
+            async def profiled_body():
+                try:
+                    async for chunk in body:
+                        yield chunk
+                finally:
+                    await run_in_threadpool(_finish, profile)
+
+            response.body_iterator = profiled_body()
+            background = BackgroundTasks()
+            background.add_task(_finish, profile)
+            if response.background is not None:
+                background.add_task(response.background)
+            response.background = background
+            handed_off = True
+        finally:
+            _current.reset(token)
+            if not handed_off:
+                await run_in_threadpool(_finish, profile)
+        return response
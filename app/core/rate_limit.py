@@ -0,0 +1,251 @@
+"""GCRA rate limiting with an in-process or Redis-protocol store.
+
+GCRA (generic cell rate algorithm) keeps one number per key, the theoretical
+arrival time (TAT) of the next request. A request of weight `cost` moves TAT
+forward by `cost * emission` seconds and is allowed while TAT stays within
+`tolerance` of now, so `tolerance / emission` requests can burst at once and
+the long-run rate is one per `emission`. Each check is O(1) with no per-request history.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import socket
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, List, Optional, Protocol, Sequence, Tuple
+from urllib.parse import urlparse
+
+import structlog
+from fastapi import HTTPException, status
+
+
+log = structlog.get_logger()
+
+
+class RateLimitExceeded(HTTPException):
+    """429 with a Retry-After header."""
+
+    def __init__(self, key: str, retry_after: float):
+        self.key = key
+        self.retry_after = retry_after
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+class RateLimitStore(Protocol):
+    def acquire(self, key: str, emission: float, tolerance: float, cost: float, force: bool = False) -> float:
+        """Charge `cost` to `key`; 0.0 if allowed, else seconds until it would be.
+
+        With `force` the charge is applied regardless (negative costs refund) and
+        0.0 is returned; used to settle metered costs after the fact.
+        """
+        ...
+
+
+class InMemoryRateLimitStore:
+    """Per-process store: sharded locks, and keys are dropped once idle or over capacity.
+
+    A key whose TAT is in the past has fully recovered and is equivalent to an
+    absent key, so evicting it loses nothing. When a shard is still over
+    capacity the least recently used key goes first.
+    """
+
+    def __init__(self, shards: int = 16, max_keys: int = 100_000, clock=time.monotonic):
+        self._clock = clock
+        self._max_per_shard = max(1, max_keys // max(1, shards))
+        self._shards: List[Tuple[threading.Lock, "OrderedDict[str, float]"]] = [
+            (threading.Lock(), OrderedDict()) for _ in range(max(1, shards))
+        ]
+
+    def _shard(self, key: str) -> Tuple[threading.Lock, "OrderedDict[str, float]"]:
+        return self._shards[zlib.crc32(key.encode("utf-8")) % len(self._shards)]
+
+    def acquire(self, key: str, emission: float, tolerance: float, cost: float, force: bool = False) -> float:
+        lock, tats = self._shard(key)
+        with lock:
+            now = self._clock()
+            tat = max(tats.get(key, now), now)
+            new_tat = max(tat + emission * cost, now)
+            allow_at = new_tat - tolerance
+            if allow_at > now and not force:
+                return allow_at - now
+            tats[key] = new_tat
+            tats.move_to_end(key)
+            while tats:
+                oldest_key, oldest_tat = next(iter(tats.items()))
+                if oldest_tat > now and len(tats) <= self._max_per_shard:
+                    break
+                del tats[oldest_key]
+            return 0.0
+
+    def __len__(self) -> int:
+        return sum(len(tats) for _, tats in self._shards)
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class RespClient:
+    """Minimal RESP2 client; one connection per thread, reconnecting after errors."""
+
+    def __init__(self, url: str, timeout: float = 0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        conn = sock.makefile("rwb")
+        self._local.sock, self._local.conn = sock, conn
+        if self.password:
+            self._roundtrip(conn, ("AUTH", self.password))
+        if self.db:
+            self._roundtrip(conn, ("SELECT", self.db))
+        return conn
+
+    def close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = self._local.conn = None
+
+    def execute(self, *args: Any) -> Any:
+        conn = getattr(self._local, "conn", None) or self._connect()
+        try:
+            return self._roundtrip(conn, args)
+        except (OSError, EOFError):
+            self.close()
+            raise
+
+    @staticmethod
+    def _roundtrip(conn, args: Sequence[Any]) -> Any:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        conn.write(b"".join(parts))
+        conn.flush()
+        return RespClient._read(conn)
+
+    @staticmethod
+    def _read(conn) -> Any:
+        line = conn.readline()
+        if not line:
+            raise EOFError("connection closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise RespError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = conn.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(body)
+            return None if length < 0 else [RespClient._read(conn) for _ in range(length)]
+        raise RespError(f"unexpected reply {line!r}")
+
+
+# KEYS[1] = key; ARGV = emission, tolerance, cost (seconds, seconds, units), force (0/1).
+# Uses the server clock so limits agree across nodes.
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = math.max(tat + emission * cost, now)
+local allow_at = new_tat - tolerance
+if allow_at > now and ARGV[4] ~= '1' then return tostring(allow_at - now) end
+if new_tat > now then
+  redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+else
+  redis.call('DEL', KEYS[1])
+end
+return '0'
+"""
+
+
+class RedisRateLimitStore:
+    """Shares limits across workers and nodes via any Redis-protocol server.
+
+    The GCRA step runs as one Lua script, so each check is a single atomic round
+    trip. Keys expire once fully recovered. If the server is unreachable the
+    check fails open and logs, so a rate-limit outage never takes chat down.
+    """
+
+    def __init__(self, client: RespClient, prefix: str = "rl:"):
+        self.client = client
+        self.prefix = prefix
+        self._sha = hashlib.sha1(GCRA_SCRIPT.encode("utf-8")).hexdigest()
+
+    def acquire(self, key: str, emission: float, tolerance: float, cost: float, force: bool = False) -> float:
+        args = (1, self.prefix + key, repr(emission), repr(tolerance), repr(cost), int(force))
+        try:
+            try:
+                result = self.client.execute("EVALSHA", self._sha, *args)
+            except RespError as exc:
+                if not str(exc).startswith("NOSCRIPT"):
+                    raise
+                result = self.client.execute("EVAL", GCRA_SCRIPT, *args)
+        except (OSError, EOFError, RespError) as exc:
+            log.warning("rate_limit.store_unavailable", error=repr(exc))
+            return 0.0
+        return float(result)
+
+
+class RateLimiter:
+    """`limit` requests per `period` seconds per key, allowing bursts of `burst`."""
+
+    def __init__(
+        self,
+        store: RateLimitStore,
+        limit: int,
+        period: float = 60.0,
+        burst: Optional[int] = None,
+        scopes: Sequence[str] = ("ip",),
+    ):
+        self.store = store
+        self.limit = limit
+        self.emission = period / max(1, limit)
+        self.tolerance = self.emission * (burst or limit)
+        self.scopes = list(scopes)
+
+    def check(self, key: str, cost: float = 1.0) -> None:
+        retry_after = self.store.acquire(key, self.emission, self.tolerance, cost)
+        if retry_after > 0:
+            raise RateLimitExceeded(key, retry_after)
+
+    def check_scopes(self, cost: float = 1.0, **values: Optional[str]) -> None:
+        """Check every configured scope (ip, user, session) that has a value here."""
+        for scope in self.scopes:
+            value = values.get(scope)
+            if value:
+                self.check(f"{scope}:{value}", cost)
+
+
+def build_rate_limit_store(backend: str, redis_url: str, shards: int, max_keys: int) -> RateLimitStore:
+    if backend == "redis":
+        return RedisRateLimitStore(RespClient(redis_url))
+    if backend == "memory":
+        return InMemoryRateLimitStore(shards=shards, max_keys=max_keys)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
@@ -0,0 +1,137 @@
+"""Optional OpenTelemetry tracing for the chat pipeline.
+
+Off unless `TRACING_ENABLED` is set; then `span()` returns a shared no-op and
+nothing from OpenTelemetry is imported or called on the request path. When
+on, incoming `traceparent` headers are honoured, every HTTP request gets a
+server span, the orchestrator stages, LLM and embedding calls get child spans
+and every SQL statement gets a `db.query` span. Spans go to an OTLP/HTTP
+endpoint or, without one, as JSON lines to a local file.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+
+_NOOP = _NoopSpan()
+_tracer = None
+
+
+def span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """Context manager for a child span of the current one; a no-op while tracing is off."""
+    if _tracer is None:
+        return _NOOP
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """Span that is not made current; for work spread over generator yields. Call `.end()`."""
+    if _tracer is None:
+        return _NOOP
+    return _tracer.start_span(name, attributes=attributes)
+
+
+def _exporter():
+    if settings.tracing_otlp_endpoint:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    return ConsoleSpanExporter(
+        out=open(settings.tracing_file, "a", encoding="utf-8"),
+        formatter=lambda finished: finished.to_json(indent=None) + "\n",
+    )
+
+
+def instrument_engine(engine: Engine) -> None:
+    """One `db.query` span per SQL statement executed on `engine`."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _tracer is not None:
+            context._trace_span = _tracer.start_span(
+                "db.query",
+                attributes={"db.system": engine.dialect.name, "db.statement": statement[:2000]},
+            )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        query_span = getattr(context, "_trace_span", None)
+        if query_span is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                query_span.set_attribute("db.rowcount", cursor.rowcount)
+            query_span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        query_span = getattr(context, "_trace_span", None) if context is not None else None
+        if query_span is not None:
+            from opentelemetry.trace import Status, StatusCode
+
+            query_span.record_exception(exception_context.original_exception)
+            query_span.set_status(Status(StatusCode.ERROR))
+            query_span.end()
+
+
+def _instrument_requests(app) -> None:
+    from opentelemetry.propagate import extract
+    from opentelemetry.trace import SpanKind
+
+    @app.middleware("http")
+    async def trace_request(request: Request, call_next):
+        with _tracer.start_as_current_span(
+            f"{request.method} {request.url.path}",
+            context=extract(request.headers),
+            kind=SpanKind.SERVER,
+            attributes={"http.method": request.method, "http.target": request.url.path},
+        ) as request_span:
+            response = await call_next(request)
+            request_span.set_attribute("http.status_code", response.status_code)
+            return response
+
+
+def configure_tracing(app, engines: Iterable[Engine]) -> None:
+    global _tracer
+    if not settings.tracing_enabled:
+        return
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBasedTraceIdRatio
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.tracing_service_name}),
+        sampler=ParentBasedTraceIdRatio(settings.tracing_sample_rate),
+    )
+    provider.add_span_processor(BatchSpanProcessor(_exporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("chat-backend")
+    _instrument_requests(app)
+    for engine in engines:
+        instrument_engine(engine)
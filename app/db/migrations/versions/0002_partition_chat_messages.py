@@ -0,0 +1,105 @@
+"""partition chat_messages by month
+
+Rebuilds chat_messages as a table range-partitioned on created_at, with one
+partition per month, a DEFAULT partition for rows outside them, and a
+(session_id, created_at DESC) index that serves "latest messages of a session"
+without sorting. Existing rows are copied over in this migration, so run it
+in a maintenance window on large tables. Later months are created by
+`python -m app.db.retention`.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002_partition_chat_messages"
+down_revision = "0001_create_chat_tables"
+branch_labels = None
+depends_on = None
+
+
+MONTHS_AHEAD = 3
+
+
+# Kept local rather than imported from app.db.retention, so later changes to the
+# maintenance job cannot change what this revision does.
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_partition_sql(month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS chat_messages_p{month:%Y%m} PARTITION OF chat_messages "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+    )
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE chat_messages RENAME TO chat_messages_legacy;")
+    op.execute("ALTER INDEX ix_chat_messages_session_id RENAME TO ix_chat_messages_legacy_session_id;")
+    op.execute("ALTER TABLE chat_messages_legacy RENAME CONSTRAINT chat_messages_pkey TO chat_messages_legacy_pkey;")
+
+    op.execute(
+        """
+        CREATE TABLE chat_messages (
+            id uuid NOT NULL DEFAULT gen_random_uuid(),
+            session_id uuid NOT NULL REFERENCES chat_sessions (id),
+            role varchar NOT NULL,
+            content text NOT NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            metadata jsonb NOT NULL DEFAULT '{}'::jsonb,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        """
+    )
+    op.execute("CREATE TABLE chat_messages_default PARTITION OF chat_messages DEFAULT;")
+
+    oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM chat_messages_legacy")).scalar()
+    today = datetime.now(timezone.utc).date()
+    month = _month_start(oldest.date() if oldest else today)
+    last = _add_months(_month_start(today), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(_create_partition_sql(month))
+        month = _add_months(month, 1)
+
+    op.execute(
+        "CREATE INDEX ix_chat_messages_session_created ON chat_messages (session_id, created_at DESC);"
+    )
+    op.execute(
+        """
+        INSERT INTO chat_messages (id, session_id, role, content, created_at, metadata)
+        SELECT id, session_id, role, content, created_at, metadata FROM chat_messages_legacy;
+        """
+    )
+    op.execute("DROP TABLE chat_messages_legacy;")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE chat_messages RENAME TO chat_messages_partitioned;")
+    op.create_table(
+        "chat_messages",
+        sa.Column("id", sa.dialects.postgresql.UUID(as_uuid=True), primary_key=True, server_default=sa.text("gen_random_uuid()")),
+        sa.Column("session_id", sa.dialects.postgresql.UUID(as_uuid=True), sa.ForeignKey("chat_sessions.id"), nullable=False),
+        sa.Column("role", sa.String(), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("metadata", sa.dialects.postgresql.JSONB(), nullable=False, server_default=sa.text("'{}'::jsonb")),
+    )
+    op.execute(
+        """
+        INSERT INTO chat_messages (id, session_id, role, content, created_at, metadata)
+        SELECT id, session_id, role, content, created_at, metadata FROM chat_messages_partitioned;
+        """
+    )
+    op.execute("DROP TABLE chat_messages_partitioned CASCADE;")
+    op.create_index("ix_chat_messages_session_id", "chat_messages", ["session_id"])
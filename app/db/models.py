@@ -59,8 +59,10 @@ class ChatMessage(Base):
     session_id = Column(PG_UUID(as_uuid=True), ForeignKey("chat_sessions.id"), nullable=False)
     role = Column(String, nullable=False)
     content = Column(Text, nullable=False)
+    # Part of the primary key because the table is range-partitioned on it (migration 0002).
     created_at = Column(
         TIMESTAMP(timezone=True),
+        primary_key=True,
         nullable=False,
         default=datetime.utcnow,
         server_default=text("now()"),
@@ -69,7 +71,10 @@ class ChatMessage(Base):
 
     session = relationship("ChatSession", back_populates="messages")
 
-    __table_args__ = (Index("ix_chat_messages_session_id", "session_id"),)
+    __table_args__ = (
+        Index("ix_chat_messages_session_created", "session_id", created_at.desc()),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
 
 class SessionState(Base):
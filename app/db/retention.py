@@ -0,0 +1,269 @@
+"""Partition maintenance for `chat_messages`.
+
+`chat_messages` is range-partitioned by month on `created_at` (see migration
+0002). This module creates upcoming partitions ahead of time, moving any rows
+the DEFAULT partition holds for those months into them, and retires partitions
+older than the retention window: each one is optionally exported to a gzipped
+CSV file while still attached, then detached in its own short step (with
+CONCURRENTLY where Postgres allows it) and dropped. That costs one DDL
+statement per month instead of a bulk DELETE. Expired rows in the DEFAULT
+partition are exported and deleted the same way. Run it from cron:
+
+    python -m app.db.retention --keep-months 12 --archive-dir /var/archive/chat
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.config import settings
+
+
+log = structlog.get_logger()
+
+PARENT_TABLE = "chat_messages"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+# A plain DETACH waits for an ACCESS EXCLUSIVE lock on the parent; give up rather
+# than queue every reader and writer behind it.
+DETACH_LOCK_TIMEOUT = "5s"
+_PARTITION_NAME = re.compile(rf"^{PARENT_TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: date
+
+    @property
+    def end(self) -> date:
+        return add_months(self.start, 1)
+
+    @classmethod
+    def for_month(cls, month: date) -> "Partition":
+        month = month_start(month)
+        return cls(name=f"{PARENT_TABLE}_p{month:%Y%m}", start=month)
+
+    @classmethod
+    def from_name(cls, name: str) -> Optional["Partition"]:
+        match = _PARTITION_NAME.match(name)
+        if not match:
+            return None
+        return cls(name=name, start=date(int(match.group(1)), int(match.group(2)), 1))
+
+    @property
+    def bounds(self) -> str:
+        return f"FROM ('{self.start.isoformat()}') TO ('{self.end.isoformat()}')"
+
+    @property
+    def range_condition(self) -> str:
+        return f"created_at >= '{self.start.isoformat()}' AND created_at < '{self.end.isoformat()}'"
+
+    def create_sql(self) -> str:
+        return f"CREATE TABLE IF NOT EXISTS {self.name} PARTITION OF {PARENT_TABLE} FOR VALUES {self.bounds}"
+
+    def move_from_default_sql(self) -> List[str]:
+        """Statements that build this partition out of the rows the DEFAULT partition holds for it.
+
+        Postgres refuses to create a partition while the DEFAULT one has rows in its
+        range, so the table is filled first and then attached. The CHECK constraint
+        lets ATTACH skip scanning the new table.
+        """
+        return [
+            f"CREATE TABLE {self.name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+            f"ALTER TABLE {self.name} ADD CONSTRAINT {self.name}_range CHECK ({self.range_condition})",
+            f"INSERT INTO {self.name} SELECT * FROM {DEFAULT_PARTITION} WHERE {self.range_condition}",
+            f"DELETE FROM {DEFAULT_PARTITION} WHERE {self.range_condition}",
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {self.name} FOR VALUES {self.bounds}",
+            f"ALTER TABLE {self.name} DROP CONSTRAINT {self.name}_range",
+        ]
+
+    def detach_sql(self, concurrently: bool = False) -> str:
+        return f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {self.name}{' CONCURRENTLY' if concurrently else ''}"
+
+
+def expired_partitions(partitions: Sequence[Partition], keep_months: int, today: date) -> List[Partition]:
+    """Partitions whose whole month is older than the retention window, oldest first."""
+    cutoff = add_months(month_start(today), -keep_months)
+    return sorted((p for p in partitions if p.end <= cutoff), key=lambda p: p.start)
+
+
+def list_partitions(conn: Connection) -> List[Partition]:
+    rows = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent"
+        ),
+        {"parent": PARENT_TABLE},
+    ).scalars()
+    # The DEFAULT partition (and anything not named by month) is handled separately.
+    return [partition for partition in map(Partition.from_name, rows) if partition is not None]
+
+
+def has_default_partition(conn: Connection) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": DEFAULT_PARTITION}).scalar()
+
+
+def ensure_partitions(conn: Connection, months_ahead: int, today: date) -> List[Partition]:
+    """Create partitions for the current month and `months_ahead` months after it.
+
+    Rows that already landed in the DEFAULT partition for one of those months are
+    moved into its new partition.
+    """
+    current = month_start(today)
+    partitions = [Partition.for_month(add_months(current, offset)) for offset in range(months_ahead + 1)]
+    existing = {partition.name for partition in list_partitions(conn)}
+    default = has_default_partition(conn)
+    for partition in partitions:
+        if partition.name in existing:
+            continue
+        if default and conn.execute(
+            text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {partition.range_condition})")
+        ).scalar():
+            for statement in partition.move_from_default_sql():
+                conn.execute(text(statement))
+            log.info("retention.moved_default_rows", partition=partition.name)
+        else:
+            conn.execute(text(partition.create_sql()))
+    return partitions
+
+
+def _copy_to_file(conn: Connection, query: str, path: Path) -> Path:
+    """Stream `COPY (<query>) TO STDOUT` as gzipped CSV into `path`."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cursor = conn.connection.driver_connection.cursor()
+    with gzip.open(path, "wb") as out, cursor.copy(
+        f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+    ) as copy:
+        for chunk in copy:
+            out.write(chunk)
+    return path
+
+
+def archive_partition(conn: Connection, partition: Partition, directory: Path) -> Path:
+    """Export one partition with COPY into `<directory>/<partition>.csv.gz`."""
+    return _copy_to_file(
+        conn, f"SELECT * FROM {partition.name} ORDER BY created_at", directory / f"{partition.name}.csv.gz"
+    )
+
+
+def detach_partition(engine: Engine, partition: Partition) -> None:
+    """Detach `partition` from the parent without holding the parent locked for long.
+
+    On Postgres 14+ without a DEFAULT partition this is DETACH ... CONCURRENTLY,
+    run outside a transaction block; a detach left pending by an earlier failure
+    is finalized first. Otherwise it is a plain DETACH in its own transaction,
+    bounded by DETACH_LOCK_TIMEOUT.
+    """
+    with engine.connect() as conn:
+        concurrent = conn.dialect.server_version_info >= (14,) and not has_default_partition(conn)
+        pending = concurrent and conn.execute(
+            text("SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(:name)"),
+            {"name": partition.name},
+        ).scalar()
+        conn.rollback()
+    if concurrent:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if pending:
+                conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {partition.name} FINALIZE"))
+            else:
+                conn.execute(text(partition.detach_sql(concurrently=True)))
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+        conn.execute(text(partition.detach_sql()))
+
+
+def retire_partition(engine: Engine, partition: Partition, archive_dir: Optional[Path] = None) -> None:
+    """Export, detach and drop one partition, each step in its own transaction.
+
+    The export reads the partition while it is still attached, which takes no
+    lock that blocks chat traffic. Expired months no longer receive writes, so
+    nothing is lost between export and detach; if a later step fails, the next
+    run exports again and carries on.
+    """
+    if archive_dir is not None:
+        with engine.begin() as conn:
+            path = archive_partition(conn, partition, archive_dir)
+        log.info("retention.archived", partition=partition.name, path=str(path))
+    detach_partition(engine, partition)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {partition.name}"))
+    log.info("retention.dropped", partition=partition.name)
+
+
+def retire_default_rows(engine: Engine, cutoff: date, archive_dir: Optional[Path] = None) -> None:
+    """Delete DEFAULT-partition rows older than `cutoff`, exporting exactly the deleted rows first."""
+    condition = f"created_at < '{cutoff.isoformat()}'"
+    with engine.begin() as conn:
+        if not has_default_partition(conn):
+            return
+        if archive_dir is None:
+            deleted = conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {condition}")).rowcount
+            log.info("retention.default_rows_deleted", rows=deleted, before=cutoff.isoformat())
+            return
+        path = archive_dir / f"{DEFAULT_PARTITION}_before_{cutoff:%Y%m%d}.csv.gz"
+        _copy_to_file(conn, f"DELETE FROM {DEFAULT_PARTITION} WHERE {condition} RETURNING *", path)
+        log.info("retention.default_rows_archived", path=str(path), before=cutoff.isoformat())
+
+
+def run_retention(
+    engine: Engine,
+    keep_months: int,
+    months_ahead: int,
+    archive_dir: Optional[Path] = None,
+    dry_run: bool = False,
+    today: Optional[date] = None,
+) -> List[Partition]:
+    """Create upcoming partitions and retire expired ones; returns the retired partitions."""
+    today = today or datetime.now(timezone.utc).date()
+    with engine.begin() as conn:
+        ensure_partitions(conn, months_ahead, today)
+        expired = expired_partitions(list_partitions(conn), keep_months, today)
+    for partition in expired:
+        if dry_run:
+            log.info("retention.would_retire", partition=partition.name)
+            continue
+        # Each partition on its own so a failed export leaves the rest untouched.
+        retire_partition(engine, partition, archive_dir)
+    if not dry_run:
+        retire_default_rows(engine, add_months(month_start(today), -keep_months), archive_dir)
+    return expired
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain chat_messages partitions.")
+    parser.add_argument("--keep-months", type=int, default=settings.chat_retention_months)
+    parser.add_argument("--months-ahead", type=int, default=settings.chat_partition_months_ahead)
+    parser.add_argument("--archive-dir", type=Path, default=settings.chat_archive_dir)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    from app.db.session import engine
+
+    retired = run_retention(engine, args.keep_months, args.months_ahead, args.archive_dir, args.dry_run)
+    print(f"{'Would retire' if args.dry_run else 'Retired'} {len(retired)} partition(s)")
+
+
+if __name__ == "__main__":
+    main()
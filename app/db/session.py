@@ -1,16 +1,152 @@
 from __future__ import annotations
 
+import threading
+import time
+from collections import deque
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Deque, Dict, Generator, Optional
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 from app.core.config import settings
+from app.db.statements import configure_prepares, connect_args
 
 
-engine = create_engine(settings.database_url, pool_pre_ping=True, future=True)
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, class_=Session)
+class PoolMetrics:
+    """Checkout wait times and timeouts for one connection pool."""
+
+    def __init__(self, name: str, window: int = 1024):
+        self.name = name
+        self._waits: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+
+    def record(self, wait: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self._waits.append(wait)
+            self.checkouts += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            checkouts, timeouts = self.checkouts, self.timeouts
+
+        def percentile(q: float) -> float:
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 2) if waits else 0.0
+
+        return {
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "wait_p50_ms": percentile(0.5),
+            "wait_p95_ms": percentile(0.95),
+            "wait_max_ms": round(waits[-1] * 1000, 2) if waits else 0.0,
+        }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record(time.perf_counter() - started, timed_out)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def _create_engine(url: str, name: str) -> Engine:
+    kwargs: Dict[str, Any] = {
+        "pool_pre_ping": True,
+        "future": True,
+        "connect_args": connect_args(url, settings.db_prepare_mode),
+    }
+    if not url.startswith("sqlite"):
+        kwargs.update(
+            poolclass=TimedQueuePool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout_seconds,
+            pool_recycle=settings.db_pool_recycle_seconds,
+        )
+    created = create_engine(url, **kwargs)
+    configure_prepares(created, url, settings.db_prepare_mode)
+    if isinstance(created.pool, TimedQueuePool):
+        created.pool.metrics = PoolMetrics(name)
+    return created
+
+
+def pool_stats(target: Engine) -> Dict[str, Any]:
+    pool = target.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    stats: Dict[str, Any] = {
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": checked_out,
+        "idle": pool.checkedin(),
+        "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+    }
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        stats.update(metrics.snapshot())
+    return stats
+
+
+engine = _create_engine(settings.database_url, "primary")
+# Reads that tolerate replica lag (vector search, entity scans) go here; same engine without a replica.
+read_engine = _create_engine(settings.database_read_url, "replica") if settings.database_read_url else engine
+
+
+class RoutingSession(Session):
+    """Session that sends statements to the read replica while `replica_reads` is on.
+
+    Flushes always go to the primary, so writes never reach the replica.
+    """
+
+    replica_reads = False
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.replica_reads and not self._flushing and read_engine is not engine:
+            return read_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+@contextmanager
+def replica_reads(session: Session) -> Generator[Session, None, None]:
+    """Route the session's reads to the replica for the duration of the block."""
+    if not isinstance(session, RoutingSession):
+        yield session
+        return
+    previous = session.replica_reads
+    session.replica_reads = True
+    try:
+        yield session
+    finally:
+        session.replica_reads = previous
+
+
+SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, class_=RoutingSession)
 
 
 @contextmanager
@@ -24,3 +160,18 @@ def get_session() -> Generator[Session, None, None]:
         raise
     finally:
         session.close()
+
+
+def set_statement_timeout(session: Session, seconds: float) -> None:
+    """Cap every further statement of the current transaction at `seconds` (Postgres only)."""
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    session.execute(
+        text("SELECT set_config('statement_timeout', :timeout, true)"),
+        {"timeout": str(max(1, int(seconds * 1000)))},
+    )
+
+
+def is_statement_timeout(exc: DBAPIError) -> bool:
+    # SQLSTATE 57014: query_canceled, raised when statement_timeout fires.
+    return getattr(exc.orig, "sqlstate", None) == "57014"
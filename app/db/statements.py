@@ -0,0 +1,142 @@
+"""Fixed SQL for the hot read paths.
+
+Every statement here has constant text, whatever the values of its filters,
+limits or ids. Each optional filter shape gets its own statement rather than
+a `:param IS NULL OR ...` guard, so the planner always sees the real predicate.
+Lists are bound as `= ANY(:array)`, never spliced into the SQL string. With
+`DB_PREPARE_MODE=server` these statements, and only these, are prepared on
+the server on first use per connection and the plan is reused. The texts use
+only plain bind parameters, so they also run unchanged behind PgBouncer in
+transaction pooling mode (`DB_PREPARE_MODE=transaction`).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+
+# Execution option that marks a statement for a server-side prepare.
+PREPARE_OPTION = "prepare"
+
+
+def _hot(sql: str) -> TextClause:
+    return text(sql).execution_options(**{PREPARE_OPTION: True})
+
+
+_SIMILARITY_SQL = """
+    SELECT
+        COALESCE(cd.raw_document_id, rd.id) AS raw_document_id,
+        COALESCE(rd.title, cd.section_title) AS chunk_title,
+        COALESCE(rd.source_type, cd.source_type) AS chunk_source_type,
+        MIN(cd.embedding <=> CAST(:query_embedding AS vector)) AS score
+    FROM chunked_documents cd
+    LEFT JOIN raw_documents rd ON rd.id = cd.raw_document_id
+    WHERE (cd.entity_id = CAST(:entity_id AS uuid) OR cd.entity_id IS NULL){source_filter}
+    GROUP BY COALESCE(cd.raw_document_id, rd.id), COALESCE(rd.title, cd.section_title), COALESCE(rd.source_type, cd.source_type)
+    ORDER BY score ASC
+    LIMIT :limit
+"""
+
+SIMILARITY_SEARCH = _hot(_SIMILARITY_SQL.format(source_filter=""))
+SIMILARITY_SEARCH_INCLUDE = _hot(
+    _SIMILARITY_SQL.format(
+        source_filter="\n      AND COALESCE(rd.source_type, cd.source_type) = ANY(CAST(:include_types AS text[]))"
+    )
+)
+SIMILARITY_SEARCH_EXCLUDE = _hot(
+    _SIMILARITY_SQL.format(
+        source_filter="\n      AND NOT (COALESCE(rd.source_type, cd.source_type) = ANY(CAST(:exclude_types AS text[])))"
+    )
+)
+
+DOCUMENTS_BY_IDS = _hot(
+    """
+    SELECT id, entity_id, title, source_url, clean_text, source_type
+    FROM raw_documents
+    WHERE id = ANY(CAST(:ids AS uuid[]))
+    """
+)
+
+_ENTITY_CANDIDATES_SQL = "SELECT * FROM entities{where} LIMIT :limit"
+_BY_CITY = "lower(city) = CAST(:city AS text)"
+_BY_STATE = "lower(state) = CAST(:state AS text)"
+
+# Keyed by (city given, state given). LIMIT NULL means no limit in Postgres.
+ENTITY_CANDIDATES: Dict[Tuple[bool, bool], TextClause] = {
+    (False, False): _hot(_ENTITY_CANDIDATES_SQL.format(where="")),
+    (True, False): _hot(_ENTITY_CANDIDATES_SQL.format(where=f" WHERE {_BY_CITY}")),
+    (False, True): _hot(_ENTITY_CANDIDATES_SQL.format(where=f" WHERE {_BY_STATE}")),
+    (True, True): _hot(_ENTITY_CANDIDATES_SQL.format(where=f" WHERE {_BY_CITY} AND {_BY_STATE}")),
+}
+
+
+def uses_fixed_statements(session: Session) -> bool:
+    """Whether documents by id and entity candidates use the fixed Postgres SQL.
+
+    Other dialects (SQLite in tests) keep the ORM queries for those two. The
+    similarity search has no ORM version: it needs pgvector on every dialect.
+    """
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def similarity_params(
+    entity_id: str,
+    query_embedding: Any,
+    limit: int,
+    include_types: Any = None,
+    exclude_types: Any = None,
+) -> Dict[str, Any]:
+    # An include filter wins over an exclude filter, as in the ORM version.
+    return {
+        "entity_id": entity_id,
+        "query_embedding": list(query_embedding),
+        "limit": limit,
+        "include_types": list(include_types) if include_types else None,
+        "exclude_types": list(exclude_types) if exclude_types and not include_types else None,
+    }
+
+
+def similarity_statement(params: Dict[str, Any]) -> TextClause:
+    """The similarity search variant for the source-type filter in `params`."""
+    if params["include_types"] is not None:
+        return SIMILARITY_SEARCH_INCLUDE
+    if params["exclude_types"] is not None:
+        return SIMILARITY_SEARCH_EXCLUDE
+    return SIMILARITY_SEARCH
+
+
+def entity_candidates_statement(city: Optional[str], state: Optional[str]) -> TextClause:
+    return ENTITY_CANDIDATES[(bool(city), bool(state))]
+
+
+def connect_args(url: str, mode: str) -> Dict[str, Any]:
+    """psycopg connection arguments for `DB_PREPARE_MODE`.
+
+    `server` and `transaction` both turn psycopg's automatic prepares off, so no
+    statement is prepared just for having run a few times; under `server` the
+    hot statements are prepared explicitly (see `configure_prepares`).
+    `transaction` lets connections be multiplexed by PgBouncer in transaction mode.
+    """
+    if "+psycopg" not in url or mode == "auto":
+        return {}
+    if mode in ("server", "transaction"):
+        return {"prepare_threshold": None}
+    raise ValueError(f"Unknown DB_PREPARE_MODE: {mode}")
+
+
+def _prepare_marked(cursor, statement, parameters, context) -> Optional[bool]:
+    if not context.execution_options.get(PREPARE_OPTION):
+        return None
+    cursor.execute(statement, parameters, prepare=True)
+    return True
+
+
+def configure_prepares(engine: Engine, url: str, mode: str) -> None:
+    """Under `DB_PREPARE_MODE=server`, prepare the statements marked hot on first use per connection."""
+    if "+psycopg" in url and mode == "server":
+        event.listen(engine, "do_execute", _prepare_marked)
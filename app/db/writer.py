@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, ContextManager, Deque, Dict, List, Optional, Union
+
+import structlog
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.db.models import ChatMessage, SessionState
+
+
+log = structlog.get_logger()
+
+
+@dataclass
+class MessageWrite:
+    session_id: uuid.UUID
+    role: str
+    content: str
+    meta: Dict[str, Any] = field(default_factory=dict)
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+
+@dataclass
+class StateWrite:
+    """Shallow patch merged into `session_state.state` (later keys win)."""
+
+    session_id: uuid.UUID
+    patch: Dict[str, Any]
+
+
+PendingWrite = Union[MessageWrite, StateWrite]
+
+
+@dataclass
+class _Queued:
+    item: PendingWrite
+    enqueued_at: float
+    attempts: int = 0
+
+
+class WriteBehindWriter:
+    """Buffers chat persistence off the response path and flushes it in batches.
+
+    Writes are queued in memory and a background thread flushes them once
+    `batch_size` items are pending or the oldest has waited `flush_interval`
+    seconds. Each flush is one transaction: messages go in as a multi-row
+    INSERT, state patches for the same session are merged and upserted once.
+    When the queue is full the caller flushes a batch itself, so memory stays
+    bounded and nothing is dropped. A batch that fails goes back to the head of
+    the queue and is retried up to `max_retries` times, `retry_backoff` seconds
+    apart (growing per attempt), so a database blip costs latency, not rows.
+    After that its rows are written one by one and only the failing ones are
+    dropped. Call `close()` on shutdown to drain it.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], ContextManager[Session]],
+        batch_size: int = 200,
+        flush_interval: float = 0.2,
+        max_queue: int = 10000,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._pending: Deque[_Queued] = deque()
+        self._cond = threading.Condition()
+        # Held while a batch is popped and written, so batches land in queue order.
+        self._write_lock = threading.Lock()
+        # The batch being written, still visible to `pending()` until it is committed.
+        self._writing: List[_Queued] = []
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        # The worker leaves a re-queued batch alone until then.
+        self._retry_at = 0.0
+        self._written = 0
+        self._failed = 0
+        self._retried = 0
+        self._batches = 0
+        self._inline_flushes = 0
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+
+    def enqueue(self, *items: PendingWrite) -> None:
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                self._ensure_worker_locked()
+        if closed:
+            # Late writes after shutdown started are written straight through.
+            self._write([_Queued(item, now) for item in items], requeue=False)
+            return
+        while True:
+            with self._cond:
+                if len(self._pending) + len(items) <= self.max_queue or not self._pending:
+                    self._pending.extend(_Queued(item, now) for item in items)
+                    if len(self._pending) >= self.batch_size:
+                        self._cond.notify_all()
+                    return
+                self._inline_flushes += 1
+            self._flush_batch()
+
+    def _ensure_worker_locked(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    backoff = self._retry_at - time.monotonic()
+                    if self._pending and backoff > 0 and not self._closed:
+                        self._cond.wait(backoff)
+                        continue
+                    if self._closed or len(self._pending) >= self.batch_size:
+                        break
+                    if self._pending:
+                        remaining = self.flush_interval - (time.monotonic() - self._pending[0].enqueued_at)
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed and not self._pending:
+                    self._cond.notify_all()
+                    return
+            self._flush_batch()
+
+    def _flush_batch(self) -> int:
+        with self._write_lock:
+            with self._cond:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                self._writing = batch
+                if not self._pending:
+                    self._cond.notify_all()
+            try:
+                if batch:
+                    self._write(batch)
+            finally:
+                with self._cond:
+                    self._writing = []
+            return len(batch)
+
+    def pending(self, session_id: uuid.UUID) -> List[PendingWrite]:
+        """Writes for `session_id` that are not committed yet, oldest first."""
+        with self._cond:
+            queued = self._writing + list(self._pending)
+        return [item.item for item in queued if item.item.session_id == session_id]
+
+    def flush(self) -> None:
+        """Write everything queued so far from the calling thread."""
+        while self._flush_batch():
+            pass
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Stop accepting queued writes and drain the queue; returns False if it timed out."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is None:
+            self.flush()
+            return True
+        thread.join(timeout)
+        if thread.is_alive():
+            log.warning("persistence.shutdown_timeout", pending=len(self._pending))
+            return False
+        return True
+
+    def _write(self, batch: List[_Queued], requeue: bool = True) -> None:
+        try:
+            with self.session_factory() as db:
+                self._apply(db, [queued.item for queued in batch])
+        except Exception as exc:
+            attempts = max(queued.attempts for queued in batch) + 1
+            if requeue and attempts <= self.max_retries:
+                log.warning("persistence.batch_retry", size=len(batch), attempt=attempts, error=repr(exc))
+                for queued in batch:
+                    queued.attempts = attempts
+                with self._cond:
+                    # Back at the head, so the batch still lands before anything queued after it.
+                    self._pending.extendleft(reversed(batch))
+                    self._retry_at = time.monotonic() + self.retry_backoff * attempts
+                    self._retried += 1
+                return
+            log.exception("persistence.batch_failed", size=len(batch))
+            # Isolate the bad rows so one failure does not lose the whole batch.
+            for queued in batch:
+                try:
+                    with self.session_factory() as db:
+                        self._apply(db, [queued.item])
+                except Exception as exc:
+                    self._failed += 1
+                    log.error("persistence.write_failed", kind=type(queued.item).__name__, error=repr(exc))
+                else:
+                    self._record(1, queued.enqueued_at)
+            return
+        self._record(len(batch), min(queued.enqueued_at for queued in batch))
+
+    def _record(self, count: int, oldest: float) -> None:
+        lag = time.monotonic() - oldest
+        with self._cond:
+            self._written += count
+            self._batches += 1
+            self._last_lag = lag
+            self._max_lag = max(self._max_lag, lag)
+
+    def _apply(self, db: Session, items: List[PendingWrite]) -> None:
+        messages = [item for item in items if isinstance(item, MessageWrite)]
+        states: Dict[uuid.UUID, Dict[str, Any]] = {}
+        for item in items:
+            if isinstance(item, StateWrite):
+                states.setdefault(item.session_id, {}).update(item.patch)
+
+        if messages:
+            db.execute(
+                insert(ChatMessage.__table__),
+                [
+                    {
+                        "id": item.id,
+                        "session_id": item.session_id,
+                        "role": item.role,
+                        "content": item.content,
+                        "created_at": item.created_at,
+                        "metadata": item.meta,
+                    }
+                    for item in messages
+                ],
+            )
+        if states:
+            now = datetime.utcnow()
+            rows = [{"session_id": sid, "state": patch, "updated_at": now} for sid, patch in states.items()]
+            db.execute(self._state_upsert(db), rows)
+
+    @staticmethod
+    def _state_upsert(db: Session):
+        table = SessionState.__table__
+        if db.get_bind().dialect.name == "postgresql":
+            stmt = postgresql.insert(table)
+            merged = table.c.state.op("||")(stmt.excluded.state)
+        else:
+            stmt = sqlite.insert(table)
+            merged = func.json_patch(table.c.state, stmt.excluded.state)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.session_id],
+            set_={"state": merged, "updated_at": stmt.excluded.updated_at},
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            oldest = self._pending[0].enqueued_at if self._pending else None
+            return {
+                "pending": len(self._pending),
+                "oldest_pending_ms": round((time.monotonic() - oldest) * 1000, 1) if oldest else 0.0,
+                "last_flush_lag_ms": round(self._last_lag * 1000, 1),
+                "max_flush_lag_ms": round(self._max_lag * 1000, 1),
+                "written": self._written,
+                "failed": self._failed,
+                "retried_batches": self._retried,
+                "batches": self._batches,
+                "inline_flushes": self._inline_flushes,
+            }
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import structlog
+
+from app.llm.base import LLMClient, LLMMessage, LLMResponse
+
+
+log = structlog.get_logger()
+
+
+class AdmissionRejected(Exception):
+    """Raised when an LLM call cannot be admitted within the queue deadline."""
+
+    def __init__(self, scope: str, reason: str, retry_after: float):
+        self.scope = scope
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"LLM capacity exhausted for {scope} ({reason})")
+
+    @property
+    def retry_after_seconds(self) -> int:
+        return max(1, math.ceil(self.retry_after))
+
+
+class ConcurrencyLimiter:
+    """Counting semaphore with a bounded wait queue and wait-time statistics.
+
+    The expected wait for a newcomer is estimated from the number of queued
+    callers and an EWMA of how long a slot is held; callers whose expected wait
+    exceeds `max_wait` are rejected immediately instead of joining the queue.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float, ewma_alpha: float = 0.2):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.ewma_alpha = ewma_alpha
+        self.in_flight = 0
+        self.waiting = 0
+        self.hold_ewma = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._cond = threading.Condition()
+
+    def estimated_wait(self) -> float:
+        if self.in_flight < self.limit and not self.waiting:
+            return 0.0
+        return (self.waiting // self.limit + 1) * self.hold_ewma
+
+    def check(self) -> None:
+        """Reject early, without queueing, if a new caller would not be admitted in time."""
+        with self._cond:
+            self._check_locked()
+
+    def _check_locked(self) -> None:
+        if self.in_flight < self.limit and not self.waiting:
+            return
+        if self.waiting >= self.max_queue:
+            self._reject("queue_full", self.estimated_wait() or self.max_wait)
+        estimate = self.estimated_wait()
+        if estimate > self.max_wait:
+            self._reject("deadline", estimate)
+
+    def _reject(self, reason: str, retry_after: float) -> None:
+        self.rejected += 1
+        raise AdmissionRejected(self.name, reason, retry_after)
+
+    def acquire(self) -> None:
+        started = time.monotonic()
+        with self._cond:
+            self._check_locked()
+            self.waiting += 1
+            try:
+                deadline = started + self.max_wait
+                while self.in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject("timeout", self.hold_ewma or self.max_wait)
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+            waited = time.monotonic() - started
+            self.admitted += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def release(self, held: Optional[float]) -> None:
+        """Free a slot; `held=None` frees it without a hold sample (the slot was never used)."""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+            if held is None:
+                return
+            if self.hold_ewma:
+                self.hold_ewma += self.ewma_alpha * (held - self.hold_ewma)
+            else:
+                self.hold_ewma = held
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "wait_seconds_avg": self.wait_total / self.admitted if self.admitted else 0.0,
+                "wait_seconds_max": self.wait_max,
+                "hold_seconds_ewma": self.hold_ewma,
+            }
+
+
+class AdmissionController:
+    """Global plus per-provider concurrency limits in front of LLM calls.
+
+    The provider slot is taken first, so callers queued on one saturated
+    provider do not hold global slots that other providers could use.
+    """
+
+    def __init__(
+        self,
+        global_limit: int,
+        provider_limits: Optional[Dict[str, int]] = None,
+        max_queue: int = 256,
+        max_wait: float = 5.0,
+    ):
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.global_limiter = ConcurrencyLimiter("global", global_limit, max_queue, max_wait)
+        self._provider_limits = dict(provider_limits or {})
+        self._default_limit = global_limit
+        self._providers: Dict[str, ConcurrencyLimiter] = {}
+        self._lock = threading.Lock()
+
+    def provider_limiter(self, provider: str) -> ConcurrencyLimiter:
+        with self._lock:
+            limiter = self._providers.get(provider)
+            if limiter is None:
+                limit = self._provider_limits.get(provider, self._default_limit)
+                limiter = ConcurrencyLimiter(provider, limit, self.max_queue, self.max_wait)
+                self._providers[provider] = limiter
+            return limiter
+
+    def precheck(self, provider: str) -> None:
+        self.global_limiter.check()
+        self.provider_limiter(provider).check()
+
+    @contextmanager
+    def admit(self, provider: str) -> Iterator[None]:
+        limiters: List[ConcurrencyLimiter] = [self.provider_limiter(provider), self.global_limiter]
+        acquired: List[ConcurrencyLimiter] = []
+        try:
+            for limiter in limiters:
+                limiter.acquire()
+                acquired.append(limiter)
+        except AdmissionRejected as exc:
+            # Nothing ran: a 0 s sample would drag the hold estimate down exactly under overload.
+            for limiter in acquired:
+                limiter.release(None)
+            log.warning("llm.admission_rejected", scope=exc.scope, reason=exc.reason, provider=provider)
+            raise
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            for limiter in reversed(acquired):
+                limiter.release(held)
+
+    def stats(self) -> dict:
+        with self._lock:
+            providers = dict(self._providers)
+        return {
+            "global": self.global_limiter.stats(),
+            "providers": {name: limiter.stats() for name, limiter in providers.items()},
+        }
+
+
+class AdmissionControlledLLMClient(LLMClient):
+    """Wraps a provider so every call holds a global and a per-provider slot."""
+
+    def __init__(self, inner: LLMClient, controller: AdmissionController, provider: str):
+        self.inner = inner
+        self.controller = controller
+        self.provider = provider
+
+    def generate_chat(
+        self, messages: List[LLMMessage], model: str, temperature: float, max_tokens: int
+    ) -> LLMResponse:
+        with self.controller.admit(self.provider):
+            return self.inner.generate_chat(
+                messages=messages, model=model, temperature=temperature, max_tokens=max_tokens
+            )
+
+    def stream_chat(
+        self, messages: List[LLMMessage], model: str, temperature: float, max_tokens: int
+    ) -> Iterable[str]:
+        with self.controller.admit(self.provider):
+            yield from self.inner.stream_chat(
+                messages=messages, model=model, temperature=temperature, max_tokens=max_tokens
+            )
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import contextvars
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Iterable, List, Protocol
+from typing import Iterable, Iterator, List, Protocol
 
 
 @dataclass
@@ -26,3 +28,21 @@ class LLMClient(Protocol):
     def stream_chat(
         self, messages: List[LLMMessage], model: str, temperature: float, max_tokens: int
     ) -> Iterable[str]: ...
+
+
+_stage: contextvars.ContextVar[str] = contextvars.ContextVar("llm_stage", default="default")
+
+
+def current_stage() -> str:
+    """Pipeline stage (resolver, answer, ...) of the LLM call being made in this context."""
+    return _stage.get()
+
+
+@contextmanager
+def stage_scope(stage: str) -> Iterator[str]:
+    """Label LLM calls made inside the block with `stage`."""
+    token = _stage.set(stage)
+    try:
+        yield stage
+    finally:
+        _stage.reset(token)
@@ -1,16 +1,25 @@
 from __future__ import annotations
 
 import hashlib
-from typing import List, Protocol
+import random
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Protocol, Sequence
 
 from openai import OpenAI
 
 from app.core.config import settings
+from app.core.deadline import bounded_sleep, call_timeout
+from app.core.metrics import record_cache
+from app.llm.fixtures import FixtureStore, open_fixture_store
+from app.llm.mock_provider import LatencyProfile, MockProviderError
 
 
 class EmbeddingClient(Protocol):
     def embed(self, text: str) -> List[float]: ...
 
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]: ...
+
 
 class OpenAIEmbeddingClient:
     def __init__(self, api_key: str, model: str | None = None):
@@ -18,20 +27,140 @@ class OpenAIEmbeddingClient:
         self.model = model or settings.embedding_model
 
     def embed(self, text: str) -> List[float]:
-        resp = self.client.embeddings.create(model=self.model, input=text)
+        resp = self.client.embeddings.create(
+            model=self.model, input=text, timeout=call_timeout(settings.llm_timeout_seconds)
+        )
         return resp.data[0].embedding
 
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        resp = self.client.embeddings.create(
+            model=self.model, input=list(texts), timeout=call_timeout(settings.llm_timeout_seconds)
+        )
+        return [item.embedding for item in sorted(resp.data, key=lambda item: item.index)]
+
 
 class MockEmbeddingClient:
-    """Deterministic mock embedding for testing."""
+    """Deterministic mock embedding for testing.
+
+    `dim` can be raised to production sizes (e.g. 1536) for load tests; `latency`
+    and `error_rate` simulate a slow or flaky embedding API, and a `FixtureStore`
+    replays captured real vectors.
+    """
 
-    def __init__(self, dim: int = 16):
+    def __init__(
+        self,
+        dim: int = 16,
+        latency: Optional[LatencyProfile] = None,
+        error_rate: float = 0.0,
+        fixtures: Optional[FixtureStore] = None,
+        seed: Optional[int] = None,
+    ):
         self.dim = dim
+        self.latency = latency or LatencyProfile()
+        self.error_rate = error_rate
+        self.fixtures = fixtures
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def from_settings(cls) -> "MockEmbeddingClient":
+        fixtures = None
+        if settings.mock_fixture_mode == "replay" and settings.mock_fixture_dir:
+            fixtures = open_fixture_store(settings.mock_fixture_dir)
+        return cls(
+            dim=settings.mock_embedding_dim,
+            latency=LatencyProfile(settings.mock_embedding_latency_ms, settings.mock_embedding_latency_stddev_ms),
+            error_rate=settings.mock_embedding_error_rate,
+            fixtures=fixtures,
+            seed=settings.mock_seed,
+        )
 
     def embed(self, text: str) -> List[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        # One simulated API round trip per call, like a batched request.
+        delay = self.latency.sample(self.rng)
+        if delay:
+            bounded_sleep(delay)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise MockProviderError("mock embedding error")
+        return [self._vector(text) for text in texts]
+
+    def _vector(self, text: str) -> List[float]:
+        if self.fixtures:
+            vector = self.fixtures.lookup_embedding(text)
+            if vector is not None:
+                return vector
         digest = hashlib.sha256(text.encode("utf-8")).digest()
-        # Produce a small deterministic vector.
+        # Extend the digest with chained hashes so any dimension is covered.
+        stream = digest
+        block = digest
+        while len(stream) < self.dim + 1:
+            block = hashlib.sha256(block).digest()
+            stream += block
         vals = []
         for i in range(self.dim):
-            vals.append(int.from_bytes(digest[i : i + 2], "little") / 65535.0)
+            vals.append(int.from_bytes(stream[i : i + 2], "little") / 65535.0)
         return vals
+
+
+class PrecomputedEmbeddingClient:
+    """Serves vectors computed up front (e.g. one embed_many per batch), else delegates."""
+
+    def __init__(self, vectors: Dict[str, List[float]], fallback: EmbeddingClient):
+        self.vectors = vectors
+        self.fallback = fallback
+
+    def embed(self, text: str) -> List[float]:
+        vector = self.vectors.get(text)
+        if vector is not None:
+            return vector
+        return self.fallback.embed(text)
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        missing = [text for text in dict.fromkeys(texts) if text not in self.vectors]
+        computed = dict(zip(missing, self.fallback.embed_many(missing))) if missing else {}
+        return [self.vectors.get(text) or computed[text] for text in texts]
+
+
+class CachingEmbeddingClient:
+    """LRU memo in front of another client, e.g. for one long-lived connection."""
+
+    def __init__(self, inner: EmbeddingClient, max_entries: int = 256):
+        self.inner = inner
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, text: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+            return vector
+
+    def _put(self, text: str, vector: List[float]) -> None:
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def embed(self, text: str) -> List[float]:
+        vector = self._get(text)
+        record_cache("embedding", vector is not None)
+        if vector is None:
+            vector = self.inner.embed(text)
+            self._put(text, vector)
+        return vector
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        found = {text: self._get(text) for text in dict.fromkeys(texts)}
+        missing = [text for text, vector in found.items() if vector is None]
+        if missing:
+            for text, vector in zip(missing, self.inner.embed_many(missing)):
+                self._put(text, vector)
+                found[text] = vector
+        return [found[text] for text in texts]
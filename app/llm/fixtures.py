@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from app.llm.base import LLMClient, LLMMessage, LLMResponse
+
+
+def _digest(payload: object) -> str:
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:24]
+
+
+def _last_user(messages: List[LLMMessage]) -> str:
+    last = next((m for m in reversed(messages) if m.role == "user"), None)
+    return last.content if last else ""
+
+
+def prompt_key(messages: List[LLMMessage]) -> str:
+    return _digest([[m.role, m.content] for m in messages])
+
+
+def question_key(messages: List[LLMMessage]) -> str:
+    return _digest(_last_user(messages))
+
+
+class FixtureStore:
+    """Captured LLM responses and embeddings stored as JSON files in one directory.
+
+    LLM fixtures are looked up by the exact prompt first and then by the last
+    user message, so a replay still matches when retrieved documents differ.
+    """
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self._by_prompt: Dict[str, dict] = {}
+        self._by_question: Dict[str, dict] = {}
+        self._embeddings: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not self.directory.exists():
+            return
+        for path in sorted(self.directory.glob("*.json")):
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("kind") == "embedding":
+                self._embeddings[data["key"]] = data["vector"]
+            else:
+                self._by_prompt[data["prompt_key"]] = data
+                self._by_question.setdefault(data["question_key"], data)
+
+    def _write(self, name: str, data: dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{name}.json").write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+
+    def lookup_chat(self, messages: List[LLMMessage]) -> Optional[dict]:
+        with self._lock:
+            return self._by_prompt.get(prompt_key(messages)) or self._by_question.get(question_key(messages))
+
+    def save_chat(self, messages: List[LLMMessage], fixture: dict) -> None:
+        data = dict(fixture, kind="chat", prompt_key=prompt_key(messages), question_key=question_key(messages))
+        with self._lock:
+            self._by_prompt[data["prompt_key"]] = data
+            self._by_question[data["question_key"]] = data
+            self._write(f"chat-{data['prompt_key']}", data)
+
+    def lookup_embedding(self, text: str) -> Optional[List[float]]:
+        with self._lock:
+            return self._embeddings.get(_digest(text))
+
+    def save_embedding(self, text: str, vector: List[float]) -> None:
+        key = _digest(text)
+        with self._lock:
+            self._embeddings[key] = vector
+            self._write(f"embedding-{key}", {"kind": "embedding", "key": key, "vector": vector})
+
+
+@lru_cache
+def open_fixture_store(directory: str) -> FixtureStore:
+    return FixtureStore(directory)
+
+
+class RecordingLLMClient(LLMClient):
+    """Pass-through client that captures responses and timing for later replay."""
+
+    def __init__(self, inner: LLMClient, store: FixtureStore):
+        self.inner = inner
+        self.store = store
+
+    def generate_chat(
+        self, messages: List[LLMMessage], model: str, temperature: float, max_tokens: int
+    ) -> LLMResponse:
+        started = time.monotonic()
+        response = self.inner.generate_chat(
+            messages=messages, model=model, temperature=temperature, max_tokens=max_tokens
+        )
+        elapsed_ms = (time.monotonic() - started) * 1000
+        self.store.save_chat(
+            messages,
+            {
+                "content": response.content,
+                "provider": response.provider,
+                "model": response.model,
+                "usage": response.usage,
+                "ttft_ms": elapsed_ms,
+                "chunks": [response.content],
+                "chunk_delays_ms": [0.0],
+            },
+        )
+        return response
+
+    def stream_chat(
+        self, messages: List[LLMMessage], model: str, temperature: float, max_tokens: int
+    ) -> Iterable[str]:
+        started = last = time.monotonic()
+        chunks: List[str] = []
+        delays: List[float] = []
+        for chunk in self.inner.stream_chat(
+            messages=messages, model=model, temperature=temperature, max_tokens=max_tokens
+        ):
+            now = time.monotonic()
+            delays.append((now - last) * 1000)
+            last = now
+            chunks.append(chunk)
+            yield chunk
+        content = "".join(chunks)
+        self.store.save_chat(
+            messages,
+            {
+                "content": content,
+                "provider": "recorded",
+                "model": model,
+                "usage": {},
+                "ttft_ms": delays[0] if delays else (time.monotonic() - started) * 1000,
+                "chunks": chunks,
+                "chunk_delays_ms": [0.0] + delays[1:],
+            },
+        )
+
+
+class RecordingEmbeddingClient:
+    def __init__(self, inner, store: FixtureStore):
+        self.inner = inner
+        self.store = store
+
+    def embed(self, text: str) -> List[float]:
+        vector = self.inner.embed(text)
+        self.store.save_embedding(text, list(vector))
+        return vector
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.inner.embed_many(texts)
+        for text, vector in zip(texts, vectors):
+            self.store.save_embedding(text, list(vector))
+        return vectors
@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import contextvars
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.llm.base import LLMClient, LLMMessage, LLMResponse, current_stage
+
+
+log = structlog.get_logger()
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when every configured backend failed for a request."""
+
+    def __init__(self, errors: Dict[str, Exception]):
+        self.errors = errors
+        detail = ", ".join(f"{name}: {exc!r}" for name, exc in errors.items())
+        super().__init__(f"All LLM backends failed ({detail})")
+
+
+@dataclass
+class LLMBackend:
+    name: str
+    client: LLMClient
+    # When set, replaces the model requested by the caller (e.g. a fallback model).
+    model: Optional[str] = None
+
+    def resolve_model(self, requested: str) -> str:
+        return self.model or requested
+
+
+class LatencyTracker:
+    """Rolling window of latency samples for one backend.
+
+    Failures are recorded as penalty samples so a backend that errors or times out
+    drifts to the end of the ranking. Samples older than `recovery_seconds` are
+    discarded so a demoted backend gets another chance once it has been idle.
+    """
+
+    def __init__(self, window: int = 100, failure_penalty: float = 30.0, recovery_seconds: float = 300.0):
+        self.failure_penalty = failure_penalty
+        self.recovery_seconds = recovery_seconds
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._last_sample_at = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self._last_sample_at = time.monotonic()
+
+    def record_failure(self) -> None:
+        self.record(self.failure_penalty)
+
+    def p95(self, default: Optional[float] = None) -> Optional[float]:
+        with self._lock:
+            if self._samples and time.monotonic() - self._last_sample_at > self.recovery_seconds:
+                self._samples.clear()
+            if not self._samples:
+                return default
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+
+class LatencyRegistry:
+    """Process-wide trackers shared across requests.
+
+    There is one tracker per backend, mode and stage. The modes are `ttft`
+    (time to first token of a stream) and `total` (time to a complete answer).
+    They are not comparable, and neither are a short classifier call and a long
+    answer, so each pair is ranked on its own samples.
+    """
+
+    def __init__(self, window: int = 100, failure_penalty: float = 30.0, recovery_seconds: float = 300.0):
+        self.window = window
+        self.failure_penalty = failure_penalty
+        self.recovery_seconds = recovery_seconds
+        self._trackers: Dict[Tuple[str, str, str], LatencyTracker] = {}
+        self._lock = threading.Lock()
+
+    def tracker(self, name: str, mode: str = "total", stage: str = "default") -> LatencyTracker:
+        key = (name, mode, stage)
+        with self._lock:
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = LatencyTracker(self.window, self.failure_penalty, self.recovery_seconds)
+                self._trackers[key] = tracker
+            return tracker
+
+    def snapshot(self) -> Dict[str, dict]:
+        """`{backend: {mode: {stage: {p95_seconds, samples}}}}`."""
+        with self._lock:
+            items = list(self._trackers.items())
+        snapshot: Dict[str, dict] = {}
+        for (name, mode, stage), tracker in items:
+            snapshot.setdefault(name, {}).setdefault(mode, {})[stage] = {
+                "p95_seconds": tracker.p95(),
+                "samples": tracker.sample_count(),
+            }
+        return snapshot
+
+
+latency_registry = LatencyRegistry()
+# A primary plus one hedge for every call the admission controller lets through.
+_executor = ThreadPoolExecutor(max_workers=settings.llm_max_concurrency * 2, thread_name_prefix="llm-hedge")
+
+
+class HedgedLLMClient(LLMClient):
+    """Composite client that hedges and fails over across several backends.
+
+    Backends are ranked by rolling p95 latency for the current stage: time to
+    first token for streams, time to the full answer otherwise. The fastest one
+    is called first; if it has not answered once its own p95 has elapsed, a hedge
+    request is sent to the next backend and whichever answers first wins. A
+    failing backend triggers failover to the next one in the ranking. The p95
+    clock starts when a worker picks the attempt up, so time spent queued for
+    the executor neither delays into a hedge nor counts as provider latency.
+
+    With hedging on, non-streaming calls are also served from the backends'
+    streams, so a losing attempt is stopped at its next chunk and gives back its
+    admission slot instead of running to completion. Such answers carry no
+    provider usage; callers fall back to estimating tokens.
+    """
+
+    def __init__(
+        self,
+        backends: List[LLMBackend],
+        registry: LatencyRegistry = latency_registry,
+        hedge_enabled: bool = True,
+        hedge_min_delay: float = 0.25,
+        hedge_default_delay: float = 2.0,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ):
+        if not backends:
+            raise ValueError("HedgedLLMClient requires at least one backend")
+        self.backends = backends
+        self.registry = registry
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.executor = executor or _executor
+
+    def ranked_backends(self, mode: str = "total", stage: Optional[str] = None) -> List[LLMBackend]:
+        """Order backends by rolling p95; unmeasured backends follow in configured order."""
+        stage = stage or current_stage()
+        scored = []
+        for position, backend in enumerate(self.backends):
+            p95 = self.registry.tracker(backend.name, mode, stage).p95()
+            scored.append((p95 is None, p95 or 0.0, position, backend))
+        scored.sort(key=lambda item: item[:3])
+        return [item[3] for item in scored]
+
+    def _hedge_delay(self, tracker: LatencyTracker) -> float:
+        return max(self.hedge_min_delay, tracker.p95(default=self.hedge_default_delay))
+
+    def _attempt(
+        self,
+        backend: LLMBackend,
+        stop: threading.Event,
+        messages: List[LLMMessage],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+    ) -> Optional[LLMResponse]:
+        """One backend's answer, or None if `stop` was set before it finished."""
+        model = backend.resolve_model(model)
+        if not self.hedge_enabled:
+            return backend.client.generate_chat(
+                messages=messages, model=model, temperature=temperature, max_tokens=max_tokens
+            )
+        chunks: List[str] = []
+        stream = iter(
+            backend.client.stream_chat(messages=messages, model=model, temperature=temperature, max_tokens=max_tokens)
+        )
+        try:
+            for chunk in stream:
+                if stop.is_set():
+                    return None
+                chunks.append(chunk)
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+        return LLMResponse(
+            content="".join(chunks), provider=backend.name.partition(":")[0], model=model, usage={}
+        )
+
+    def generate_chat(
+        self, messages: List[LLMMessage], model: str, temperature: float, max_tokens: int
+    ) -> LLMResponse:
+        stage = current_stage()
+        ranked = self.ranked_backends("total", stage)
+        pending: Dict[Future, LLMBackend] = {}
+        stops: Dict[Future, threading.Event] = {}
+        errors: Dict[str, Exception] = {}
+        next_index = 0
+        # Set when the newest attempt starts running in a worker, or to "now" after a failure.
+        hedge_at: List[Optional[float]] = [None]
+        delay = self.hedge_default_delay
+
+        def launch() -> None:
+            nonlocal next_index, delay
+            backend = ranked[next_index]
+            next_index += 1
+            tracker = self.registry.tracker(backend.name, "total", stage)
+            stop = threading.Event()
+            started: List[float] = []
+            delay = self._hedge_delay(tracker)
+            hedge_at[0] = None
+
+            def run() -> Optional[LLMResponse]:
+                started.append(time.monotonic())
+                if hedge_at[0] is None:
+                    hedge_at[0] = started[0] + delay
+                return self._attempt(backend, stop, messages, model, temperature, max_tokens)
+
+            def record(future: Future) -> None:
+                if future.cancelled() or not started:
+                    return
+                if future.exception() is not None:
+                    tracker.record_failure()
+                elif future.result() is not None:
+                    tracker.record(time.monotonic() - started[0])
+
+            # copy_context carries the request deadline into the worker thread.
+            future = self.executor.submit(contextvars.copy_context().run, run)
+            future.add_done_callback(record)
+            pending[future] = backend
+            stops[future] = stop
+
+        launch()
+        try:
+            while pending:
+                can_hedge = self.hedge_enabled and next_index < len(ranked) and len(pending) == 1
+                timeout = None
+                if can_hedge:
+                    # Still queued for a worker: a hedge would queue behind it, so look again later.
+                    timeout = delay if hedge_at[0] is None else max(0.0, hedge_at[0] - time.monotonic())
+                done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    if hedge_at[0] is not None and time.monotonic() >= hedge_at[0]:
+                        log.info("llm.hedge", primary=pending[next(iter(pending))].name, hedge=ranked[next_index].name)
+                        launch()
+                    continue
+                for future in done:
+                    backend = pending.pop(future)
+                    exc = future.exception()
+                    if exc is None:
+                        return future.result()
+                    log.warning("llm.backend_failed", backend=backend.name, error=repr(exc))
+                    errors[backend.name] = exc
+                    # The primary is already past its p95 or gone: move on without waiting again.
+                    hedge_at[0] = time.monotonic()
+                if not pending and next_index < len(ranked):
+                    launch()
+            raise LLMUnavailableError(errors)
+        finally:
+            # Losers still queued are dropped; running ones stop at their next chunk.
+            for future in pending:
+                future.cancel()
+                stops[future].set()
+
+    def stream_chat(
+        self, messages: List[LLMMessage], model: str, temperature: float, max_tokens: int
+    ) -> Iterable[str]:
+        # Read the stage now: the generator body first runs wherever the caller iterates it.
+        return self._stream(messages, model, temperature, max_tokens, current_stage())
+
+    def _stream(
+        self, messages: List[LLMMessage], model: str, temperature: float, max_tokens: int, stage: str
+    ) -> Iterator[str]:
+        ranked = self.ranked_backends("ttft", stage)
+        events: "queue.Queue[tuple]" = queue.Queue()
+        stops: Dict[str, threading.Event] = {}
+        errors: Dict[str, Exception] = {}
+        next_index = 0
+        hedge_at: Optional[float] = None
+
+        def pump(backend: LLMBackend, stop: threading.Event) -> None:
+            tracker = self.registry.tracker(backend.name, "ttft", stage)
+            started = time.monotonic()
+            events.put((backend, "start", started))
+            first = True
+            stream = None
+            try:
+                stream = iter(
+                    backend.client.stream_chat(
+                        messages=messages,
+                        model=backend.resolve_model(model),
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                    )
+                )
+                for chunk in stream:
+                    if stop.is_set():
+                        return
+                    if first:
+                        tracker.record(time.monotonic() - started)
+                        first = False
+                    events.put((backend, "token", chunk))
+                events.put((backend, "end", None))
+            except Exception as exc:  # surfaced to the consumer for failover
+                tracker.record_failure()
+                events.put((backend, "error", exc))
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+
+        def launch() -> None:
+            nonlocal next_index, hedge_at
+            backend = ranked[next_index]
+            next_index += 1
+            stop = threading.Event()
+            stops[backend.name] = stop
+            self.executor.submit(contextvars.copy_context().run, pump, backend, stop)
+            # Armed by the attempt's "start" event, once a worker is actually running it.
+            hedge_at = None
+
+        winner: Optional[LLMBackend] = None
+        live = 0
+        try:
+            launch()
+            live = 1
+            while live:
+                can_hedge = (
+                    winner is None and self.hedge_enabled and next_index < len(ranked) and live == 1
+                    and hedge_at is not None
+                )
+                timeout = max(0.0, hedge_at - time.monotonic()) if can_hedge else None
+                try:
+                    backend, kind, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    log.info("llm.hedge", hedge=ranked[next_index].name, stream=True)
+                    launch()
+                    live += 1
+                    continue
+                if winner is not None and backend is not winner:
+                    continue
+                if kind == "start":
+                    if hedge_at is None and backend is ranked[next_index - 1]:
+                        hedge_at = value + self._hedge_delay(self.registry.tracker(backend.name, "ttft", stage))
+                elif kind == "token":
+                    if winner is None:
+                        winner = backend
+                        for name, stop in stops.items():
+                            if name != backend.name:
+                                stop.set()
+                        live = 1
+                    yield value
+                elif kind == "end":
+                    if winner is None:
+                        winner = backend
+                    return
+                else:
+                    if winner is not None:
+                        raise value
+                    log.warning("llm.backend_failed", backend=backend.name, error=repr(value), stream=True)
+                    errors[backend.name] = value
+                    live -= 1
+                    hedge_at = time.monotonic()
+                    if not live and next_index < len(ranked):
+                        launch()
+                        live = 1
+            raise LLMUnavailableError(errors)
+        finally:
+            for stop in stops.values():
+                stop.set()
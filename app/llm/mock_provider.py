@@ -1,27 +1,134 @@
 from __future__ import annotations
 
-from typing import List
+import random
+from dataclasses import dataclass
+from typing import List, Optional
 
+from app.core.config import settings
+from app.core.deadline import bounded_sleep
 from app.llm.base import LLMClient, LLMMessage, LLMResponse
+from app.llm.fixtures import FixtureStore, open_fixture_store
+from app.utils.tokens import estimate_message_tokens, estimate_tokens
+
+
+class MockProviderError(RuntimeError):
+    """Injected failure used to exercise retry, failover and shedding paths."""
+
+
+@dataclass
+class LatencyProfile:
+    """Normally distributed latency in milliseconds, clipped at zero."""
+
+    mean_ms: float = 0.0
+    stddev_ms: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.mean_ms <= 0 and self.stddev_ms <= 0:
+            return 0.0
+        return max(0.0, rng.gauss(self.mean_ms, self.stddev_ms)) / 1000
 
 
 class MockProvider(LLMClient):
+    """Offline provider with optional latency, throughput and failure simulation.
+
+    By default it answers instantly with an echo of the last user message. With a
+    `FixtureStore` it replays captured responses, including their recorded timing.
+    """
+
+    def __init__(
+        self,
+        ttft: Optional[LatencyProfile] = None,
+        tokens_per_second: float = 0.0,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_seconds: float = 30.0,
+        fixtures: Optional[FixtureStore] = None,
+        seed: Optional[int] = None,
+    ):
+        self.ttft = ttft or LatencyProfile()
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.fixtures = fixtures
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def from_settings(cls) -> "MockProvider":
+        fixtures = None
+        if settings.mock_fixture_mode == "replay" and settings.mock_fixture_dir:
+            fixtures = open_fixture_store(settings.mock_fixture_dir)
+        return cls(
+            ttft=LatencyProfile(settings.mock_llm_ttft_ms, settings.mock_llm_ttft_stddev_ms),
+            tokens_per_second=settings.mock_llm_tokens_per_second,
+            error_rate=settings.mock_llm_error_rate,
+            timeout_rate=settings.mock_llm_timeout_rate,
+            timeout_seconds=settings.mock_llm_timeout_seconds,
+            fixtures=fixtures,
+            seed=settings.mock_seed,
+        )
+
+    def _inject_failures(self) -> None:
+        roll = self.rng.random()
+        if roll < self.timeout_rate:
+            bounded_sleep(self.timeout_seconds)
+            raise TimeoutError("mock llm timed out")
+        if roll < self.timeout_rate + self.error_rate:
+            raise MockProviderError("mock llm error")
+
+    def _plan(self, messages: List[LLMMessage], model: str) -> dict:
+        """Chunks to emit and the delay before each one."""
+        fixture = self.fixtures.lookup_chat(messages) if self.fixtures else None
+        if fixture:
+            return {
+                "content": fixture["content"],
+                "chunks": fixture["chunks"],
+                "delays": [fixture.get("ttft_ms", 0.0) / 1000]
+                + [delay / 1000 for delay in fixture.get("chunk_delays_ms", [])[1:]],
+                "provider": "mock",
+                "model": fixture.get("model") or model,
+                "usage": dict(fixture.get("usage") or {}, mock=True, replayed=True),
+            }
+        last_user = next((m for m in reversed(messages) if m.role == "user"), None)
+        answer = f"(mock answer) {last_user.content if last_user else ''}".strip()
+        chunks = [token + " " for token in answer.split(" ")]
+        per_token = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        return {
+            "content": answer,
+            "chunks": chunks,
+            "delays": [self.ttft.sample(self.rng)] + [per_token] * (len(chunks) - 1),
+            "provider": "mock",
+            "model": model,
+            "usage": {
+                "mock": True,
+                "prompt_tokens": estimate_message_tokens(messages),
+                "completion_tokens": estimate_tokens(answer),
+            },
+        }
+
     def generate_chat(
         self, messages: List[LLMMessage], model: str, temperature: float, max_tokens: int
     ) -> LLMResponse:
-        last_user = next((m for m in reversed(messages) if m.role == "user"), None)
-        answer = f"(mock answer) {last_user.content if last_user else ''}".strip()
+        self._inject_failures()
+        plan = self._plan(messages, model)
+        delay = sum(plan["delays"])
+        if delay:
+            bounded_sleep(delay)
         return LLMResponse(
-            content=answer,
-            provider="mock",
-            model=model,
-            usage={"mock": True, "prompt_tokens": 0, "completion_tokens": len(answer)},
+            content=plan["content"],
+            provider=plan["provider"],
+            model=plan["model"],
+            usage=plan["usage"],
         )
 
     def stream_chat(
         self, messages: List[LLMMessage], model: str, temperature: float, max_tokens: int
     ):
-        last_user = next((m for m in reversed(messages) if m.role == "user"), None)
-        answer = f"(mock answer) {last_user.content if last_user else ''}".strip()
-        for token in answer.split(" "):
-            yield token + " "
+        self._inject_failures()
+        plan = self._plan(messages, model)
+        delays = plan["delays"]
+        for index, chunk in enumerate(plan["chunks"]):
+            delay = delays[index] if index < len(delays) else 0.0
+            if delay:
+                bounded_sleep(delay)
+            yield chunk
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Optional
 
 from openai import OpenAI
 
+from app.core.deadline import call_timeout
 from app.llm.base import LLMClient, LLMMessage, LLMResponse
 
 
 class OpenAIProvider(LLMClient):
-    def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=api_key)
+    def __init__(self, api_key: str, timeout: Optional[float] = None):
+        self.client = OpenAI(api_key=api_key, timeout=timeout)
+        self.timeout = timeout
 
     def generate_chat(
         self, messages: List[LLMMessage], model: str, temperature: float, max_tokens: int
@@ -22,6 +24,7 @@ class OpenAIProvider(LLMClient):
             messages=payload,
             temperature=temperature,
             max_tokens=max_tokens,
+            timeout=call_timeout(self.timeout),
         )
         content = response.choices[0].message.content
         usage = response.usage
@@ -46,6 +49,7 @@ class OpenAIProvider(LLMClient):
             temperature=temperature,
             max_tokens=max_tokens,
             stream=True,
+            timeout=call_timeout(self.timeout),
         )
         for chunk in stream:
             if not chunk.choices:
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import structlog
+
+from app.core.config import settings
+from app.core.metrics import llm_request_seconds, llm_tokens
+from app.core.tracing import span
+from app.llm.base import LLMClient, LLMMessage, LLMResponse, stage_scope
+
+
+log = structlog.get_logger()
+
+
+# Per-stage defaults used when no routing rule overrides them.
+STAGE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "resolver": {"temperature": 0.0, "max_tokens": 200},
+    "classifier": {"temperature": 0.0, "max_tokens": 50},
+    "title_selector": {"temperature": 0.0, "max_tokens": 200},
+    "summarizer": {"temperature": 0.0, "max_tokens": 256},
+}
+
+
+@dataclass
+class ModelRoute:
+    name: str
+    stage: str
+    model: str
+    temperature: float
+    max_tokens: int
+
+    def generate(self, llm_client: LLMClient, messages: List[LLMMessage]) -> LLMResponse:
+        started = time.perf_counter()
+        with span(
+            "llm.generate",
+            {"llm.stage": self.stage, "llm.model": self.model, "llm.max_tokens": self.max_tokens},
+        ) as llm_span, stage_scope(self.stage):
+            response = llm_client.generate_chat(
+                messages=messages,
+                model=self.model,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+            )
+            usage = response.usage or {}
+            for kind in ("prompt", "completion"):
+                if usage.get(f"{kind}_tokens"):
+                    llm_span.set_attribute(f"llm.{kind}_tokens", usage[f"{kind}_tokens"])
+        elapsed = time.perf_counter() - started
+        llm_request_seconds.labels(self.stage, self.model).observe(elapsed)
+        for kind in ("prompt", "completion"):
+            if usage.get(f"{kind}_tokens"):
+                llm_tokens.labels(self.stage, kind).observe(usage[f"{kind}_tokens"])
+        log.info(
+            "llm.route",
+            stage=self.stage,
+            route=self.name,
+            model=self.model,
+            latency_ms=round(elapsed * 1000, 1),
+        )
+        return response
+
+
+class ModelRouter:
+    """Pick model, temperature and max_tokens per pipeline stage.
+
+    Rules come from `settings.llm_routes` and are matched in order; the first rule
+    whose `stage`, optional `query_type` and optional `min_prompt_tokens` /
+    `max_prompt_tokens` bounds match wins. Unset fields fall back to the stage
+    defaults and then to `llm_model` / `llm_temperature` / `llm_max_tokens`.
+    """
+
+    def __init__(self, rules: Optional[Sequence[Dict[str, Any]]] = None):
+        self.rules = list(settings.llm_routes if rules is None else rules)
+
+    def route(self, stage: str, query_type: Optional[str] = None, prompt_tokens: int = 0) -> ModelRoute:
+        values: Dict[str, Any] = {
+            "model": settings.llm_model,
+            "temperature": settings.llm_temperature,
+            "max_tokens": settings.llm_max_tokens,
+        }
+        values.update(STAGE_DEFAULTS.get(stage, {}))
+        name = f"{stage}:default"
+
+        for index, rule in enumerate(self.rules):
+            if not self._matches(rule, stage, query_type, prompt_tokens):
+                continue
+            values.update({key: rule[key] for key in ("model", "temperature", "max_tokens") if key in rule})
+            name = rule.get("name") or f"{stage}:{rule.get('query_type') or '*'}#{index}"
+            break
+
+        return ModelRoute(
+            name=name,
+            stage=stage,
+            model=values["model"],
+            temperature=float(values["temperature"]),
+            max_tokens=int(values["max_tokens"]),
+        )
+
+    @staticmethod
+    def _matches(rule: Dict[str, Any], stage: str, query_type: Optional[str], prompt_tokens: int) -> bool:
+        if rule.get("stage") != stage:
+            return False
+        if rule.get("query_type") and rule["query_type"] != query_type:
+            return False
+        if "min_prompt_tokens" in rule and prompt_tokens < rule["min_prompt_tokens"]:
+            return False
+        if "max_prompt_tokens" in rule and prompt_tokens > rule["max_prompt_tokens"]:
+            return False
+        return True
@@ -2,12 +2,20 @@ from __future__ import annotations
 
 import logging
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from app.api.routes import router
+from app.api.routes import chat_writer, router
 from app.core.config import settings
-from app.core.logging import configure_logging, request_id_middleware
+from app.core.deadline import DeadlineExceeded
+from app.core.metrics import registry as metrics_registry
+from app.core.profiling import configure_profiling
+from app.core.logging import configure_logging, request_id_middleware, shutdown_logging
+from app.core.tracing import configure_tracing
+from app.db.session import engine, read_engine
+from app.llm.admission import AdmissionRejected
+from app.llm.hedged import LLMUnavailableError
 
 
 configure_logging()
@@ -25,6 +33,40 @@ app.add_middleware(
 )
 
 app.include_router(router)
+configure_profiling(app, {engine, read_engine})
+# Added last so the request span wraps every other middleware.
+configure_tracing(app, {engine, read_engine})
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service overloaded, retry later", "scope": exc.scope, "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after_seconds)},
+    )
+
+
+@app.exception_handler(LLMUnavailableError)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailableError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "All LLM backends failed, retry later", "backends": sorted(exc.errors)},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(
+        status_code=504,
+        content={"detail": str(exc), "stage": exc.stage, "budget_seconds": exc.budget},
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.on_event("startup")
@@ -35,3 +77,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("application.shutdown")
+    if chat_writer is not None:
+        # Drain queued chat writes before the process exits.
+        chat_writer.close(timeout=settings.persistence_shutdown_timeout_seconds)
+    shutdown_logging()
@@ -26,10 +26,16 @@ class SessionSchema(BaseModel):
     created_at: datetime
     updated_at: datetime
     messages: List[MessageSchema]
+    next_cursor: Optional[str] = None
 
     model_config = {"from_attributes": True}
 
 
+class MessagePage(BaseModel):
+    messages: List[MessageSchema]
+    next_cursor: Optional[str] = None
+
+
 class EntitySchema(BaseModel):
     id: Optional[str] = None
     name: Optional[str] = None
@@ -47,6 +53,11 @@ class ChatRequest(BaseModel):
     stream: bool = False
 
 
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest] = Field(min_length=1)
+    concurrency: Optional[int] = Field(default=None, ge=1)
+
+
 class DebugInfo(BaseModel):
     entity_candidates: Optional[List[dict]] = None
     retrieval_count: Optional[int] = None
@@ -54,6 +65,7 @@ class DebugInfo(BaseModel):
     model: Optional[str] = None
     query_type: Optional[str] = None
     selected_titles: Optional[List[str]] = None
+    routes: Optional[Dict[str, str]] = None
 
 
 class ChatResponse(BaseModel):
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 import json
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain, islice
 from uuid import UUID
 
 from sqlalchemy import func, select
@@ -10,12 +14,20 @@ from sqlalchemy.orm import Session
 import structlog
 
 from app.core.config import settings
+from app.core.logging import top_candidates
+from app.core.metrics import record_cache, stage_seconds
 from app.db.models import Entity
+from app.db.statements import entity_candidates_statement, uses_fixed_statements
 from app.llm.base import LLMClient, LLMMessage
+from app.llm.routing import ModelRouter
 from app.utils.fuzzy import best_fuzzy_match
+from app.utils.tokens import estimate_message_tokens
 
 log = structlog.get_logger()
 
+# Fuzzy score a candidate name needs before a query counts as naming it.
+DEFAULT_SCORE_CUTOFF = 70
+
 
 class EntityResolverResult:
     def __init__(
@@ -23,57 +35,168 @@ class EntityResolverResult:
         entity: Optional[Entity],
         candidates: List[Dict],
         query_type: Optional[str] = None,
+        route: Optional[str] = None,
     ):
         self.entity = entity
         self.candidates = candidates
         self.query_type = query_type
+        self.route = route
+
+
+class EntityCandidateCache:
+    """LRU of candidate entities per (city, state, limit) filter, loaded once and shared.
+
+    Cached entities are expunged from the loading session so they can be read from
+    any thread or session afterwards (only column attributes are used). With
+    `ttl_seconds` an entry is reloaded once it is older than that, so a cache shared
+    by the whole process picks up new and renamed entities. City and state come
+    from clients, so at most `max_keys` filters are kept; the least recently used
+    one is evicted first, and expired entries are dropped whenever they are met.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_keys: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[tuple, Tuple[float, List[Entity]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, loaded_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - loaded_at > self.ttl_seconds
+
+    def get_or_load(self, session: Session, key: tuple, loader: Callable[[], Sequence[Entity]]) -> List[Entity]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and self._expired(cached[0], time.monotonic()):
+                del self._entries[key]
+                cached = None
+            record_cache("entity_candidates", cached is not None)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                return cached[1]
+        # Loaded outside the lock so a slow filter does not hold up the others; a
+        # concurrent miss on the same key loads twice and the last one wins.
+        entities = list(loader())
+        for entity in entities:
+            session.expunge(entity)
+        with self._lock:
+            now = time.monotonic()
+            self._entries[key] = (now, entities)
+            self._entries.move_to_end(key)
+            # Expired entries sit wherever they were last used; clear those at the old end first.
+            while self._entries:
+                oldest_key, (loaded_at, _) = next(iter(self._entries.items()))
+                if len(self._entries) <= self.max_keys and not self._expired(loaded_at, now):
+                    break
+                del self._entries[oldest_key]
+        return entities
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def load_candidates(
+    session: Session,
+    city: Optional[str],
+    state: Optional[str],
+    limit: Optional[int] = None,
+    cache: Optional[EntityCandidateCache] = None,
+) -> List[Entity]:
+    def load() -> Sequence[Entity]:
+        with stage_seconds.labels("entity_candidates").time():
+            if uses_fixed_statements(session):
+                params = {"city": city.lower() if city else None, "state": state.lower() if state else None, "limit": limit}
+                statement = entity_candidates_statement(city, state)
+                return session.scalars(
+                    select(Entity).from_statement(statement).execution_options(**statement.get_execution_options()),
+                    params,
+                ).all()
+            q = select(Entity)
+            if city:
+                q = q.where(func.lower(Entity.city) == city.lower())
+            if state:
+                q = q.where(func.lower(Entity.state) == state.lower())
+            if limit:
+                q = q.limit(limit)
+            return session.scalars(q).all()
+
+    if cache is None:
+        return list(load())
+    key = ((city or "").lower(), (state or "").lower(), limit)
+    return cache.get_or_load(session, key, load)
+
+
+def shown_candidates_k() -> int:
+    """Candidates the resolver log line and the debug payload show together; 0 means all."""
+    k = settings.log_candidates_top_k
+    if settings.debug:
+        debug_k = settings.debug_candidates_top_k
+        k = max(k, debug_k) if k > 0 and debug_k > 0 else 0
+    return k
+
+
+def _candidate_dict(entity: Entity, score: float) -> Dict:
+    return {
+        "id": str(entity.id),
+        "name": entity.name,
+        "entity_type": entity.entity_type,
+        "city": entity.city,
+        "state": entity.state,
+        "score": score,
+    }
+
+
+def mentions_entity(query: str, entities: Sequence[Entity], score_cutoff: int = DEFAULT_SCORE_CUTOFF) -> bool:
+    """Whether the query names any of `entities`; used to spot follow-up turns."""
+    return best_fuzzy_match(query, [e.name for e in entities], score_cutoff=score_cutoff) is not None
 
 
 class EntityResolver:
     """Fuzzy resolver using entities.name only."""
 
-    def __init__(self, score_cutoff: int = 70):
+    def __init__(self, score_cutoff: int = DEFAULT_SCORE_CUTOFF, candidate_cache: Optional[EntityCandidateCache] = None):
         self.score_cutoff = score_cutoff
+        self.candidate_cache = candidate_cache
+
+    def candidates(self, session: Session, city: Optional[str] = None, state: Optional[str] = None) -> List[Entity]:
+        return load_candidates(session, city, state, cache=self.candidate_cache)
 
     def resolve(
-        self, session: Session, query: str, city: Optional[str] = None, state: Optional[str] = None
+        self,
+        session: Session,
+        query: str,
+        city: Optional[str] = None,
+        state: Optional[str] = None,
+        entities: Optional[Sequence[Entity]] = None,
     ) -> EntityResolverResult:
-        q = select(Entity)
-        if city:
-            q = q.where(func.lower(Entity.city) == city.lower())
-        if state:
-            q = q.where(func.lower(Entity.state) == state.lower())
+        """Best fuzzy match among `entities` (loaded for city/state when not given).
 
-        entities = session.scalars(q).all()
+        `candidates` on the result holds only what gets logged or shown in the
+        debug payload (`shown_candidates_k`), best match first; serializing every
+        cached candidate on each request is wasted work.
+        """
+        if entities is None:
+            entities = self.candidates(session, city, state)
         names = [e.name for e in entities]
         match = best_fuzzy_match(query, names, score_cutoff=self.score_cutoff)
 
-        matched_entity: Optional[Entity] = None
-        candidates: List[Dict] = []
-
-        for entity in entities:
-            score = 0.0
-            if match and match[0] == entity.name:
-                score = match[1]
-                matched_entity = entity
-            candidates.append(
-                {
-                    "id": str(entity.id),
-                    "name": entity.name,
-                    "entity_type": entity.entity_type,
-                    "city": entity.city,
-                    "state": entity.state,
-                    "score": score,
-                }
-            )
+        matched = [e for e in entities if e.name == match[0]] if match else []
+        matched_entity: Optional[Entity] = matched[-1] if matched else None
+        # Only the match scores above 0, so this is the order top_candidates would pick.
+        ranked = chain(matched, (e for e in entities if not match or e.name != match[0]))
+        k = shown_candidates_k()
+        candidates = [
+            _candidate_dict(entity, match[1] if entity in matched else 0.0)
+            for entity in (ranked if k <= 0 else islice(ranked, k))
+        ]
 
         log.info(
             "entity_resolver.candidates",
             query=query,
             city=city,
             state=state,
-            candidate_count=len(candidates),
-            candidates=candidates,
+            candidate_count=len(entities),
+            candidates=top_candidates(candidates, settings.log_candidates_top_k),
             best_match=matched_entity.name if matched_entity else None,
             best_score=match[1] if match else None,
             mode="fuzzy",
@@ -85,20 +208,31 @@ class EntityResolver:
 class LLMEntityResolver:
     """LLM-based resolver: provide candidates, ask model to pick or return none."""
 
-    def __init__(self, llm_client: LLMClient, candidate_limit: int = 50):
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        candidate_limit: int = 50,
+        router: Optional[ModelRouter] = None,
+        candidate_cache: Optional[EntityCandidateCache] = None,
+    ):
         self.llm_client = llm_client
         self.candidate_limit = candidate_limit
+        self.router = router or ModelRouter()
+        self.candidate_cache = candidate_cache
+
+    def candidates(self, session: Session, city: Optional[str] = None, state: Optional[str] = None) -> List[Entity]:
+        return load_candidates(session, city, state, limit=self.candidate_limit, cache=self.candidate_cache)
 
     def resolve(
-        self, session: Session, query: str, city: Optional[str] = None, state: Optional[str] = None
+        self,
+        session: Session,
+        query: str,
+        city: Optional[str] = None,
+        state: Optional[str] = None,
+        entities: Optional[Sequence[Entity]] = None,
     ) -> EntityResolverResult:
-        q = select(Entity)
-        if city:
-            q = q.where(func.lower(Entity.city) == city.lower())
-        if state:
-            q = q.where(func.lower(Entity.state) == state.lower())
-        q = q.limit(self.candidate_limit)
-        entities = session.scalars(q).all()
+        if entities is None:
+            entities = self.candidates(session, city, state)
 
         candidates = [
             {
@@ -138,15 +272,12 @@ class LLMEntityResolver:
             }
         )
 
-        response = self.llm_client.generate_chat(
-            messages=[
-                LLMMessage(role="system", content=prompt),
-                LLMMessage(role="user", content=user_content),
-            ],
-            model=settings.llm_model,
-            temperature=0.0,
-            max_tokens=200,
-        )
+        messages = [
+            LLMMessage(role="system", content=prompt),
+            LLMMessage(role="user", content=user_content),
+        ]
+        route = self.router.route("resolver", prompt_tokens=estimate_message_tokens(messages))
+        response = route.generate(self.llm_client, messages)
 
         log.info(
             "entity_resolver.llm_response",
@@ -166,13 +297,15 @@ class LLMEntityResolver:
             city=city,
             state=state,
             candidate_count=len(candidates),
-            candidates=candidates,
+            candidates=top_candidates(candidates, settings.log_candidates_top_k),
             best_match=matched_entity.name if matched_entity else None,
             best_score=None,
             mode="llm",
         )
 
-        return EntityResolverResult(entity=matched_entity, candidates=candidates, query_type=query_type)
+        return EntityResolverResult(
+            entity=matched_entity, candidates=candidates, query_type=query_type, route=route.name
+        )
 
     def _parse_response(self, content: str, candidates: List[Dict]) -> Tuple[Optional[str], Optional[str]]:
         try:
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import math
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.db.models import SessionState
+
+
+@dataclass
+class TurnState:
+    """What the previous turn of a session resolved and retrieved.
+
+    `entity_id`, `query_type` and `doc_ids` are also saved in `SessionState.state`;
+    the documents and the query embedding only live in process.
+    """
+
+    entity_id: Optional[str]
+    query_type: str
+    doc_ids: List[str] = field(default_factory=list)
+    documents: Optional[List[dict]] = None
+    embedding: Optional[List[float]] = None
+
+
+def cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
+    if len(a) != len(b):
+        return 0.0
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class FollowUpTracker:
+    """Per-session memory of the last turn, used to short-cut follow-up questions.
+
+    A follow-up that names no entity (no candidate reaches the resolver's score
+    cutoff) keeps the previous entity instead of running the resolver. When its query embedding is within
+    `reuse_similarity` of the previous one the previous documents are reused
+    as-is; within `delta_similarity` only the top `delta_limit` documents are
+    fetched and merged into the previous set.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1024,
+        reuse_similarity: float = 0.97,
+        delta_similarity: float = 0.85,
+        delta_limit: int = 3,
+    ):
+        self.max_sessions = max_sessions
+        self.reuse_similarity = reuse_similarity
+        self.delta_similarity = delta_similarity
+        self.delta_limit = delta_limit
+        self._sessions: "OrderedDict[uuid.UUID, TurnState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def previous(self, db: Session, session_id: uuid.UUID) -> Optional[TurnState]:
+        with self._lock:
+            turn = self._sessions.get(session_id)
+            if turn is not None:
+                self._sessions.move_to_end(session_id)
+                return turn
+        state = db.get(SessionState, session_id)
+        data = state.state if state and state.state else {}
+        if not data.get("entity_id"):
+            return None
+        return TurnState(
+            entity_id=data["entity_id"],
+            query_type=data.get("query_type") or "general",
+            doc_ids=list(data.get("doc_ids") or []),
+        )
+
+    def record(self, session_id: uuid.UUID, turn: TurnState) -> None:
+        with self._lock:
+            self._sessions[session_id] = turn
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
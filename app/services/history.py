@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import threading
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, List, Optional, Set
+
+import structlog
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.metrics import record_cache
+from app.db.models import ChatMessage, SessionState
+from app.db.writer import MessageWrite, StateWrite, WriteBehindWriter
+from app.llm.base import LLMClient, LLMMessage
+from app.llm.routing import ModelRouter
+from app.utils.tokens import CHARS_PER_TOKEN, MESSAGE_OVERHEAD_TOKENS, estimate_message_tokens, estimate_tokens
+
+
+log = structlog.get_logger()
+
+_summary_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="history-summary")
+
+SUMMARY_PROMPT = (
+    "Summarize this conversation between a user and an assistant in a few sentences. "
+    "Keep the schools, places, dates and facts the user asked about, and what was already answered."
+)
+
+
+@dataclass
+class HistoryTurn:
+    role: str
+    content: str
+    created_at: datetime
+    tokens: int = 0
+    # `chat_messages.id` of the turn, when known.
+    message_id: Optional[uuid.UUID] = None
+
+    def __post_init__(self) -> None:
+        if not self.tokens:
+            self.tokens = estimate_tokens(self.content) + MESSAGE_OVERHEAD_TOKENS
+
+
+@dataclass
+class SessionHistory:
+    summary: str = ""
+    summary_until: Optional[datetime] = None
+    turns: Deque[HistoryTurn] = field(default_factory=deque)
+    # Every message id this entry has seen, to tell whether `last_message_id` is one of ours.
+    message_ids: Set[str] = field(default_factory=set)
+    compacting: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def turn_tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+
+class HistoryCache:
+    """LRU of `SessionHistory` entries, shared across requests in one process."""
+
+    def __init__(self, max_sessions: int = 1024):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[uuid.UUID, SessionHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: uuid.UUID) -> Optional[SessionHistory]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions.move_to_end(session_id)
+            return entry
+
+    def discard(self, session_id: uuid.UUID, entry: SessionHistory) -> None:
+        """Drop `entry` unless another thread already replaced it."""
+        with self._lock:
+            if self._sessions.get(session_id) is entry:
+                del self._sessions[session_id]
+
+    def put(self, session_id: uuid.UUID, entry: SessionHistory) -> SessionHistory:
+        with self._lock:
+            # Another thread may have warmed the same session meanwhile; keep the first.
+            entry = self._sessions.setdefault(session_id, entry)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return entry
+
+
+class HistoryService:
+    """Recent turns per session, bounded by a token budget.
+
+    A cache miss warms the entry from `session_state` (running summary) and the
+    `chat_messages` written after it, plus whatever the writer still holds for
+    the session, so an entry evicted before its turns were flushed comes back
+    whole. Callers check that the session belongs to the requesting user first.
+    A hit is checked against the persisted `last_message_id`: when another
+    worker answered in the session since, the entry is behind and is warmed
+    again. Once the cached turns exceed `token_budget`, the oldest are folded
+    into the running summary until they fit in half the budget, and the
+    summary is saved to `SessionState.state`. Folded turns stay in the entry
+    until their summary replaces them, so no prompt misses them meanwhile.
+    Prompt cost therefore stays roughly constant however long the conversation.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[HistoryCache] = None,
+        llm_client: Optional[LLMClient] = None,
+        router: Optional[ModelRouter] = None,
+        writer: Optional[WriteBehindWriter] = None,
+        token_budget: int = 1500,
+        max_messages: int = 50,
+        background: bool = True,
+    ):
+        self.cache = cache or HistoryCache()
+        self.llm_client = llm_client
+        self.router = router or ModelRouter()
+        self.writer = writer
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+        self.background = background
+
+    def _warm(self, db: Session, session_id: uuid.UUID) -> SessionHistory:
+        entry = SessionHistory()
+        pending = self.writer.pending(session_id) if self.writer is not None else []
+        row = db.get(SessionState, session_id)
+        state = dict(row.state or {}) if row else {}
+        for item in pending:
+            if isinstance(item, StateWrite):
+                state.update(item.patch)
+        if state.get("last_message_id"):
+            entry.message_ids.add(state["last_message_id"])
+        entry.summary = state.get("history_summary") or ""
+        until = state.get("history_summary_until")
+        entry.summary_until = datetime.fromisoformat(until) if until else None
+        stmt = (
+            select(ChatMessage)
+            .where(ChatMessage.session_id == session_id)
+            .order_by(ChatMessage.created_at.desc())
+            .limit(self.max_messages)
+        )
+        if entry.summary_until is not None:
+            stmt = stmt.where(ChatMessage.created_at > entry.summary_until)
+        records = db.scalars(stmt).all()
+        turns = {
+            record.id: HistoryTurn(record.role, record.content, record.created_at, message_id=record.id)
+            for record in records
+        }
+        for item in pending:
+            if isinstance(item, MessageWrite) and (entry.summary_until is None or item.created_at > entry.summary_until):
+                turns.setdefault(item.id, HistoryTurn(item.role, item.content, item.created_at, message_id=item.id))
+        entry.message_ids.update(str(message_id) for message_id in turns)
+        entry.turns.extend(sorted(turns.values(), key=lambda turn: turn.created_at)[-self.max_messages:])
+        return self.cache.put(session_id, entry)
+
+    def get(self, db: Session, session_id: uuid.UUID) -> SessionHistory:
+        entry = self.cache.get(session_id)
+        if entry is not None and self._behind(db, session_id, entry):
+            log.info("history.stale", session_id=str(session_id))
+            self.cache.discard(session_id, entry)
+            entry = None
+        record_cache("history", entry is not None)
+        return entry or self._warm(db, session_id)
+
+    @staticmethod
+    def _behind(db: Session, session_id: uuid.UUID, entry: SessionHistory) -> bool:
+        """True when the last persisted answer is one this entry never saw (another worker wrote it)."""
+        row = db.get(SessionState, session_id)
+        last = (row.state or {}).get("last_message_id") if row else None
+        with entry.lock:
+            return last is not None and last not in entry.message_ids
+
+    def messages(self, db: Session, session_id: uuid.UUID) -> List[LLMMessage]:
+        """Summary plus the newest turns that fit in the token budget, oldest first."""
+        entry = self.get(db, session_id)
+        with entry.lock:
+            summary = entry.summary
+            turns = list(entry.turns)
+        budget = self.token_budget
+        selected: List[LLMMessage] = []
+        for turn in reversed(turns):
+            if turn.tokens > budget:
+                break
+            budget -= turn.tokens
+            selected.append(LLMMessage(role=turn.role, content=turn.content))
+        selected.reverse()
+        if summary:
+            selected.insert(0, LLMMessage(role="system", content=f"Summary of the earlier conversation:\n{summary}"))
+        return selected
+
+    def append(self, session_id: uuid.UUID, *turns: HistoryTurn) -> None:
+        """Record finished turns; only updates sessions that are already cached."""
+        entry = self.cache.get(session_id)
+        if entry is None:
+            # Not warmed in this process; the next request loads it from the database.
+            return
+        with entry.lock:
+            entry.turns.extend(turns)
+            entry.message_ids.update(str(turn.message_id) for turn in turns if turn.message_id)
+            due = not entry.compacting and entry.turn_tokens() > self.token_budget
+            if due:
+                entry.compacting = True
+        if due:
+            if self.background:
+                _summary_executor.submit(self._compact, session_id, entry)
+            else:
+                self._compact(session_id, entry)
+
+    def _compact(self, session_id: uuid.UUID, entry: SessionHistory) -> None:
+        try:
+            with entry.lock:
+                # Only read here: the turns stay until the summary replacing them is in place.
+                folded: List[HistoryTurn] = []
+                remaining = entry.turn_tokens()
+                for turn in entry.turns:
+                    if remaining <= self.token_budget // 2:
+                        break
+                    folded.append(turn)
+                    remaining -= turn.tokens
+                previous = entry.summary
+            if not folded:
+                return
+            summary = self._summarize(previous, folded)
+            with entry.lock:
+                # New turns are only ever appended, and only one compaction runs per entry.
+                for _ in folded:
+                    entry.turns.popleft()
+                entry.summary = summary
+                entry.summary_until = folded[-1].created_at
+            log.info("history.compacted", session_id=str(session_id), turns=len(folded), summary_tokens=estimate_tokens(summary))
+            if self.writer is not None:
+                self.writer.enqueue(
+                    StateWrite(
+                        session_id=session_id,
+                        patch={"history_summary": summary, "history_summary_until": folded[-1].created_at.isoformat()},
+                    )
+                )
+        except Exception:
+            log.exception("history.compact_failed", session_id=str(session_id))
+        finally:
+            with entry.lock:
+                entry.compacting = False
+
+    def _summarize(self, previous: str, turns: List[HistoryTurn]) -> str:
+        transcript = "\n".join(f"{turn.role}: {turn.content}" for turn in turns)
+        if previous:
+            transcript = f"Earlier summary: {previous}\n{transcript}"
+        messages = [LLMMessage(role="system", content=SUMMARY_PROMPT), LLMMessage(role="user", content=transcript)]
+        route = self.router.route("summarizer", prompt_tokens=estimate_message_tokens(messages))
+        if self.llm_client is not None:
+            try:
+                return route.generate(self.llm_client, messages).content.strip()
+            except Exception as exc:
+                log.warning("history.summarize_failed", error=repr(exc))
+        # Without a model keep the most recent part of the transcript that fits the summary budget.
+        return transcript[-route.max_tokens * CHARS_PER_TOKEN:]
@@ -1,25 +1,77 @@
 from __future__ import annotations
 
-import json
-from typing import Generator, List, Optional
+import copy
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 import structlog
 from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
 
+from app.core import profiling
 from app.core.config import settings
-from app.db.models import ChatMessage, ChatSession, SessionState
-from app.llm.base import LLMClient, LLMMessage
+from app.core.deadline import Deadline, DeadlineExceeded, deadline_scope
+from app.core.logging import top_candidates
+from app.core.metrics import (
+    documents_retrieved,
+    llm_request_seconds,
+    llm_tokens,
+    llm_tokens_per_second,
+    llm_ttft_seconds,
+    record_cache,
+    stage_seconds,
+)
+from app.core.tracing import span, start_span
+from app.db.models import ChatMessage, Entity
+from app.db.session import is_statement_timeout, replica_reads, set_statement_timeout
+from app.db.writer import MessageWrite, PendingWrite, StateWrite, WriteBehindWriter
+from app.llm.admission import AdmissionRejected
+from app.llm.base import LLMClient, LLMMessage, stage_scope
+from app.llm.routing import ModelRoute, ModelRouter
 from app.schemas.chat import ChatRequest, ChatResponse, EntitySchema
-from app.services.entity_resolver import EntityResolver, EntityResolverResult
+from app.services.history import HistoryService, HistoryTurn
+from app.services.entity_resolver import (
+    DEFAULT_SCORE_CUTOFF,
+    EntityCandidateCache,
+    EntityResolver,
+    EntityResolverResult,
+    mentions_entity,
+)
+from app.services.followup import FollowUpTracker, TurnState, cosine_similarity
 from app.services.retrieval import RetrievalService
+from app.services.sessions import SessionAccessDenied, authorize_session
 from app.services.query_classifier import QueryClassifier
+from app.services.quota import QuotaExceeded, QuotaReservation, TokenQuota
 from app.utils.citations import build_citation_map, format_citations
-from app.llm.embeddings import EmbeddingClient
+from app.utils.sse import TokenCoalescer
+from app.llm.embeddings import CachingEmbeddingClient, EmbeddingClient, PrecomputedEmbeddingClient
+from app.utils.tokens import estimate_message_tokens, estimate_tokens
 
 
 log = structlog.get_logger()
 
+StageResult = TypeVar("StageResult")
+
 
 SYSTEM_PROMPT = (
     "You are a helpful assistant that answers questions in simple language that is easy to understand. "
@@ -29,6 +81,37 @@ SYSTEM_PROMPT = (
 )
 
 
+def _session_uuid(value: str) -> Optional[uuid.UUID]:
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+@dataclass
+class ConversationContext:
+    """Per-connection retrieval results kept warm between turns (e.g. one WebSocket).
+
+    The entity a follow-up stays on comes from the orchestrator's FollowUpTracker,
+    the same as over HTTP.
+    """
+
+    max_cached_retrievals: int = 32
+    _retrievals: "OrderedDict[tuple, List[dict]]" = field(default_factory=OrderedDict)
+
+    def cached_retrieval(self, key: tuple) -> Optional[List[dict]]:
+        documents = self._retrievals.get(key)
+        record_cache("retrieval_context", documents is not None)
+        if documents is not None:
+            self._retrievals.move_to_end(key)
+        return documents
+
+    def cache_retrieval(self, key: tuple, documents: List[dict]) -> None:
+        self._retrievals[key] = documents
+        while len(self._retrievals) > self.max_cached_retrievals:
+            self._retrievals.popitem(last=False)
+
+
 class ChatOrchestrator:
     def __init__(
         self,
@@ -37,32 +120,231 @@ class ChatOrchestrator:
         query_classifier: QueryClassifier,
         llm_client: LLMClient,
         embedding_client: EmbeddingClient,
+        router: Optional[ModelRouter] = None,
+        writer: Optional[WriteBehindWriter] = None,
+        history_service: Optional[HistoryService] = None,
+        followups: Optional[FollowUpTracker] = None,
+        token_quota: Optional[TokenQuota] = None,
     ):
         self.entity_resolver = entity_resolver
         self.retrieval_service = retrieval_service
         self.query_classifier = query_classifier
         self.llm_client = llm_client
         self.embedding_client = embedding_client
+        self.router = router or ModelRouter()
+        self.writer = writer
+        self.history_service = history_service
+        self.followups = followups
+        self.token_quota = token_quota
+
+    @staticmethod
+    @contextmanager
+    def _db_budget(db: Session, deadline: Deadline) -> Iterator[None]:
+        """Apply the remaining budget as statement_timeout to the SQL run inside the block."""
+        set_statement_timeout(db, deadline.timeout())
+        try:
+            yield
+        except DBAPIError as exc:
+            if is_statement_timeout(exc):
+                raise deadline.exceeded() from exc
+            raise
+
+    @staticmethod
+    def _fit_route(route: ModelRoute, deadline: Deadline) -> ModelRoute:
+        """Trim max_tokens to what the provider can generate before the deadline."""
+        max_tokens = deadline.max_tokens(route.max_tokens, settings.llm_tokens_per_second)
+        if max_tokens >= route.max_tokens:
+            return route
+        log.info("deadline.max_tokens_trimmed", route=route.name, requested=route.max_tokens, max_tokens=max_tokens)
+        return replace(route, max_tokens=max_tokens)
+
+    def _history(self, db: Session, payload: ChatRequest, deadline: Deadline) -> List[LLMMessage]:
+        session_id = _session_uuid(payload.session_id)
+        if self.history_service is None or session_id is None:
+            return []
+        with self._db_budget(db, deadline):
+            return self.history_service.messages(db, session_id)
+
+    def _previous_turn(self, db: Session, payload: ChatRequest) -> Optional[TurnState]:
+        session_id = _session_uuid(payload.session_id)
+        if self.followups is None or session_id is None:
+            return None
+        return self.followups.previous(db, session_id)
+
+    def _follow_up_entity(
+        self, db: Session, payload: ChatRequest, previous: Optional[TurnState], entities: Sequence[Entity]
+    ) -> Optional[Entity]:
+        """The previous turn's entity when this message names none of `entities`.
+
+        Uses the resolver's own score cutoff, so a name the resolver would match is
+        never skipped as a follow-up.
+        """
+        if previous is None or not previous.entity_id:
+            return None
+        score_cutoff = getattr(self.entity_resolver, "score_cutoff", DEFAULT_SCORE_CUTOFF)
+        if mentions_entity(payload.message, entities, score_cutoff=score_cutoff):
+            return None
+        return db.get(Entity, uuid.UUID(previous.entity_id))
+
+    def _resolve_query(
+        self,
+        db: Session,
+        payload: ChatRequest,
+        deadline: Deadline,
+        previous: Optional[TurnState] = None,
+    ) -> Tuple[EntityResolverResult, str, Dict[str, str]]:
+        """Resolve the entity and query_type; returns the model routes used along the way.
+
+        Candidates are loaded once and shared by the follow-up check and the
+        resolver. A follow-up that names no entity, or one the resolver cannot
+        place, stays on the previous turn's entity.
+        """
+        routes: Dict[str, str] = {}
+        with replica_reads(db), self._db_budget(db, deadline):
+            entities = self.entity_resolver.candidates(db, city=payload.city, state=payload.state)
+            follow_up_entity = self._follow_up_entity(db, payload, previous, entities)
+            if follow_up_entity is not None:
+                log.info("entity_resolver.follow_up", entity_id=previous.entity_id)
+                resolver_result = EntityResolverResult(entity=follow_up_entity, candidates=[])
+            else:
+                resolver_result = self.entity_resolver.resolve(
+                    db, payload.message, city=payload.city, state=payload.state, entities=entities
+                )
+                if resolver_result.entity is None and previous is not None and previous.entity_id:
+                    resolver_result.entity = db.get(Entity, uuid.UUID(previous.entity_id))
+        if resolver_result.route:
+            routes["resolver"] = resolver_result.route
+        query_type = resolver_result.query_type
+        if self.query_classifier and query_type is None:
+            query_type, routes["classifier"] = self.query_classifier.classify_with_route(payload.message)
+        if not query_type:
+            query_type = "general"
+        return resolver_result, query_type, routes
+
+    def _retrieve_documents(
+        self,
+        db: Session,
+        entity,
+        query_type: str,
+        message: str,
+        deadline: Deadline,
+        context: Optional[ConversationContext] = None,
+        previous: Optional[TurnState] = None,
+    ) -> Tuple[List[dict], Optional[List[float]]]:
+        """Documents for the turn plus the query embedding (None when served from the context cache)."""
+        if not entity:
+            return [], None
+        key = (str(entity.id), query_type, " ".join(message.lower().split()))
+        if context is not None:
+            documents = context.cached_retrieval(key)
+            if documents is not None:
+                return documents, None
+        with stage_seconds.labels("embedding").time(), span("embedding.embed", {"embedding.inputs": 1}):
+            query_embedding = self.embedding_client.embed(message)
+        with replica_reads(db), self._db_budget(db, deadline), span(
+            "retrieval.search", {"retrieval.query_type": query_type}
+        ) as search_span:
+            documents = self._follow_up_documents(db, entity, query_type, message, query_embedding, previous)
+            if documents is None:
+                documents = self._search_documents(db, entity, query_type, message, query_embedding)
+            search_span.set_attribute("retrieval.doc_count", len(documents))
+        documents_retrieved.labels(query_type).observe(len(documents))
+        if context is not None:
+            context.cache_retrieval(key, documents)
+        return documents, query_embedding
+
+    def _follow_up_documents(
+        self,
+        db: Session,
+        entity,
+        query_type: str,
+        message: str,
+        query_embedding: List[float],
+        previous: Optional[TurnState],
+    ) -> Optional[List[dict]]:
+        """Reuse or top up the previous turn's documents when the query barely moved."""
+        if (
+            previous is None
+            or previous.entity_id != str(entity.id)
+            or previous.query_type != query_type
+            or previous.documents is None
+            or previous.embedding is None
+        ):
+            return None
+        similarity = cosine_similarity(query_embedding, previous.embedding)
+        if similarity >= self.followups.reuse_similarity:
+            log.info("retrieval.follow_up", mode="reuse", similarity=round(similarity, 3))
+            return previous.documents
+        if similarity < self.followups.delta_similarity:
+            return None
+        fresh = self.retrieval_service.fetch_documents_by_similarity(
+            session=db,
+            entity_id=str(entity.id),
+            query=message,
+            embedding_client=self.embedding_client,
+            limit=self.followups.delta_limit,
+            query_embedding=query_embedding,
+        )
+        fresh_ids = {doc["id"] for doc in fresh}
+        merged = fresh + [doc for doc in previous.documents if doc["id"] not in fresh_ids]
+        log.info("retrieval.follow_up", mode="delta", similarity=round(similarity, 3), new_docs=len(fresh))
+        return merged[: max(len(previous.documents), len(fresh))]
+
+    def _search_documents(
+        self, db: Session, entity, query_type: str, message: str, query_embedding: List[float]
+    ) -> List[dict]:
+        entity_id = str(entity.id)
+        if query_type == "school_performance_report":
+            csv_docs = self.retrieval_service.fetch_documents_by_similarity(
+                session=db,
+                entity_id=entity_id,
+                query=message,
+                embedding_client=self.embedding_client,
+                include_source_types=["csv"],
+                limit=5,
+                query_embedding=query_embedding,
+            )
+            non_csv_docs = self.retrieval_service.fetch_documents_by_similarity(
+                session=db,
+                entity_id=entity_id,
+                query=message,
+                embedding_client=self.embedding_client,
+                exclude_source_types=["csv"],
+                limit=5,
+                query_embedding=query_embedding,
+            )
+            seen_ids = set()
+            documents = []
+            for doc in csv_docs + non_csv_docs:
+                if doc["id"] in seen_ids:
+                    continue
+                seen_ids.add(doc["id"])
+                documents.append(doc)
+            return documents
+        return self.retrieval_service.fetch_documents_by_similarity(
+            session=db,
+            entity_id=entity_id,
+            query=message,
+            embedding_client=self.embedding_client,
+            limit=10,
+            query_embedding=query_embedding,
+        )
 
-    # def _load_session(self, db: Session, session_id: str) -> ChatSession:
-    #     session = db.get(ChatSession, session_id)
-    #     if not session:
-    #         raise ValueError("Session not found")
-    #     return session
-
-    # def _history_messages(self, db: Session, session_id: str) -> List[ChatMessage]:
-    #     stmt = (
-    #         select(ChatMessage)
-    #         .where(ChatMessage.session_id == session_id)
-    #         .order_by(ChatMessage.created_at.desc())
-    #         .limit(settings.history_window)
-    #     )
-    #     records = list(reversed(db.scalars(stmt).all()))
-    #     return records
+    @staticmethod
+    def _entity_schema(entity) -> Optional[EntitySchema]:
+        if not entity:
+            return None
+        return EntitySchema(
+            id=str(entity.id),
+            name=entity.name,
+            type=entity.entity_type,
+            city=entity.city,
+            state=entity.state,
+        )
 
     def _build_llm_messages(
         self,
-        history: List[ChatMessage],
+        history: List[LLMMessage],
         documents: List[dict],
         user_message: ChatMessage,
     ) -> List[LLMMessage]:
@@ -88,19 +370,162 @@ class ChatOrchestrator:
         llm_messages.append(LLMMessage(role=user_message.role, content=user_message.content))
         return llm_messages
 
-    def handle_chat(self, db: Session, payload: ChatRequest) -> ChatResponse:
-        # Persistence and history are temporarily disabled.
-        # chat_session = self._load_session(db, payload.session_id)
-        # if payload.user_id and not chat_session.user_id:
-        #     chat_session.user_id = payload.user_id
-        # user_message = ChatMessage(
-        #     session_id=chat_session.id,
-        #     role="user",
-        #     content=payload.message,
-        #     meta={},
-        # )
-        # db.add(user_message)
-        # db.flush()
+    def _reserve_tokens(
+        self,
+        payload: ChatRequest,
+        client_ip: Optional[str],
+        history: List[LLMMessage],
+        documents: List[dict],
+        user_message: ChatMessage,
+        route: ModelRoute,
+    ) -> Tuple[List[LLMMessage], List[dict], ModelRoute, Optional[QuotaReservation]]:
+        """Reserve the turn's estimated tokens against the caller's quota.
+
+        Over budget, the context is shrunk until it fits: history is dropped first,
+        then documents are halved, then max_tokens is cut. QuotaExceeded is raised
+        when even that does not fit.
+        """
+        llm_messages = self._build_llm_messages(history, documents, user_message)
+        keys = self.token_quota.keys(user=payload.user_id, session=payload.session_id, ip=client_ip) if self.token_quota else []
+        if not keys:
+            return llm_messages, documents, route, None
+        while True:
+            prompt_tokens = estimate_message_tokens(llm_messages)
+            try:
+                reservation = self.token_quota.reserve(keys, prompt_tokens + route.max_tokens)
+                return llm_messages, documents, route, reservation
+            except QuotaExceeded as exc:
+                if history:
+                    history = []
+                elif documents:
+                    documents = documents[: len(documents) // 2]
+                else:
+                    max_tokens = exc.available - prompt_tokens
+                    if max_tokens < settings.token_quota_min_completion_tokens:
+                        log.info("quota.exceeded", key=exc.key, available=exc.available)
+                        raise
+                    route = replace(route, max_tokens=max_tokens)
+                log.info(
+                    "quota.downgraded",
+                    key=exc.key,
+                    available=exc.available,
+                    history=len(history),
+                    docs=len(documents),
+                    max_tokens=route.max_tokens,
+                )
+                llm_messages = self._build_llm_messages(history, documents, user_message)
+
+    @staticmethod
+    def _settle_tokens(
+        reservation: Optional[QuotaReservation], llm_messages: List[LLMMessage], usage: Optional[dict], answer: str
+    ) -> None:
+        if reservation is None:
+            return
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens") or estimate_message_tokens(llm_messages)
+        completion_tokens = usage.get("completion_tokens") or estimate_tokens(answer)
+        reservation.settle(prompt_tokens + completion_tokens)
+
+    def _record_question(self, payload: ChatRequest, started_at: datetime) -> None:
+        """Queue the user's message before generation, so a turn that fails still records what was asked."""
+        session_id = _session_uuid(payload.session_id)
+        if session_id is None:
+            return
+        if self.history_service is not None:
+            self.history_service.append(session_id, HistoryTurn("user", payload.message, started_at))
+        if self.writer is not None:
+            self.writer.enqueue(
+                MessageWrite(session_id=session_id, role="user", content=payload.message, created_at=started_at)
+            )
+
+    def _persist_turn(
+        self,
+        payload: ChatRequest,
+        answer: str,
+        entity,
+        query_type: str,
+        documents: List[dict],
+        query_embedding: Optional[List[float]],
+        provider: str,
+        model: str,
+        usage: Optional[dict] = None,
+    ) -> None:
+        """Record the answer in history and follow-up state and queue it for persistence.
+
+        The user's message was already queued by `_record_question`.
+        """
+        session_id = _session_uuid(payload.session_id)
+        if session_id is None:
+            log.warning("persistence.invalid_session_id", session_id=payload.session_id)
+            return
+        entity_id = str(entity.id) if entity else None
+        doc_ids = [doc["id"] for doc in documents]
+        if self.followups is not None:
+            self.followups.record(
+                session_id,
+                TurnState(
+                    entity_id=entity_id,
+                    query_type=query_type,
+                    doc_ids=doc_ids,
+                    documents=documents,
+                    embedding=query_embedding,
+                ),
+            )
+        message_id = uuid.uuid4()
+        if self.history_service is not None:
+            self.history_service.append(
+                session_id, HistoryTurn("assistant", answer, datetime.utcnow(), message_id=message_id)
+            )
+        if self.writer is None:
+            return
+        assistant_message = MessageWrite(
+            id=message_id,
+            session_id=session_id,
+            role="assistant",
+            content=answer,
+            meta={
+                "provider": provider,
+                "model": model,
+                "usage": usage or {},
+                "entity_id": entity_id,
+                "doc_ids": doc_ids,
+            },
+        )
+        writes: List[PendingWrite] = [
+            assistant_message,
+            StateWrite(
+                session_id=session_id,
+                patch={
+                    "entity_id": entity_id,
+                    "query_type": query_type,
+                    "doc_ids": doc_ids,
+                    "last_message_id": str(assistant_message.id),
+                },
+            ),
+        ]
+        self.writer.enqueue(*writes)
+
+    def handle_chat(
+        self,
+        db: Session,
+        payload: ChatRequest,
+        deadline: Optional[Deadline] = None,
+        client_ip: Optional[str] = None,
+    ) -> ChatResponse:
+        """Answer one message; raises DeadlineExceeded once `deadline` (default: settings) is spent.
+
+        Raises SessionAccessDenied (404/403) before any work if the session does
+        not exist or belongs to another user.
+        """
+        deadline = deadline or Deadline(settings.request_deadline_ms / 1000)
+        with deadline_scope(deadline), profiling.attach():
+            authorize_session(db, payload.session_id, payload.user_id)
+            return self._handle_chat(db, payload, deadline, client_ip)
+
+    def _handle_chat(
+        self, db: Session, payload: ChatRequest, deadline: Deadline, client_ip: Optional[str]
+    ) -> ChatResponse:
+        started_at = datetime.utcnow()
         user_message = ChatMessage(
             session_id=None,
             role="user",
@@ -109,48 +534,17 @@ class ChatOrchestrator:
         )
 
         log.info("<<<Fetching entity for user query>>>")
-        resolver_result: EntityResolverResult = self.entity_resolver.resolve(
-            db, payload.message, city=payload.city, state=payload.state
-        )
+        deadline.begin("entity_resolution")
+        with stage_seconds.labels("entity_resolution").time(), span("chat.entity_resolution"):
+            previous = self._previous_turn(db, payload)
+            resolver_result, query_type, routes = self._resolve_query(db, payload, deadline, previous=previous)
         entity = resolver_result.entity
-        query_type = resolver_result.query_type
-        if self.query_classifier and query_type is None:
-            query_type = self.query_classifier.classify(payload.message)
-        if not query_type:
-            query_type = "general"
 
         log.info("<<<Fetching documents for the entity>>>")
-        if query_type == "school_performance_report":
-            csv_docs = self.retrieval_service.fetch_documents_by_similarity(
-                session=db,
-                entity_id=str(entity.id) if entity else None,
-                query=payload.message,
-                embedding_client=self.embedding_client,
-                include_source_types=["csv"],
-                limit=5,
-            )
-            non_csv_docs = self.retrieval_service.fetch_documents_by_similarity(
-                session=db,
-                entity_id=str(entity.id) if entity else None,
-                query=payload.message,
-                embedding_client=self.embedding_client,
-                exclude_source_types=["csv"],
-                limit=5,
-            )
-            seen_ids = set()
-            documents = []
-            for doc in csv_docs + non_csv_docs:
-                if doc["id"] in seen_ids:
-                    continue
-                seen_ids.add(doc["id"])
-                documents.append(doc)
-        else:
-            documents = self.retrieval_service.fetch_documents_by_similarity(
-                session=db,
-                entity_id=str(entity.id) if entity else None,
-                query=payload.message,
-                embedding_client=self.embedding_client,
-                limit=10,
+        deadline.begin("retrieval")
+        with stage_seconds.labels("retrieval").time(), span("chat.retrieval"):
+            documents, query_embedding = self._retrieve_documents(
+                db, entity, query_type, payload.message, deadline, previous=previous
             )
         log.info(
             "retrieval.results",
@@ -158,56 +552,57 @@ class ChatOrchestrator:
             entity_id=str(entity.id) if entity else None,
             query_type=query_type,
             doc_count=len(documents),
-            doc_titles=[doc.get("title") for doc in documents],
+            doc_titles=[doc.get("title") for doc in documents[: settings.log_candidates_top_k or None]],
         )
 
-        history: List[ChatMessage] = []
+        deadline.begin("history")
+        with stage_seconds.labels("history").time(), span("chat.history"):
+            history = self._history(db, payload, deadline)
         llm_messages = self._build_llm_messages(history, documents, user_message)
 
         log.info("<<<Sending message to llm for QA>>>")
 
-        response = self.llm_client.generate_chat(
-            messages=llm_messages,
-            model=settings.llm_model,
-            temperature=settings.llm_temperature,
-            max_tokens=settings.llm_max_tokens,
+        deadline.begin("generation")
+        route = self.router.route(
+            "answer", query_type=query_type, prompt_tokens=estimate_message_tokens(llm_messages)
+        )
+        routes["answer"] = route.name
+        route = self._fit_route(route, deadline)
+        llm_messages, documents, route, reservation = self._reserve_tokens(
+            payload, client_ip, history, documents, user_message, route
+        )
+        self._record_question(payload, started_at)
+        try:
+            with stage_seconds.labels("generation").time(), span("chat.generation"):
+                response = route.generate(self.llm_client, llm_messages)
+        except Exception:
+            self._settle_tokens(reservation, llm_messages, None, "")
+            raise
+        self._settle_tokens(reservation, llm_messages, response.usage, response.content)
+
+        self._persist_turn(
+            payload,
+            response.content,
+            entity,
+            query_type,
+            documents,
+            query_embedding,
+            provider=response.provider,
+            model=response.model,
+            usage=response.usage,
         )
-
-        # assistant_message = ChatMessage(
-        #     session_id=chat_session.id,
-        #     role="assistant",
-        #     content=response.content,
-        #     meta={
-        #         "provider": response.provider,
-        #         "model": response.model,
-        #         "usage": response.usage,
-        #         "entity_id": str(entity.id) if entity else None,
-        #         "doc_ids": [doc["id"] for doc in documents],
-        #     },
-        # )
-        # db.add(assistant_message)
-
-        # state = db.get(SessionState, chat_session.id)
-        # if not state:
-        #     state = SessionState(session_id=chat_session.id, state={})
-        #     db.add(state)
-        # state.state.update(
-        #     {
-        #         "entity_id": str(entity.id) if entity else None,
-        #         "last_message_id": str(assistant_message.id),
-        #     }
-        # )
 
         citation_map, order = build_citation_map(documents)
         citations = format_citations(order, citation_map)
 
         debug_payload = {
-            "entity_candidates": resolver_result.candidates,
+            "entity_candidates": top_candidates(resolver_result.candidates, settings.debug_candidates_top_k),
             "retrieval_count": len(documents),
             "provider": response.provider,
             "model": response.model,
             "query_type": query_type,
             "selected_titles": [doc.get("title") for doc in documents],
+            "routes": routes,
         }
 
         log.info(
@@ -217,17 +612,7 @@ class ChatOrchestrator:
             docs=len(documents),
         )
 
-        entity_schema = (
-            EntitySchema(
-                id=str(entity.id),
-                name=entity.name,
-                type=entity.entity_type,
-                city=entity.city,
-                state=entity.state,
-            )
-            if entity
-            else None
-        )
+        entity_schema = self._entity_schema(entity)
 
         return ChatResponse(
             session_id=payload.session_id,
@@ -237,7 +622,71 @@ class ChatOrchestrator:
             debug=debug_payload if settings.debug else None,
         )
 
-    def stream_chat(self, db: Session, payload: ChatRequest) -> Generator[str, None, None]:
+    def _stage(
+        self,
+        name: str,
+        fn: Callable[[], StageResult],
+        deadline: Deadline,
+    ) -> Generator[Tuple[str, Any], None, StageResult]:
+        """Run one blocking stage on the request's thread, emitting progress events.
+
+        The stage's own statement and HTTP timeouts are capped by the deadline; one
+        that still finishes late is reported as the stage that ran out of time.
+        """
+        deadline.begin(name)
+        yield "stage", {"stage": name, "status": "started"}
+        started = time.perf_counter()
+        with span(f"chat.{name}"):
+            result = fn()
+        deadline.check()
+        elapsed = time.perf_counter() - started
+        stage_seconds.labels(name).observe(elapsed)
+        yield "stage", {"stage": name, "status": "completed", "elapsed_ms": round(elapsed * 1000, 1)}
+        return result
+
+    def stream_events(
+        self,
+        db: Session,
+        payload: ChatRequest,
+        context: Optional[ConversationContext] = None,
+        deadline: Optional[Deadline] = None,
+        client_ip: Optional[str] = None,
+    ) -> Generator[Tuple[str, Any], None, None]:
+        """Chat pipeline as (event, data) pairs.
+
+        `entity` and `citations` are sent as soon as they are known, stages report
+        progress, tokens are coalesced into larger frames and `done` carries the
+        final ChatResponse. A `context` keeps retrieval results warm
+        across turns of one connection. Once `deadline` (default: settings) is
+        spent the turn ends with an `error` event naming the stage that ran out;
+        an exhausted token quota ends it with a 429 `error` event and a full LLM
+        queue with a 503 one, both carrying `retry_after`. An unknown session or
+        one owned by another user ends it with a 404/403 `error` event.
+        """
+        deadline = deadline or Deadline(settings.request_deadline_ms / 1000)
+        try:
+            with deadline_scope(deadline), profiling.attach():
+                authorize_session(db, payload.session_id, payload.user_id)
+                yield from self._stream_events(db, payload, context, deadline, client_ip)
+        except DeadlineExceeded as exc:
+            log.warning("chat.deadline_exceeded", stage=exc.stage, budget_s=exc.budget, elapsed_s=round(exc.elapsed, 3))
+            yield "error", {"status": 504, "detail": str(exc), "stage": exc.stage}
+        except QuotaExceeded as exc:
+            yield "error", {"status": 429, "detail": exc.detail, "retry_after": exc.headers["Retry-After"]}
+        except AdmissionRejected as exc:
+            yield "error", {"status": 503, "detail": str(exc), "retry_after": exc.retry_after_seconds}
+        except SessionAccessDenied as exc:
+            yield "error", {"status": exc.status_code, "detail": exc.detail}
+
+    def _stream_events(
+        self,
+        db: Session,
+        payload: ChatRequest,
+        context: Optional[ConversationContext],
+        deadline: Deadline,
+        client_ip: Optional[str],
+    ) -> Generator[Tuple[str, Any], None, None]:
+        started_at = datetime.utcnow()
         user_message = ChatMessage(
             session_id=None,
             role="user",
@@ -245,88 +694,126 @@ class ChatOrchestrator:
             meta={},
         )
 
-        resolver_result: EntityResolverResult = self.entity_resolver.resolve(
-            db, payload.message, city=payload.city, state=payload.state
+        previous = self._previous_turn(db, payload)
+        resolver_result, query_type, routes = yield from self._stage(
+            "entity_resolution",
+            lambda: self._resolve_query(db, payload, deadline, previous),
+            deadline,
         )
         entity = resolver_result.entity
-        query_type = resolver_result.query_type
-        if self.query_classifier and query_type is None:
-            query_type = self.query_classifier.classify(payload.message)
-        if not query_type:
-            query_type = "general"
+        entity_schema = self._entity_schema(entity)
+        yield "entity", {
+            "entity": entity_schema.model_dump(by_alias=True) if entity_schema else None,
+            "query_type": query_type,
+        }
 
-        if query_type == "school_performance_report":
-            csv_docs = self.retrieval_service.fetch_documents_by_similarity(
-                session=db,
-                entity_id=str(entity.id) if entity else None,
-                query=payload.message,
-                embedding_client=self.embedding_client,
-                include_source_types=["csv"],
-                limit=5,
-            )
-            non_csv_docs = self.retrieval_service.fetch_documents_by_similarity(
-                session=db,
-                entity_id=str(entity.id) if entity else None,
-                query=payload.message,
-                embedding_client=self.embedding_client,
-                exclude_source_types=["csv"],
-                limit=5,
-            )
-            seen_ids = set()
-            documents = []
-            for doc in csv_docs + non_csv_docs:
-                if doc["id"] in seen_ids:
-                    continue
-                seen_ids.add(doc["id"])
-                documents.append(doc)
-        else:
-            documents = self.retrieval_service.fetch_documents_by_similarity(
-                session=db,
-                entity_id=str(entity.id) if entity else None,
-                query=payload.message,
-                embedding_client=self.embedding_client,
-                limit=10,
-            )
+        documents, query_embedding = yield from self._stage(
+            "retrieval",
+            lambda: self._retrieve_documents(db, entity, query_type, payload.message, deadline, context, previous),
+            deadline,
+        )
 
-        history: List[ChatMessage] = []
+        deadline.begin("history")
+        with stage_seconds.labels("history").time(), span("chat.history"):
+            history = self._history(db, payload, deadline)
         llm_messages = self._build_llm_messages(history, documents, user_message)
 
+        deadline.begin("generation")
+        route = self.router.route(
+            "answer", query_type=query_type, prompt_tokens=estimate_message_tokens(llm_messages)
+        )
+        routes["answer"] = route.name
+        route = self._fit_route(route, deadline)
+        # Citations go out after the quota check, which may drop documents.
+        llm_messages, documents, route, reservation = self._reserve_tokens(
+            payload, client_ip, history, documents, user_message, route
+        )
+
         citation_map, order = build_citation_map(documents)
         citations = format_citations(order, citation_map)
+        yield "citations", citations
 
+        self._record_question(payload, started_at)
+        yield "stage", {"stage": "generation", "status": "started"}
         tokens: List[str] = []
-
-        for chunk in self.llm_client.stream_chat(
-            messages=llm_messages,
-            model=settings.llm_model,
-            temperature=settings.llm_temperature,
-            max_tokens=settings.llm_max_tokens,
-        ):
-            tokens.append(chunk)
-            yield f"data: {json.dumps({'event': 'token', 'data': chunk})}\n\n"
-
+        coalescer = TokenCoalescer(settings.stream_coalesce_chars, settings.stream_coalesce_ms / 1000)
+        started = time.perf_counter()
+        first_token_at: Optional[float] = None
+
+        stream = None
+        # Not made current: the span stays open across yields back to the client.
+        generation_span = start_span(
+            "llm.stream",
+            {"llm.stage": route.stage, "llm.model": route.model, "llm.max_tokens": route.max_tokens},
+        )
+        try:
+            with stage_scope(route.stage):
+                stream = iter(
+                    self.llm_client.stream_chat(
+                        messages=llm_messages,
+                        model=route.model,
+                        temperature=route.temperature,
+                        max_tokens=route.max_tokens,
+                    )
+                )
+            for chunk in stream:
+                deadline.check()
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    llm_ttft_seconds.labels(route.stage, route.model).observe(first_token_at - started)
+                tokens.append(chunk)
+                text = coalescer.add(chunk)
+                if text:
+                    yield "token", text
+        finally:
+            # Stops the upstream generation when the deadline or the client cuts the turn short.
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+            # Streams report no usage; charge what was actually generated, even if cut short.
+            self._settle_tokens(reservation, llm_messages, None, "".join(tokens))
+            generation_span.set_attribute("llm.prompt_tokens", estimate_message_tokens(llm_messages))
+            generation_span.set_attribute("llm.completion_tokens", estimate_tokens("".join(tokens)))
+            generation_span.end()
+        text = coalescer.flush()
+        if text:
+            yield "token", text
+
+        finished = time.perf_counter()
         answer = "".join(tokens)
-
-        entity_schema = (
-            EntitySchema(
-                id=str(entity.id),
-                name=entity.name,
-                type=entity.entity_type,
-                city=entity.city,
-                state=entity.state,
-            )
-            if entity
-            else None
+        completion_tokens = estimate_tokens(answer)
+        stage_seconds.labels("generation").observe(finished - started)
+        llm_request_seconds.labels(route.stage, route.model).observe(finished - started)
+        llm_tokens.labels(route.stage, "prompt").observe(estimate_message_tokens(llm_messages))
+        llm_tokens.labels(route.stage, "completion").observe(completion_tokens)
+        if first_token_at is not None and finished > first_token_at:
+            llm_tokens_per_second.labels(route.model).observe(completion_tokens / (finished - first_token_at))
+        log.info(
+            "llm.route",
+            stage=route.stage,
+            route=route.name,
+            model=route.model,
+            latency_ms=round((finished - started) * 1000, 1),
+            stream=True,
+        )
+        self._persist_turn(
+            payload,
+            answer,
+            entity,
+            query_type,
+            documents,
+            query_embedding,
+            provider=settings.llm_provider,
+            model=route.model,
         )
 
         debug_payload = {
-            "entity_candidates": resolver_result.candidates,
+            "entity_candidates": top_candidates(resolver_result.candidates, settings.debug_candidates_top_k),
             "retrieval_count": len(documents),
-            "provider": getattr(self.llm_client, "__class__", type("llm", (), {})).__name__.replace(
-                "Provider", ""
-            ).lower(),
-            "model": settings.llm_model,
+            "provider": settings.llm_provider,
+            "model": route.model,
             "query_type": query_type,
+            "routes": routes,
         }
 
         response = ChatResponse(
@@ -337,4 +824,59 @@ class ChatOrchestrator:
             debug=debug_payload if settings.debug else None,
         )
 
-        yield f"data: {json.dumps({'event': 'done', 'data': response.model_dump(by_alias=True)})}\n\n"
+        yield "done", response.model_dump(by_alias=True)
+
+    def for_connection(self) -> "ChatOrchestrator":
+        """Copy whose entity candidates, query embeddings and previous turn stay cached for a long-lived connection."""
+        conversation = copy.copy(self)
+        conversation.entity_resolver = copy.copy(self.entity_resolver)
+        if getattr(conversation.entity_resolver, "candidate_cache", None) is None:
+            conversation.entity_resolver.candidate_cache = EntityCandidateCache()
+        if conversation.followups is None:
+            # One bound session per connection.
+            conversation.followups = FollowUpTracker(max_sessions=1)
+        conversation.embedding_client = CachingEmbeddingClient(self.embedding_client)
+        return conversation
+
+    def for_batch(self, vectors: Dict[str, List[float]]) -> "ChatOrchestrator":
+        """Copy that shares entity lookups and precomputed query embeddings across a batch."""
+        batch = copy.copy(self)
+        batch.entity_resolver = copy.copy(self.entity_resolver)
+        if getattr(batch.entity_resolver, "candidate_cache", None) is None:
+            batch.entity_resolver.candidate_cache = EntityCandidateCache()
+        batch.embedding_client = PrecomputedEmbeddingClient(vectors, fallback=self.embedding_client)
+        return batch
+
+    def handle_batch(
+        self,
+        session_factory: Callable[[], ContextManager[Session]],
+        payloads: Sequence[ChatRequest],
+        concurrency: int,
+    ) -> Iterator[Tuple[int, Union[ChatResponse, Exception]]]:
+        """Run many chats with bounded concurrency, yielding (index, result) as each completes.
+
+        Every worker gets its own DB session from `session_factory`. All distinct
+        messages are embedded up front with a single `embed_many` call.
+        """
+        messages = list(dict.fromkeys(payload.message for payload in payloads))
+        with span("embedding.embed", {"embedding.inputs": len(messages)}):
+            vectors = dict(zip(messages, self.embedding_client.embed_many(messages)))
+        batch = self.for_batch(vectors)
+
+        def run(payload: ChatRequest) -> ChatResponse:
+            with session_factory() as db:
+                return batch.handle_chat(db, payload)
+
+        executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="chat-batch")
+        try:
+            futures = {executor.submit(run, payload): index for index, payload in enumerate(payloads)}
+            for future in as_completed(futures):
+                index = futures[future]
+                exc = future.exception()
+                if exc is not None:
+                    log.warning("chat.batch_item_failed", index=index, error=repr(exc))
+                    yield index, exc
+                else:
+                    yield index, future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
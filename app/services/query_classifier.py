@@ -1,38 +1,42 @@
 from __future__ import annotations
 
 import json
+from typing import Optional, Tuple
 
-from app.core.config import settings
 from app.llm.base import LLMClient, LLMMessage
+from app.llm.routing import ModelRouter
+from app.utils.tokens import estimate_message_tokens
 
 
 class QueryClassifier:
     """LLM-based classifier for query intent."""
 
-    def __init__(self, llm_client: LLMClient):
+    def __init__(self, llm_client: LLMClient, router: Optional[ModelRouter] = None):
         self.llm_client = llm_client
+        self.router = router or ModelRouter()
 
     def classify(self, query: str) -> str:
+        return self.classify_with_route(query)[0]
+
+    def classify_with_route(self, query: str) -> Tuple[str, str]:
+        """Classify and also return the name of the model route that was used."""
         prompt = (
             "Classify the user question. Respond ONLY as JSON with a single field query_type set to either "
             "\"general\" or \"school_performance_report\".\n"
             "- Use \"school_performance_report\" when the user is asking about academic performance, scores, grades, ratings, or test results.\n"
             "- Otherwise respond with \"general\"."
         )
-        response = self.llm_client.generate_chat(
-            messages=[
-                LLMMessage(role="system", content=prompt),
-                LLMMessage(role="user", content=query),
-            ],
-            model=settings.llm_model,
-            temperature=0.0,
-            max_tokens=50,
-        )
+        messages = [
+            LLMMessage(role="system", content=prompt),
+            LLMMessage(role="user", content=query),
+        ]
+        route = self.router.route("classifier", prompt_tokens=estimate_message_tokens(messages))
+        response = route.generate(self.llm_client, messages)
         try:
             data = json.loads(response.content)
             query_type = data.get("query_type")
             if query_type in {"general", "school_performance_report"}:
-                return query_type
+                return query_type, route.name
         except Exception:
             pass
-        return "general"
+        return "general", route.name
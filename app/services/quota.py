@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from app.core.rate_limit import RateLimitExceeded, RateLimitStore
+
+
+class QuotaExceeded(RateLimitExceeded):
+    """429 for a token quota; `available` is how many tokens the key could spend right now."""
+
+    def __init__(self, key: str, retry_after: float, available: int):
+        super().__init__(key, retry_after)
+        self.detail = "Token quota exceeded"
+        self.available = available
+
+
+@dataclass
+class QuotaReservation:
+    quota: "TokenQuota"
+    keys: List[str]
+    tokens: int
+
+    def settle(self, actual: int) -> None:
+        """Replace the up-front estimate with the tokens actually used (charges or refunds the difference)."""
+        delta = actual - self.tokens
+        if delta:
+            for key in self.keys:
+                self.quota.store.acquire(key, self.quota.emission, self.quota.tolerance, delta, force=True)
+        self.tokens = actual
+
+
+class TokenQuota:
+    """LLM tokens per `window` seconds per user, session and/or client IP.
+
+    Uses the rate limiter's GCRA store with the request's token count as the
+    cost, so a quota can be spent in one burst and refills continuously. Turns
+    reserve their estimated prompt + max completion tokens before the LLM call
+    and settle to the reported usage afterwards.
+    """
+
+    def __init__(
+        self,
+        store: RateLimitStore,
+        tokens: int,
+        window: float = 3600.0,
+        scopes: Sequence[str] = ("user", "session"),
+    ):
+        self.store = store
+        self.tokens = tokens
+        self.emission = window / max(1, tokens)
+        self.tolerance = window
+        self.scopes = list(scopes)
+
+    def keys(self, **identity: Optional[str]) -> List[str]:
+        return [f"tokens:{scope}:{identity[scope]}" for scope in self.scopes if identity.get(scope)]
+
+    def reserve(self, keys: Sequence[str], tokens: int) -> QuotaReservation:
+        charged: List[str] = []
+        for key in keys:
+            retry_after = self.store.acquire(key, self.emission, self.tolerance, tokens)
+            if retry_after > 0:
+                for done in charged:
+                    self.store.acquire(done, self.emission, self.tolerance, -tokens, force=True)
+                available = max(0, int(tokens - retry_after / self.emission))
+                raise QuotaExceeded(key, retry_after, available)
+            charged.append(key)
+        return QuotaReservation(self, charged, tokens)
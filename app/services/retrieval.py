@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from typing import List, Optional, Sequence
+from typing import Any, Dict, List, Optional, Sequence
 
-from sqlalchemy import select, text, func
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.metrics import stage_seconds
+from app.core.tracing import span
 from app.db.models import RawDocument
+from app.db.statements import DOCUMENTS_BY_IDS, similarity_params, similarity_statement, uses_fixed_statements
 from app.llm.embeddings import EmbeddingClient
 
 
@@ -46,8 +49,14 @@ class RetrievalService:
     def fetch_documents_by_ids(self, session: Session, document_ids: Sequence[str]) -> List[dict]:
         if not document_ids:
             return []
-        stmt = select(RawDocument).where(RawDocument.id.in_(document_ids))
-        docs = session.scalars(stmt).all()
+        with stage_seconds.labels("document_fetch").time(), span(
+            "retrieval.document_fetch", {"retrieval.requested": len(document_ids)}
+        ) as fetch_span:
+            if uses_fixed_statements(session):
+                docs = session.execute(DOCUMENTS_BY_IDS, {"ids": [str(doc_id) for doc_id in document_ids]}).all()
+            else:
+                docs = session.scalars(select(RawDocument).where(RawDocument.id.in_(document_ids))).all()
+            fetch_span.set_attribute("retrieval.doc_count", len(docs))
         ordered = {str(doc.id): doc for doc in docs}
         results = []
         for doc_id in document_ids:
@@ -75,38 +84,45 @@ class RetrievalService:
         include_source_types: Optional[Sequence[str]] = None,
         exclude_source_types: Optional[Sequence[str]] = None,
         limit: int = 10,
+        query_embedding: Optional[List[float]] = None,
     ) -> List[dict]:
         if not entity_id:
             return []
 
-        query_embedding = embedding_client.embed(query)
+        if query_embedding is None:
+            query_embedding = embedding_client.embed(query)
 
-        filters = ["(cd.entity_id = :entity_id OR cd.entity_id IS NULL)"]
-        params = {"entity_id": entity_id, "query_embedding": query_embedding, "limit": limit}
-        if include_source_types:
-            filters.append("COALESCE(rd.source_type, cd.source_type) = ANY(:include_types)")
-            params["include_types"] = list(include_source_types)
-        elif exclude_source_types:
-            filters.append("NOT (COALESCE(rd.source_type, cd.source_type) = ANY(:exclude_types))")
-            params["exclude_types"] = list(exclude_source_types)
-
-        where_clause = " AND ".join(filters)
-        sql = text(
-            f"""
-            SELECT
-                COALESCE(cd.raw_document_id, rd.id) AS raw_document_id,
-                COALESCE(rd.title, cd.section_title) AS chunk_title,
-                COALESCE(rd.source_type, cd.source_type) AS chunk_source_type,
-                MIN(cd.embedding <=> CAST(:query_embedding AS vector)) AS score
-            FROM chunked_documents cd
-            LEFT JOIN raw_documents rd ON rd.id = cd.raw_document_id
-            WHERE {where_clause}
-            GROUP BY COALESCE(cd.raw_document_id, rd.id), COALESCE(rd.title, cd.section_title), COALESCE(rd.source_type, cd.source_type)
-            ORDER BY score ASC
-            LIMIT :limit
-            """
+        ordered_ids = self.rank_document_ids(
+            session, entity_id, query_embedding, limit, include_source_types, exclude_source_types
+        )
+        return self.fetch_documents_by_ids(session, ordered_ids)
+
+    def search_chunks(self, session: Session, params: Dict[str, Any]) -> Sequence[Any]:
+        """Nearest chunk groups for `similarity_params`, best first.
+
+        Needs Postgres with pgvector whatever the dialect; there is no ORM version.
+        """
+        with stage_seconds.labels("vector_search").time(), span(
+            "retrieval.vector_search", {"retrieval.limit": params["limit"]}
+        ) as search_span:
+            rows = session.execute(similarity_statement(params), params).all()
+            search_span.set_attribute("retrieval.row_count", len(rows))
+        return rows
+
+    def rank_document_ids(
+        self,
+        session: Session,
+        entity_id: str,
+        query_embedding: Sequence[float],
+        limit: int = 10,
+        include_source_types: Optional[Sequence[str]] = None,
+        exclude_source_types: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """Raw document ids for the nearest chunks, deduplicated, with CSV chunks mapped back by title."""
+        params = similarity_params(
+            entity_id, query_embedding, limit, include_source_types, exclude_source_types
         )
-        rows = session.execute(sql, params).all()
+        rows = self.search_chunks(session, params)
 
         doc_ids: List[str] = []
         fallback_titles: List[str] = []
@@ -137,7 +153,7 @@ class RetrievalService:
                 if len(ordered_ids) >= limit:
                     break
 
-        return self.fetch_documents_by_ids(session, ordered_ids)
+        return ordered_ids
 
     def _find_raw_document_by_title(
         self, session: Session, entity_id: str, title: str
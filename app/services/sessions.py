@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import base64
+import json
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select, true, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.db.models import ChatMessage, ChatSession
+
+
+Cursor = Tuple[datetime, uuid.UUID]
+
+
+class SessionAccessDenied(HTTPException):
+    """404 for an unknown chat session, 403 for one owned by another user."""
+
+
+def authorize_session(db: Session, session_id: str, user_id: Optional[str], claim: bool = True) -> ChatSession:
+    """Load the chat session a turn is for, claiming it for `user_id` if it has no owner yet.
+
+    The claim is a conditional UPDATE committed right away, so two first turns
+    cannot both take the session and later turns (possibly on another
+    connection) see the owner. Reads pass `claim=False`: they are checked the
+    same way but never take ownership.
+    """
+    try:
+        sid = uuid.UUID(str(session_id))
+    except ValueError:
+        raise SessionAccessDenied(status_code=404, detail="Session not found")
+    session = db.get(ChatSession, sid)
+    if session is None:
+        raise SessionAccessDenied(status_code=404, detail="Session not found")
+    if claim and session.user_id is None and user_id:
+        sessions = ChatSession.__table__
+        db.execute(
+            update(sessions).where(sessions.c.id == sid, sessions.c.user_id.is_(None)).values(user_id=user_id)
+        )
+        db.commit()
+        db.refresh(session)
+    if session.user_id and session.user_id != user_id:
+        raise SessionAccessDenied(status_code=403, detail="Session belongs to another user")
+    return session
+
+
+def encode_cursor(created_at: datetime, message_id: uuid.UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(message_id)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(value: str) -> Cursor:
+    """Inverse of `encode_cursor`; raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        created_at, message_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), uuid.UUID(message_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+@dataclass
+class SessionPage:
+    """A session plus one page of its messages, oldest first, as plain dicts."""
+
+    session: Dict[str, Any]
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
+def load_session_page(
+    db: Session, session_id: uuid.UUID, limit: int, before: Optional[Cursor] = None
+) -> Optional[SessionPage]:
+    """Fetch a session and the `limit` messages preceding `before` in one round trip.
+
+    Messages are read newest-first on `(created_at, id)` so the
+    `(session_id, created_at DESC)` index serves the page without a sort; the
+    returned `next_cursor` continues with older messages. Columns are selected
+    directly so large pages skip ORM hydration.
+    """
+    sessions = ChatSession.__table__
+    messages = ChatMessage.__table__
+    page = (
+        select(
+            messages.c.id,
+            messages.c.role,
+            messages.c.content,
+            messages.c.created_at,
+            messages.c.metadata,
+        )
+        .where(messages.c.session_id == session_id)
+        .order_by(messages.c.created_at.desc(), messages.c.id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        page = page.where(tuple_(messages.c.created_at, messages.c.id) < tuple_(*before))
+    page = page.subquery("page")
+    stmt = (
+        select(
+            sessions.c.id.label("session_id"),
+            sessions.c.user_id,
+            sessions.c.created_at.label("session_created_at"),
+            sessions.c.updated_at.label("session_updated_at"),
+            page,
+        )
+        .select_from(sessions.outerjoin(page, true()))
+        .where(sessions.c.id == session_id)
+        .order_by(page.c.created_at.desc(), page.c.id.desc())
+    )
+    rows = db.execute(stmt).all()
+    if not rows:
+        return None
+
+    first = rows[0]
+    result = SessionPage(
+        session={
+            "id": str(first.session_id),
+            "user_id": first.user_id,
+            "created_at": first.session_created_at,
+            "updated_at": first.session_updated_at,
+        }
+    )
+    found = [row for row in rows if row.id is not None]
+    if len(found) > limit:
+        found = found[:limit]
+        oldest = found[-1]
+        result.next_cursor = encode_cursor(oldest.created_at, oldest.id)
+    result.messages = [
+        {
+            "id": str(row.id),
+            "role": row.role,
+            "content": row.content,
+            "created_at": row.created_at,
+            "meta": row.metadata or {},
+        }
+        for row in reversed(found)
+    ]
+    return result
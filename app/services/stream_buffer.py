@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import contextvars
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Iterator, List, Optional, Protocol, Tuple
+
+import structlog
+
+from app.utils.sse import HEARTBEAT_FRAME, sse_frame
+
+
+log = structlog.get_logger()
+
+
+class StreamsBusy(Exception):
+    """Raised by `ResumableStreams.start` when every producer thread is taken."""
+
+    def __init__(self, limit: int, retry_after: int = 1):
+        self.limit = limit
+        self.retry_after = retry_after
+        super().__init__(f"All {limit} stream producers are busy")
+
+
+@dataclass
+class StreamEvent:
+    seq: int
+    event: str
+    data: Any
+
+
+@dataclass
+class StreamSlice:
+    events: List[StreamEvent]
+    finished: bool
+    # (first, last) sequence numbers that were evicted before the reader saw them.
+    missed: Optional[Tuple[int, int]] = None
+
+
+class StreamBuffer(Protocol):
+    """Storage for in-flight stream events; swap in a shared store to resume across workers."""
+
+    def create(self, stream_id: str) -> None: ...
+
+    def append(self, stream_id: str, event: str, data: Any) -> int: ...
+
+    def finish(self, stream_id: str) -> None: ...
+
+    def read(self, stream_id: str, after_seq: int, timeout: float) -> Optional[StreamSlice]: ...
+
+    def exists(self, stream_id: str) -> bool: ...
+
+
+@dataclass
+class _StreamRecord:
+    max_events: int
+    events: Deque[StreamEvent] = field(init=False)
+    next_seq: int = 0
+    finished: bool = False
+    updated_at: float = field(default_factory=time.monotonic)
+    cond: threading.Condition = field(default_factory=threading.Condition)
+
+    def __post_init__(self) -> None:
+        self.events = deque(maxlen=self.max_events)
+
+
+class InMemoryStreamBuffer:
+    """Bounded, TTL'd per-process replay buffer.
+
+    Each stream keeps at most `max_events` recent events; streams idle for longer
+    than `ttl_seconds` are dropped, and the oldest stream is evicted once
+    `max_streams` is reached.
+    """
+
+    def __init__(self, max_events: int = 1000, ttl_seconds: float = 300.0, max_streams: int = 10000):
+        self.max_events = max_events
+        self.ttl_seconds = ttl_seconds
+        self.max_streams = max_streams
+        self._streams: "OrderedDict[str, _StreamRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _sweep_locked(self) -> None:
+        now = time.monotonic()
+        if now - self._last_sweep < min(self.ttl_seconds, 30.0):
+            return
+        self._last_sweep = now
+        expired = [sid for sid, record in self._streams.items() if now - record.updated_at > self.ttl_seconds]
+        for stream_id in expired:
+            del self._streams[stream_id]
+
+    def _get(self, stream_id: str) -> Optional[_StreamRecord]:
+        with self._lock:
+            self._sweep_locked()
+            return self._streams.get(stream_id)
+
+    def create(self, stream_id: str) -> None:
+        with self._lock:
+            self._sweep_locked()
+            while len(self._streams) >= self.max_streams:
+                self._streams.popitem(last=False)
+            self._streams[stream_id] = _StreamRecord(self.max_events)
+
+    def exists(self, stream_id: str) -> bool:
+        return self._get(stream_id) is not None
+
+    def append(self, stream_id: str, event: str, data: Any) -> int:
+        """Store an event and return its sequence number, or -1 if the stream is gone."""
+        record = self._get(stream_id)
+        if record is None:
+            return -1
+        with record.cond:
+            seq = record.next_seq
+            record.next_seq += 1
+            record.events.append(StreamEvent(seq, event, data))
+            record.updated_at = time.monotonic()
+            record.cond.notify_all()
+        return seq
+
+    def finish(self, stream_id: str) -> None:
+        record = self._get(stream_id)
+        if record is None:
+            return
+        with record.cond:
+            record.finished = True
+            record.updated_at = time.monotonic()
+            record.cond.notify_all()
+
+    def read(self, stream_id: str, after_seq: int, timeout: float) -> Optional[StreamSlice]:
+        record = self._get(stream_id)
+        if record is None:
+            return None
+        with record.cond:
+            if record.next_seq <= after_seq + 1 and not record.finished:
+                record.cond.wait(timeout)
+            first_seq = record.events[0].seq if record.events else record.next_seq
+            missed = None
+            if after_seq + 1 < first_seq:
+                missed = (after_seq + 1, first_seq - 1)
+            start = max(0, after_seq + 1 - first_seq)
+            events = list(itertools.islice(record.events, start, None))
+            record.updated_at = time.monotonic()
+            return StreamSlice(events=events, finished=record.finished, missed=missed)
+
+
+class ResumableStreams:
+    """Runs stream producers in the background and serves SSE from the replay buffer.
+
+    Generation is decoupled from the HTTP connection: a client that drops and
+    reconnects with `Last-Event-ID: <stream_id>:<seq>` replays what it missed
+    and then follows the still-running generation instead of starting over.
+
+    At most `max_producers` streams generate at once. Beyond that `start`
+    raises `StreamsBusy` rather than queueing a stream that would send nothing,
+    not even heartbeats, until a producer frees up.
+    """
+
+    def __init__(self, buffer: StreamBuffer, heartbeat_interval: float = 10.0, max_producers: int = 64):
+        self.buffer = buffer
+        self.heartbeat_interval = heartbeat_interval
+        self.max_producers = max_producers
+        self.active = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_producers, thread_name_prefix="stream-producer")
+
+    def start(self, stream_id: str, events_factory: Callable[[], Iterator[Tuple[str, Any]]]) -> None:
+        with self._lock:
+            if self.active >= self.max_producers:
+                self.rejected += 1
+                raise StreamsBusy(self.max_producers)
+            self.active += 1
+        self.buffer.create(stream_id)
+        # Carries the request's trace and log context over to the producer thread.
+        self._executor.submit(contextvars.copy_context().run, self._produce, stream_id, events_factory)
+
+    def _produce(self, stream_id: str, events_factory: Callable[[], Iterator[Tuple[str, Any]]]) -> None:
+        events = events_factory()
+        try:
+            for event, data in events:
+                if self.buffer.append(stream_id, event, data) < 0:
+                    log.info("stream.abandoned", stream_id=stream_id)
+                    return
+        except Exception as exc:
+            log.exception("stream.failed", stream_id=stream_id)
+            self.buffer.append(stream_id, "error", {"detail": str(exc) or type(exc).__name__})
+        finally:
+            close = getattr(events, "close", None)
+            if close:
+                close()
+            with self._lock:
+                self.active -= 1
+            self.buffer.finish(stream_id)
+
+    def exists(self, stream_id: str) -> bool:
+        return self.buffer.exists(stream_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"producers": self.active, "max_producers": self.max_producers, "rejected": self.rejected}
+
+    def subscribe(self, stream_id: str, after_seq: int = -1) -> Iterator[str]:
+        """SSE frames for events after `after_seq`, following the stream until it finishes."""
+        seq = after_seq
+        while True:
+            chunk = self.buffer.read(stream_id, seq, timeout=self.heartbeat_interval)
+            if chunk is None:
+                yield sse_frame("error", {"detail": "Stream expired"})
+                return
+            if chunk.missed:
+                yield sse_frame("gap", {"from_seq": chunk.missed[0], "to_seq": chunk.missed[1]})
+            if not chunk.events and not chunk.finished:
+                yield HEARTBEAT_FRAME
+                continue
+            for item in chunk.events:
+                seq = item.seq
+                yield sse_frame(item.event, item.data, event_id=f"{stream_id}:{item.seq}")
+            if chunk.finished and not chunk.events:
+                return
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Split a `<stream_id>:<seq>` Last-Event-ID; returns None when absent or malformed."""
+    if not value:
+        return None
+    stream_id, _, seq = value.strip().rpartition(":")
+    if not stream_id or not seq.lstrip("-").isdigit():
+        return None
+    return stream_id, int(seq)
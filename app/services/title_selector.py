@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 import json
-from typing import List, Sequence
+from typing import List, Optional, Sequence
 
-from app.core.config import settings
 from app.llm.base import LLMClient, LLMMessage
+from app.llm.routing import ModelRouter
+from app.utils.tokens import estimate_message_tokens
 import structlog
 
 
@@ -14,8 +15,9 @@ log = structlog.get_logger()
 class TitleSelector:
     """Ask the LLM to pick the most relevant document titles."""
 
-    def __init__(self, llm_client: LLMClient):
+    def __init__(self, llm_client: LLMClient, router: Optional[ModelRouter] = None):
         self.llm_client = llm_client
+        self.router = router or ModelRouter()
 
     def select_titles(
         self, query: str, query_type: str, documents: Sequence[dict], limit: int = 10
@@ -49,18 +51,17 @@ class TitleSelector:
             query_type=query_type,
             document_titles=[doc["title"] for doc in doc_payload],
         )
-        response = self.llm_client.generate_chat(
-            messages=[
-                LLMMessage(role="system", content=prompt),
-                LLMMessage(
-                    role="user",
-                    content=json.dumps({"query": query, "documents": doc_payload}),
-                ),
-            ],
-            model=settings.llm_model,
-            temperature=0.0,
-            max_tokens=200,
+        messages = [
+            LLMMessage(role="system", content=prompt),
+            LLMMessage(
+                role="user",
+                content=json.dumps({"query": query, "documents": doc_payload}),
+            ),
+        ]
+        route = self.router.route(
+            "title_selector", query_type=query_type, prompt_tokens=estimate_message_tokens(messages)
         )
+        response = route.generate(self.llm_client, messages)
         log.info(
             "title_selector.response",
             query=query,
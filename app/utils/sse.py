@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, List, Optional
+
+
+HEARTBEAT_FRAME = ": heartbeat\n\n"
+
+
+def sse_frame(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    """Render one `data: {"event": ..., "data": ...}` frame (heartbeats become SSE comments)."""
+    if event == "heartbeat":
+        return HEARTBEAT_FRAME
+    body = json.dumps({"event": event, "data": data}, separators=(",", ":"))
+    if event_id is not None:
+        return f"id: {event_id}\ndata: {body}\n\n"
+    return f"data: {body}\n\n"
+
+
+class TokenCoalescer:
+    """Batch streamed LLM chunks into fewer, larger token frames.
+
+    The first chunk is released immediately to keep time-to-first-token low;
+    after that text is buffered until it reaches `max_chars` or the oldest
+    buffered chunk is `max_delay` seconds old (checked as new chunks arrive).
+    """
+
+    def __init__(self, max_chars: int = 64, max_delay: float = 0.05):
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self._parts: List[str] = []
+        self._size = 0
+        self._since = 0.0
+        self._emitted = False
+
+    def add(self, chunk: str) -> Optional[str]:
+        if not chunk:
+            return None
+        if not self._parts:
+            self._since = time.monotonic()
+        self._parts.append(chunk)
+        self._size += len(chunk)
+        if (
+            not self._emitted
+            or self._size >= self.max_chars
+            or time.monotonic() - self._since >= self.max_delay
+        ):
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[str]:
+        if not self._parts:
+            return None
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self._emitted = True
+        return text
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+from app.llm.base import LLMMessage
+
+
+# Rough heuristic (~4 characters per token for English text); good enough for budgeting.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_message_tokens(messages: Iterable[LLMMessage]) -> int:
+    return sum(estimate_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS for message in messages)
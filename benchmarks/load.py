@@ -0,0 +1,255 @@
+"""Replay a question mix against `/v1/chat` and report throughput and latency.
+
+    uv run python -m benchmarks.load --base-url http://localhost:8000 --questions benchmarks/questions.jsonl \
+        --requests 5000 --concurrency 500 --stream-ratio 0.5 --output results/$(git rev-parse --short HEAD).json
+
+`--concurrency` chats are kept in flight and `--stream-ratio` of them use SSE.
+`--sessions` chat sessions are created up front through `POST /v1/sessions`
+and shared by the requests, since the API refuses unknown session ids. Every
+request comes from one client IP, so run the API with the rate limit raised
+(see the README's load test section) or most requests will get a 429.
+For every request the driver records:
+- total latency
+- time to first token (TTFT), for streamed chats
+- the status
+
+The report has throughput, p50/p95/p99 latency and TTFT for all requests,
+streamed requests and non-streamed requests. It is printed and, with
+`--output`, saved as JSON together with the current commit. Pass
+`--baseline old.json` to print the relative change against an earlier run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+
+@dataclass
+class Sample:
+    stream: bool
+    status: int
+    latency: float
+    ttft: Optional[float] = None
+    error: Optional[str] = None
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, `q` in [0, 100]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def _payload(question: Dict, session_id: str, stream: bool) -> Dict:
+    return {
+        "session_id": session_id,
+        "message": question["message"],
+        "city": question.get("city"),
+        "state": question.get("state"),
+        "stream": stream,
+    }
+
+
+async def create_sessions(client: httpx.AsyncClient, count: int) -> List[str]:
+    """Create `count` chat sessions; fails fast if the API refuses (e.g. rate limited)."""
+    session_ids = []
+    for _ in range(max(1, count)):
+        response = await client.post("/v1/sessions")
+        if response.status_code != 200:
+            raise RuntimeError(f"POST /v1/sessions returned {response.status_code}: {response.text[:200]}")
+        session_ids.append(response.json()["session_id"])
+    return session_ids
+
+
+async def _chat(client: httpx.AsyncClient, question: Dict, session_id: str, stream: bool) -> Sample:
+    started = time.perf_counter()
+    ttft = None
+    try:
+        if not stream:
+            response = await client.post("/v1/chat", json=_payload(question, session_id, False))
+            error = None if response.status_code == 200 else response.text[:200]
+            return Sample(False, response.status_code, time.perf_counter() - started, error=error)
+        error = None
+        async with client.stream("POST", "/v1/chat", json=_payload(question, session_id, True)) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                frame = json.loads(line[6:])
+                if frame["event"] == "token" and ttft is None:
+                    ttft = time.perf_counter() - started
+                elif frame["event"] == "error":
+                    error = json.dumps(frame["data"])[:200]
+            status = response.status_code
+        return Sample(True, status, time.perf_counter() - started, ttft, error)
+    except httpx.HTTPError as exc:
+        return Sample(stream, 0, time.perf_counter() - started, ttft, repr(exc))
+
+
+async def run(
+    base_url: str,
+    questions: Sequence[Dict],
+    requests: int,
+    concurrency: int,
+    stream_ratio: float = 0.5,
+    timeout: float = 120.0,
+    seed: int = 0,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+    sessions: int = 100,
+    session_ids: Optional[Sequence[str]] = None,
+) -> List[Sample]:
+    """Replay `requests` chats; `sessions` are created first unless `session_ids` are given."""
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits, transport=transport) as client:
+        session_ids = list(session_ids or await create_sessions(client, sessions))
+        plan = [
+            (rng.choice(questions), rng.choice(session_ids), rng.random() < stream_ratio) for _ in range(requests)
+        ]
+        queue: "asyncio.Queue" = asyncio.Queue()
+        for item in plan:
+            queue.put_nowait(item)
+        samples: List[Sample] = []
+
+        async def worker() -> None:
+            while not queue.empty():
+                question, session_id, stream = queue.get_nowait()
+                samples.append(await _chat(client, question, session_id, stream))
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return samples
+
+
+def _stats(samples: Sequence[Sample], wall: float) -> Dict:
+    ok = [s for s in samples if s.status == 200 and s.error is None]
+    latencies = [s.latency * 1000 for s in ok]
+    ttfts = [s.ttft * 1000 for s in ok if s.ttft is not None]
+    statuses: Dict[str, int] = {}
+    for sample in samples:
+        statuses[str(sample.status)] = statuses.get(str(sample.status), 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "statuses": statuses,
+        "throughput_rps": round(len(ok) / wall, 2) if wall > 0 else None,
+        "latency_ms": {f"p{q}": _round(percentile(latencies, q)) for q in (50, 95, 99)},
+        "ttft_ms": {f"p{q}": _round(percentile(ttfts, q)) for q in (50, 95, 99)},
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 1)
+
+
+def summarize(samples: Sequence[Sample], wall: float) -> Dict:
+    return {
+        "all": _stats(samples, wall),
+        "stream": _stats([s for s in samples if s.stream], wall),
+        "non_stream": _stats([s for s in samples if not s.stream], wall),
+    }
+
+
+def compare(current: Dict, baseline: Dict) -> List[str]:
+    """`group.metric: old -> new (+x%)` for throughput and every latency percentile."""
+    lines = []
+    for group, stats in current["results"].items():
+        old = baseline["results"].get(group)
+        if not old:
+            continue
+        pairs = [("throughput_rps", stats["throughput_rps"], old["throughput_rps"])]
+        for metric in ("latency_ms", "ttft_ms"):
+            pairs += [(f"{metric}.{q}", value, old[metric].get(q)) for q, value in stats[metric].items()]
+        for name, new_value, old_value in pairs:
+            if new_value is None or not old_value:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            lines.append(f"{group}.{name}: {old_value} -> {new_value} ({change:+.1f}%)")
+    return lines
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Load test the chat API.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--questions", required=True, help="JSON lines from benchmarks.synthetic")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--stream-ratio", type=float, default=0.5)
+    parser.add_argument("--sessions", type=int, default=100, help="chat sessions created up front and reused")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args(argv)
+
+    with open(args.questions, encoding="utf-8") as handle:
+        questions = [json.loads(line) for line in handle if line.strip()]
+
+    async def sessions() -> List[str]:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+            return await create_sessions(client, args.sessions)
+
+    # Created before the clock starts so throughput covers the chats only.
+    session_ids = asyncio.run(sessions())
+    started = time.perf_counter()
+    samples = asyncio.run(
+        run(
+            args.base_url,
+            questions,
+            args.requests,
+            args.concurrency,
+            args.stream_ratio,
+            args.timeout,
+            args.seed,
+            session_ids=session_ids,
+        )
+    )
+    wall = time.perf_counter() - started
+    report = {
+        "commit": _commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "config": {
+            key: getattr(args, key)
+            for key in ("base_url", "requests", "concurrency", "stream_ratio", "seed", "sessions")
+        },
+        "wall_seconds": round(wall, 2),
+        "results": summarize(samples, wall),
+    }
+    print(json.dumps(report["results"], indent=2))
+    rate_limited = report["results"]["all"]["statuses"].get("429", 0)
+    if rate_limited:
+        print(f"{rate_limited} request(s) were rate limited; raise RATE_LIMIT_PER_MINUTE on the API under test")
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            for line in compare(report, json.load(handle)):
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""pytest harness for CPU microbenchmarks.
+
+    uv run pytest benchmarks/micro                        # compare against baseline.json (fails above +40%)
+    uv run pytest benchmarks/micro --bench-save           # record a new baseline
+    uv run pytest benchmarks/micro --bench-threshold 0.1  # fail above +10%
+
+The `bench` fixture calibrates a loop count so every round lasts at least
+`--bench-round-time`, and alternates rounds of the benchmark with rounds of a
+fixed pure-Python reference workload. Each round's per-call time is divided by
+the adjacent reference time. The test fails when the median of those ratios
+exceeds the baseline's ratio by more than the threshold. Pairing the rounds
+cancels machine-speed drift during the run (shared CI runners, frequency
+scaling), and the median ignores the odd lucky or preempted round that a
+best-of-N comparison would latch onto. Baselines are still best recorded on
+the runner class that compares against them.
+"""
+
+from __future__ import annotations
+
+import functools
+import gc
+import json
+import platform
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytest
+
+
+BASELINE = Path(__file__).with_name("baseline.json")
+_results: Dict[str, float] = {}
+_ratios: Dict[str, float] = {}
+_expected: Dict[str, float] = {}
+_references: List[float] = []
+_baseline: Dict[str, Any] = {"results": {}, "ratios": {}, "reference": None}
+
+
+def _reference_workload() -> int:
+    table = {str(i): i for i in range(2_000)}
+    return sum(sorted(table[key] for key in table if key.endswith("7")))
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("microbenchmarks")
+    group.addoption("--bench-baseline", default=str(BASELINE), help="baseline JSON to compare with or save to")
+    group.addoption("--bench-save", action="store_true", help="write this run's timings as the baseline")
+    group.addoption(
+        "--bench-threshold", type=float, default=0.4, help="allowed slowdown over the baseline (0.4 = +40%%)"
+    )
+    group.addoption("--bench-rounds", type=int, default=9)
+    group.addoption("--bench-round-time", type=float, default=0.1, help="minimum seconds per round")
+
+
+def _load(path: str) -> Dict[str, Any]:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {"results": {}, "ratios": {}, "reference": None}
+
+
+class Bench:
+    def __init__(self, name: str, config, baseline: Dict[str, Any]):
+        self.name = name
+        self.rounds = config.getoption("--bench-rounds")
+        self.round_time = config.getoption("--bench-round-time")
+        self.threshold = config.getoption("--bench-threshold")
+        self.compare = not config.getoption("--bench-save")
+        self.baseline = baseline
+
+    def _time(self, fn: Callable[[], Any], loops: int) -> float:
+        # Like timeit: keep collector pauses out of the measurement.
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            return time.perf_counter() - started
+        finally:
+            if enabled:
+                gc.enable()
+
+    def _calibrate(self, fn: Callable[[], Any]) -> int:
+        loops = 1
+        while self._time(fn, loops) < self.round_time:
+            loops *= 2
+        return loops
+
+    def measure(self, fn: Callable[[], Any]) -> Tuple[float, float, float]:
+        """Median per-call seconds of `fn` and of the reference, and the median paired ratio."""
+        loops = self._calibrate(fn)
+        reference_loops = self._calibrate(_reference_workload)
+        per_call: List[float] = []
+        references: List[float] = []
+        for _ in range(self.rounds):
+            references.append(self._time(_reference_workload, reference_loops) / reference_loops)
+            per_call.append(self._time(fn, loops) / loops)
+        ratio = statistics.median(call / reference for call, reference in zip(per_call, references))
+        return statistics.median(per_call), statistics.median(references), ratio
+
+    def __call__(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> float:
+        per_call, reference, ratio = self.measure(functools.partial(fn, *args, **kwargs))
+        _references.append(reference)
+        _results[self.name] = per_call
+        _ratios[self.name] = ratio
+        expected = self.baseline["results"].get(self.name)
+        baseline_ratio = self.baseline.get("ratios", {}).get(self.name)
+        if self.compare and expected:
+            if baseline_ratio:
+                # The baseline at today's reference speed, from this run's paired ratio.
+                expected = baseline_ratio * per_call / ratio
+            _expected[self.name] = expected
+            if per_call > expected * (1 + self.threshold):
+                pytest.fail(
+                    f"{self.name}: {per_call * 1e6:.1f} us/call vs baseline {expected * 1e6:.1f} us "
+                    f"(+{(per_call / expected - 1) * 100:.0f}%, threshold +{self.threshold * 100:.0f}%)"
+                )
+        return per_call
+
+
+@pytest.fixture(scope="session")
+def bench_baseline(pytestconfig) -> Dict[str, Any]:
+    _baseline.update(_load(pytestconfig.getoption("--bench-baseline")))
+    return _baseline
+
+
+@pytest.fixture
+def bench(request, bench_baseline) -> Bench:
+    return Bench(request.node.name, request.config, bench_baseline)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not _results:
+        return
+    terminalreporter.section("microbenchmarks (us/call, change vs reference-scaled baseline)")
+    for name, seconds in sorted(_results.items()):
+        expected = _expected.get(name)
+        change = f"{(seconds / expected - 1) * 100:+.0f}%" if expected else "new"
+        terminalreporter.write_line(f"{name:<50} {seconds * 1e6:>12.1f} {change:>8}")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not _results or not config.getoption("--bench-save"):
+        return
+    path = Path(config.getoption("--bench-baseline"))
+    previous = _load(str(path))
+    results = {**previous["results"], **_results}
+    ratios = {**previous.get("ratios", {}), **_ratios}
+    payload = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpu": platform.machine()},
+        # Informational; comparisons use the per-case ratios to the reference workload.
+        "reference": statistics.median(_references),
+        "results": dict(sorted(results.items())),
+        "ratios": dict(sorted(ratios.items())),
+    }
+    path.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from app.core.rate_limit import InMemoryRateLimitStore, RateLimiter
+from app.db.models import ChatMessage
+from app.llm.embeddings import MockEmbeddingClient
+from app.llm.mock_provider import MockProvider
+from app.services.entity_resolver import EntityResolver
+from app.services.orchestrator import ChatOrchestrator
+from app.services.query_classifier import QueryClassifier
+from app.services.retrieval import RetrievalService
+from app.utils.citations import build_citation_map, format_citations
+from app.utils.fuzzy import best_fuzzy_match
+from app.utils.sse import sse_frame
+from benchmarks import synthetic
+
+
+def _documents(count: int, size: int) -> list:
+    rng = random.Random(count)
+    return [
+        {
+            "id": str(index),
+            "title": f"Document {index}",
+            "source_url": f"https://example.org/{index}",
+            "content": " ".join(rng.choice(synthetic.WORDS) for _ in range(size // 8)),
+        }
+        for index in range(count)
+    ]
+
+
+@pytest.mark.parametrize("names", [1_000, 10_000, 50_000])
+def test_best_fuzzy_match(bench, names):
+    entities = list(synthetic.generate_entities(random.Random(0), names))
+    choices = [entity["name"] for entity in entities]
+    query = f"what are the test scores at {entities[names // 2]['name'].lower()}?"
+
+    bench(best_fuzzy_match, query, choices)
+
+
+@pytest.mark.parametrize("documents", [10, 50])
+def test_build_llm_messages(bench, documents):
+    orchestrator = ChatOrchestrator(
+        entity_resolver=EntityResolver(),
+        retrieval_service=RetrievalService(),
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=MockProvider(),
+        embedding_client=MockEmbeddingClient(),
+    )
+    docs = _documents(documents, 8_000)
+    user_message = ChatMessage(session_id=None, role="user", content="how is the school?", meta={})
+
+    bench(orchestrator._build_llm_messages, [], docs, user_message)
+
+
+@pytest.mark.parametrize("documents", [10, 100, 1_000])
+def test_citations(bench, documents):
+    docs = _documents(documents, 64)
+
+    def run():
+        citation_map, order = build_citation_map(docs)
+        return format_citations(order, citation_map)
+
+    bench(run)
+
+
+@pytest.mark.parametrize("tokens", [100, 1_000])
+def test_sse_frames(bench, tokens):
+    citations = format_citations(*reversed(build_citation_map(_documents(10, 64))))
+    events = [("stage", {"stage": "generation", "status": "started"}), ("citations", citations)]
+    events += [("token", "word " * 8)] * tokens
+    events.append(("done", {"answer": "word " * 8 * tokens, "citations": citations}))
+
+    bench(lambda: [sse_frame(event, data) for event, data in events])
+
+
+@pytest.mark.parametrize("keys", [1_000, 100_000])
+def test_rate_limiter_check(bench, keys):
+    limiter = RateLimiter(InMemoryRateLimitStore(max_keys=keys * 2), limit=10**9, period=60)
+    names = [f"ip:10.0.{index // 256}.{index % 256}" for index in range(keys)]
+    cycle = iter(range(10**12))
+
+    bench(lambda: limiter.check(names[next(cycle) % keys]))
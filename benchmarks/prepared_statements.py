@@ -0,0 +1,68 @@
+"""Compare planning and execution time of the similarity search with and without prepares.
+
+    uv run python -m benchmarks.prepared_statements --entity-id <uuid> --iterations 200
+
+Needs a Postgres `DATABASE_URL` using the psycopg driver. Runs EXPLAIN ANALYZE
+once for plan/exec time, then times the statement end to end on a connection
+that prepares it server-side (`DB_PREPARE_MODE=server`) and one that never
+does (PgBouncer transaction mode).
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from typing import List, Optional, Sequence
+
+from sqlalchemy import create_engine, text
+
+from app.core.config import settings
+from app.db.statements import SIMILARITY_SEARCH, configure_prepares, connect_args, similarity_params
+
+
+def _explain(conn, params) -> dict:
+    plan = conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {SIMILARITY_SEARCH.text}"), params).scalar()
+    return {"planning_ms": plan[0]["Planning Time"], "execution_ms": plan[0]["Execution Time"]}
+
+
+def _timed(mode: str, params, iterations: int) -> List[float]:
+    engine = create_engine(settings.database_url, connect_args=connect_args(settings.database_url, mode))
+    configure_prepares(engine, settings.database_url, mode)
+    timings = []
+    try:
+        with engine.connect() as conn:
+            for _ in range(iterations):
+                started = time.perf_counter()
+                conn.execute(SIMILARITY_SEARCH, params).all()
+                timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        engine.dispose()
+    return timings
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark prepared vs unprepared similarity search.")
+    parser.add_argument("--entity-id", required=True)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=1536)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    params = similarity_params(args.entity_id, [rng.uniform(-1, 1) for _ in range(args.dim)], 10)
+
+    engine = create_engine(settings.database_url)
+    with engine.connect() as conn:
+        explained = _explain(conn, params)
+    engine.dispose()
+    print(f"EXPLAIN ANALYZE: planning {explained['planning_ms']:.2f} ms, execution {explained['execution_ms']:.2f} ms")
+
+    for mode in ("server", "transaction"):
+        timings = sorted(_timed(mode, params, args.iterations))
+        p95 = timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+        print(f"{mode:<12} mean {statistics.mean(timings):.2f} ms  p50 {statistics.median(timings):.2f} ms  p95 {p95:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
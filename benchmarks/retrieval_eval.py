@@ -0,0 +1,307 @@
+"""Offline retrieval quality and latency per configuration.
+
+    uv run python -m benchmarks.retrieval_eval --backend inprocess --entities 300 --queries 200
+    uv run python -m benchmarks.retrieval_eval --backend pgvector --questions benchmarks/questions.jsonl \
+        --configs benchmarks/retrieval_configs.json --output results/retrieval.json
+
+Every query goes through `RetrievalService.rank_document_ids`, the part of
+retrieval that depends on the index. It runs once per configuration and once
+more with exact search, which is the ground truth. Exact search means a
+sequential scan on Postgres, or full-precision brute force in process. For
+each configuration the report gives:
+- recall@k against the exact top-k documents
+- MRR of the exact best document
+- p50/p95/p99 latency
+
+A configuration is a JSON object. These keys apply on both backends:
+- `name`
+- `k`
+- `include_types` / `exclude_types`
+
+These apply on one backend only:
+- pgvector: `ef_search` (HNSW) and `probes` (IVFFlat), set per transaction.
+- in process: `quantize: "int8"` and `dims` (score on a prefix of the vector).
+
+The pgvector backend reads the corpus loaded by `benchmarks.synthetic` from
+`DATABASE_URL`; build the index you want to measure beforehand. The in-process
+backend generates a small corpus with the same generator and needs no database.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import time
+from collections import namedtuple
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.llm.embeddings import MockEmbeddingClient
+from app.services.retrieval import RetrievalService
+from benchmarks import synthetic
+from benchmarks.load import percentile
+
+
+DEFAULT_CONFIGS = {
+    "pgvector": [
+        {"name": "hnsw-ef40-k10", "k": 10, "ef_search": 40},
+        {"name": "hnsw-ef100-k10", "k": 10, "ef_search": 100},
+        {"name": "hnsw-ef40-k5", "k": 5, "ef_search": 40},
+        {"name": "hnsw-ef40-csv", "k": 5, "ef_search": 40, "include_types": ["csv"]},
+    ],
+    "inprocess": [
+        {"name": "exact-k10", "k": 10},
+        {"name": "int8-k10", "k": 10, "quantize": "int8"},
+        {"name": "dims64-k10", "k": 10, "dims": 64},
+        {"name": "int8-k5-no-csv", "k": 5, "quantize": "int8", "exclude_types": ["csv"]},
+    ],
+}
+
+ChunkRow = namedtuple("ChunkRow", "raw_document_id chunk_title chunk_source_type score")
+
+
+def _quantize(vector: Sequence[float]) -> List[float]:
+    scale = max(abs(value) for value in vector) or 1.0
+    return [round(value / scale * 127) for value in vector]
+
+
+def _cosine_distance(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return 1.0 - dot / norm if norm else 1.0
+
+
+class InProcessRetrievalService(RetrievalService):
+    """`RetrievalService` over an in-memory corpus, mirroring `SIMILARITY_SEARCH` in Python."""
+
+    def __init__(
+        self,
+        chunks: Sequence[Dict],
+        documents: Sequence[Dict],
+        quantize: Optional[str] = None,
+        dims: Optional[int] = None,
+    ):
+        self.documents = documents
+        self.quantize = quantize
+        self.dims = dims
+        self.chunks = [{**chunk, "embedding": self._prepare(chunk["embedding"])} for chunk in chunks]
+
+    def _prepare(self, vector: Sequence[float]) -> List[float]:
+        vector = list(vector[: self.dims] if self.dims else vector)
+        return _quantize(vector) if self.quantize == "int8" else vector
+
+    def search_chunks(self, session, params: Dict[str, Any]) -> Sequence[Any]:
+        query = self._prepare(params["query_embedding"])
+        include, exclude = params["include_types"], params["exclude_types"]
+        best: Dict[tuple, ChunkRow] = {}
+        for chunk in self.chunks:
+            if chunk["entity_id"] is not None and str(chunk["entity_id"]) != params["entity_id"]:
+                continue
+            if include is not None and chunk["source_type"] not in include:
+                continue
+            if exclude is not None and chunk["source_type"] in exclude:
+                continue
+            raw_id = str(chunk["raw_document_id"]) if chunk["raw_document_id"] else None
+            key = (raw_id, chunk["section_title"], chunk["source_type"])
+            score = _cosine_distance(query, chunk["embedding"])
+            if key not in best or score < best[key].score:
+                best[key] = ChunkRow(raw_id, chunk["section_title"], chunk["source_type"], score)
+        return sorted(best.values(), key=lambda row: row.score)[: params["limit"]]
+
+    def _find_raw_document_by_title(self, session, entity_id: str, title: str) -> Optional[str]:
+        safe_title = (title or "").strip().lower()
+        for document in self.documents:
+            if str(document["entity_id"]) == entity_id and safe_title in document["title"].lower():
+                return str(document["id"])
+        return None
+
+
+def build_inprocess_corpus(entities: int, dim: int, seed: int = 0) -> Dict[str, List[Dict]]:
+    rng = random.Random(seed)
+    embedder = MockEmbeddingClient(dim=dim)
+    rows: Dict[str, List[Dict]] = {"entities": [], "documents": [], "chunks": []}
+    for entity in synthetic.generate_entities(rng, entities):
+        rows["entities"].append(entity)
+        for document in synthetic.generate_documents(rng, entity, 4, paragraph_words=30):
+            rows["documents"].append(document)
+            rows["chunks"].extend(synthetic.generate_chunks(rng, document, 3))
+    vectors = embedder.embed_many([chunk["content"] for chunk in rows["chunks"]])
+    for chunk, vector in zip(rows["chunks"], vectors):
+        chunk["embedding"] = vector
+    return rows
+
+
+def score(results: Sequence[List[str]], truth: Sequence[List[str]], k: int) -> Dict[str, float]:
+    """Mean recall@k and MRR of the exact top document, over queries that have ground truth."""
+    recalls, reciprocal_ranks = [], []
+    for found, expected in zip(results, truth):
+        expected = expected[:k]
+        if not expected:
+            continue
+        found = found[:k]
+        recalls.append(len(set(found) & set(expected)) / len(expected))
+        rank = found.index(expected[0]) + 1 if expected[0] in found else None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {
+        "recall_at_k": round(sum(recalls) / len(recalls), 4) if recalls else None,
+        "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4) if reciprocal_ranks else None,
+        "evaluated": len(recalls),
+    }
+
+
+def _latency(timings: Sequence[float]) -> Dict[str, Optional[float]]:
+    return {f"p{q}": round(percentile(timings, q) * 1000, 3) if timings else None for q in (50, 95, 99)}
+
+
+def run_queries(rank: Callable[[Dict, Dict], List[str]], queries: Sequence[Dict], config: Dict) -> tuple:
+    results, timings = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(rank(query, config))
+        timings.append(time.perf_counter() - started)
+    return results, timings
+
+
+def evaluate(
+    rank: Callable[[Dict, Dict], List[str]],
+    exact_rank: Callable[[Dict, Dict], List[str]],
+    queries: Sequence[Dict],
+    configs: Sequence[Dict],
+) -> List[Dict]:
+    truth_cache: Dict[str, List[List[str]]] = {}
+    report = []
+    for config in configs:
+        truth_key = json.dumps([config.get(key) for key in ("k", "include_types", "exclude_types")])
+        if truth_key not in truth_cache:
+            truth_cache[truth_key], _ = run_queries(exact_rank, queries, config)
+        results, timings = run_queries(rank, queries, config)
+        report.append(
+            {
+                "config": config,
+                **score(results, truth_cache[truth_key], config.get("k", 10)),
+                "latency_ms": _latency(timings),
+            }
+        )
+    return report
+
+
+def inprocess_rankers(corpus: Dict[str, List[Dict]]):
+    exact = InProcessRetrievalService(corpus["chunks"], corpus["documents"])
+    services: Dict[str, InProcessRetrievalService] = {}
+
+    def service_for(config: Dict) -> InProcessRetrievalService:
+        key = f"{config.get('quantize')}:{config.get('dims')}"
+        if key not in services:
+            services[key] = InProcessRetrievalService(
+                corpus["chunks"], corpus["documents"], config.get("quantize"), config.get("dims")
+            )
+        return services[key]
+
+    def ranker(service_of: Callable[[Dict], RetrievalService]):
+        def rank(query: Dict, config: Dict) -> List[str]:
+            return service_of(config).rank_document_ids(
+                None,
+                query["entity_id"],
+                query["embedding"],
+                config.get("k", 10),
+                config.get("include_types"),
+                config.get("exclude_types"),
+            )
+
+        return rank
+
+    return ranker(service_for), ranker(lambda config: exact)
+
+
+def pgvector_rankers(database_url: str):
+    engine = create_engine(database_url)
+    service = RetrievalService()
+
+    def ranker(exact: bool):
+        def rank(query: Dict, config: Dict) -> List[str]:
+            with Session(engine) as session:
+                knobs = {"enable_indexscan": "off", "enable_bitmapscan": "off"} if exact else {
+                    name: str(config[key])
+                    for key, name in (("ef_search", "hnsw.ef_search"), ("probes", "ivfflat.probes"))
+                    if config.get(key) is not None
+                }
+                for name, value in knobs.items():
+                    session.execute(text("SELECT set_config(:name, :value, true)"), {"name": name, "value": value})
+                try:
+                    return service.rank_document_ids(
+                        session,
+                        query["entity_id"],
+                        query["embedding"],
+                        config.get("k", 10),
+                        config.get("include_types"),
+                        config.get("exclude_types"),
+                    )
+                finally:
+                    session.rollback()
+
+        return rank
+
+    return ranker(False), ranker(True)
+
+
+def _print(report: Sequence[Dict]) -> None:
+    print(f"{'config':<24} {'recall@k':>9} {'mrr':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for row in report:
+        latency = row["latency_ms"]
+        print(
+            f"{row['config'].get('name', '?'):<24} {row['recall_at_k']!s:>9} {row['mrr']!s:>7} "
+            f"{latency['p50']!s:>9} {latency['p95']!s:>9} {latency['p99']!s:>9}"
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluate retrieval recall and latency per configuration.")
+    parser.add_argument("--backend", choices=["pgvector", "inprocess"], default="inprocess")
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--questions", help="JSON lines with message and entity_id (benchmarks.synthetic)")
+    parser.add_argument("--queries", type=int, default=200, help="queries to sample")
+    parser.add_argument("--configs", help="JSON list of configurations")
+    parser.add_argument("--entities", type=int, default=300, help="in-process corpus size")
+    parser.add_argument("--dim", type=int, help="embedding dimensions (in process: 256, pgvector: MOCK_EMBEDDING_DIM)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    dim = args.dim or (256 if args.backend == "inprocess" else settings.mock_embedding_dim)
+    if args.backend == "inprocess":
+        corpus = build_inprocess_corpus(args.entities, dim, args.seed)
+        questions = synthetic.generate_questions(rng, corpus["entities"], args.queries)
+        rank, exact_rank = inprocess_rankers(corpus)
+    else:
+        if not args.questions:
+            parser.error("--questions is required for the pgvector backend")
+        with open(args.questions, encoding="utf-8") as handle:
+            questions = [json.loads(line) for line in handle if line.strip()]
+        questions = rng.sample(questions, min(args.queries, len(questions)))
+        rank, exact_rank = pgvector_rankers(args.database_url)
+
+    embedder = MockEmbeddingClient(dim=dim)
+    for question, vector in zip(questions, embedder.embed_many([q["message"] for q in questions])):
+        question["embedding"] = vector
+
+    if args.configs:
+        with open(args.configs, encoding="utf-8") as handle:
+            configs = json.load(handle)
+    else:
+        configs = DEFAULT_CONFIGS[args.backend]
+
+    report = evaluate(rank, exact_rank, questions, configs)
+    _print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"backend": args.backend, "queries": len(questions), "results": report}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
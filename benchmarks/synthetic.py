@@ -0,0 +1,262 @@
+"""Generate a synthetic corpus and question mix for load tests.
+
+    uv run python -m benchmarks.synthetic --entities 50000 --docs-per-entity 5 --chunks-per-doc 4 \
+        --questions benchmarks/questions.jsonl
+
+Fills `entities`, `raw_documents` and `chunked_documents` in `DATABASE_URL`.
+That must be Postgres with pgvector; `chunked_documents` is created if missing.
+Chunk embeddings come from `MockEmbeddingClient` with `--dim` dimensions
+(default `MOCK_EMBEDDING_DIM`), so they match what the mock client returns at
+query time.
+
+School entities also get CSV performance reports. Their chunks carry no
+entity_id, which exercises the title fallback in `RetrievalService`.
+
+The question file is JSON lines `{message, city, state, entity_id, query_type}`
+for `benchmarks.load`. Output is deterministic for a given `--seed`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import create_engine, text
+
+from app.core.config import settings
+from app.db.models import Entity, RawDocument
+from app.llm.embeddings import MockEmbeddingClient
+
+
+PLACES = [
+    ("Austin", "TX"), ("Denver", "CO"), ("Portland", "OR"), ("Raleigh", "NC"), ("Madison", "WI"),
+    ("Tucson", "AZ"), ("Columbus", "OH"), ("Boise", "ID"), ("Richmond", "VA"), ("Omaha", "NE"),
+    ("Sacramento", "CA"), ("Albany", "NY"), ("Savannah", "GA"), ("Spokane", "WA"), ("Tulsa", "OK"),
+]
+NAME_PARTS = [
+    "Lincoln", "Maple", "Riverside", "Oak Hill", "Cedar", "Lakeview", "Washington", "Pine Ridge",
+    "Franklin", "Sunset", "Highland", "Willow", "Jefferson", "Meadow", "Harbor", "Summit", "Brookside",
+]
+ENTITY_KINDS = {
+    "school": ["Elementary School", "Middle School", "High School", "Academy", "Montessori School"],
+    "camp": ["Day Camp", "Summer Camp", "Adventure Camp", "Science Camp"],
+    "program": ["After School Program", "Arts Program", "Robotics Club", "Swim Program"],
+}
+SECTIONS = ["About", "Admissions", "Tuition and Fees", "Schedule", "Staff", "Programs", "Transportation", "FAQ"]
+WORDS = (
+    "students families teachers enrollment classes activities curriculum schedule weekly tuition "
+    "outdoor reading math science arts music sports safety lunch transportation application deadline "
+    "grade ratio campus library field trips counselors support community tours scholarships"
+).split()
+QUESTION_TEMPLATES = {
+    "general": [
+        "What are the admission requirements at {name}?",
+        "How much is tuition at {name}?",
+        "What activities does {name} offer?",
+        "Does {name} provide transportation?",
+        "tell me about {name}",
+    ],
+    "school_performance_report": [
+        "How did {name} do on state tests?",
+        "Show me the performance report for {name}",
+        "What are the test scores at {name}?",
+    ],
+}
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def generate_entities(rng: random.Random, count: int) -> Iterator[Dict]:
+    for index in range(count):
+        entity_type = rng.choice(list(ENTITY_KINDS))
+        city, state = rng.choice(PLACES)
+        # The index keeps names unique at any scale, like real numbered campuses.
+        name = f"{rng.choice(NAME_PARTS)} {rng.choice(ENTITY_KINDS[entity_type])} {index}"
+        yield {
+            "id": uuid.UUID(int=rng.getrandbits(128)),
+            "name": name,
+            "entity_type": entity_type,
+            "city": city,
+            "state": state,
+            "url": f"https://example.org/{index}",
+            "slug": f"{name.lower().replace(' ', '-')}",
+        }
+
+
+def generate_documents(rng: random.Random, entity: Dict, count: int, paragraph_words: int = 60) -> List[Dict]:
+    documents = []
+    for section in rng.sample(SECTIONS, min(count, len(SECTIONS))):
+        documents.append(
+            {
+                "id": uuid.UUID(int=rng.getrandbits(128)),
+                "entity_id": entity["id"],
+                "title": f"{entity['name']} - {section}",
+                "source_url": f"{entity['url']}/{section.lower().replace(' ', '-')}",
+                "source_type": "html",
+                "clean_text": "\n\n".join(_paragraph(rng, paragraph_words) for _ in range(4)),
+            }
+        )
+    if entity["entity_type"] == "school":
+        rows = [f"{year},{rng.randint(40, 99)},{rng.randint(40, 99)}" for year in range(2019, 2024)]
+        documents.append(
+            {
+                "id": uuid.UUID(int=rng.getrandbits(128)),
+                "entity_id": entity["id"],
+                "title": f"{entity['name']} performance report",
+                "source_url": f"{entity['url']}/report.csv",
+                "source_type": "csv",
+                "clean_text": "year,reading,math\n" + "\n".join(rows),
+            }
+        )
+    return documents
+
+
+def chunk_text(content: str, count: int) -> List[str]:
+    """Split into at most `count` pieces on word boundaries."""
+    words = content.split()
+    size = max(1, -(-len(words) // max(1, count)))
+    return [" ".join(words[i : i + size]) for i in range(0, len(words), size)]
+
+
+def generate_chunks(rng: random.Random, document: Dict, count: int) -> List[Dict]:
+    csv = document["source_type"] == "csv"
+    return [
+        {
+            "id": uuid.UUID(int=rng.getrandbits(128)),
+            # CSV chunks are shared data; retrieval maps them back by title.
+            "entity_id": None if csv else document["entity_id"],
+            "raw_document_id": None if csv else document["id"],
+            "section_title": document["title"],
+            "source_type": document["source_type"],
+            "content": piece,
+        }
+        for piece in chunk_text(document["clean_text"], count)
+    ]
+
+
+def generate_questions(rng: random.Random, entities: Sequence[Dict], count: int, report_share: float = 0.2) -> List[Dict]:
+    questions = []
+    for _ in range(count):
+        entity = rng.choice(entities)
+        query_type = "general"
+        if entity["entity_type"] == "school" and rng.random() < report_share:
+            query_type = "school_performance_report"
+        questions.append(
+            {
+                "message": rng.choice(QUESTION_TEMPLATES[query_type]).format(name=entity["name"]),
+                "city": entity["city"] if rng.random() < 0.5 else None,
+                "state": entity["state"] if rng.random() < 0.5 else None,
+                "entity_id": str(entity["id"]),
+                "query_type": query_type,
+            }
+        )
+    return questions
+
+
+CREATE_CHUNKS = """
+CREATE TABLE IF NOT EXISTS chunked_documents (
+    id uuid PRIMARY KEY,
+    entity_id uuid NULL,
+    raw_document_id uuid NULL,
+    section_title text,
+    source_type text NOT NULL,
+    content text NOT NULL,
+    embedding vector({dim}) NOT NULL
+)
+"""
+
+INSERT_CHUNK = text(
+    """
+    INSERT INTO chunked_documents (id, entity_id, raw_document_id, section_title, source_type, content, embedding)
+    VALUES (:id, :entity_id, :raw_document_id, :section_title, :source_type, :content, CAST(:embedding AS vector))
+    """
+)
+
+
+def populate(
+    database_url: str,
+    entities: int,
+    docs_per_entity: int,
+    chunks_per_doc: int,
+    dim: int,
+    seed: int = 0,
+    batch_size: int = 500,
+) -> List[Dict]:
+    """Insert the corpus in batches; returns the entity rows for question generation."""
+    rng = random.Random(seed)
+    embedder = MockEmbeddingClient(dim=dim)
+    engine = create_engine(database_url)
+    Entity.__table__.create(engine, checkfirst=True)
+    RawDocument.__table__.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(text(CREATE_CHUNKS.format(dim=dim)))
+
+    created: List[Dict] = []
+    pending = {"entities": [], "documents": [], "chunks": []}
+
+    def flush() -> None:
+        with engine.begin() as conn:
+            if pending["entities"]:
+                conn.execute(Entity.__table__.insert(), pending["entities"])
+            if pending["documents"]:
+                conn.execute(RawDocument.__table__.insert(), pending["documents"])
+            if pending["chunks"]:
+                vectors = embedder.embed_many([chunk["content"] for chunk in pending["chunks"]])
+                for chunk, vector in zip(pending["chunks"], vectors):
+                    chunk["embedding"] = vector
+                conn.execute(INSERT_CHUNK, pending["chunks"])
+        for rows in pending.values():
+            rows.clear()
+
+    started = time.perf_counter()
+    try:
+        for entity in generate_entities(rng, entities):
+            created.append(entity)
+            documents = generate_documents(rng, entity, docs_per_entity)
+            pending["entities"].append(entity)
+            pending["documents"].extend(documents)
+            for document in documents:
+                pending["chunks"].extend(generate_chunks(rng, document, chunks_per_doc))
+            if len(pending["chunks"]) >= batch_size:
+                flush()
+            if len(created) % 5000 == 0:
+                print(f"{len(created)} entities in {time.perf_counter() - started:.0f}s")
+        flush()
+    finally:
+        engine.dispose()
+    return created
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Load a synthetic corpus for benchmarks.")
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--entities", type=int, default=1000)
+    parser.add_argument("--docs-per-entity", type=int, default=5)
+    parser.add_argument("--chunks-per-doc", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=settings.mock_embedding_dim)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--questions", help="write a question mix (JSON lines) to this path")
+    parser.add_argument("--question-count", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    entities = populate(
+        args.database_url, args.entities, args.docs_per_entity, args.chunks_per_doc, args.dim, args.seed
+    )
+    print(f"loaded {len(entities)} entities")
+    if args.questions:
+        questions = generate_questions(random.Random(args.seed + 1), entities, args.question_count)
+        with open(args.questions, "w", encoding="utf-8") as handle:
+            for question in questions:
+                handle.write(json.dumps(question) + "\n")
+        print(f"wrote {len(questions)} questions to {args.questions}")
+
+
+if __name__ == "__main__":
+    main()
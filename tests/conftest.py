@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
+from typing import Callable, ContextManager
+
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.core.config import settings
-from app.db.models import Base
+from app.db.models import Base, ChatSession
 
 
 @pytest.fixture(scope="session")
@@ -31,3 +34,32 @@ def db_session(engine) -> Session:
         yield session
     finally:
         session.close()
+
+
+@pytest.fixture
+def session_factory(engine) -> Callable[[], ContextManager[Session]]:
+    """Like `app.db.session.get_session`: a fresh session per call, committed on success and rolled back on error."""
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+    @contextmanager
+    def factory():
+        db = SessionLocal()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    return factory
+
+
+@pytest.fixture
+def chat_session_id(db_session) -> str:
+    """Id of a new, unowned chat session; chat turns are refused for unknown sessions."""
+    chat_session = ChatSession()
+    db_session.add(chat_session)
+    db_session.commit()
+    return str(chat_session.id)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import api
+from app.llm.admission import AdmissionControlledLLMClient, AdmissionController, AdmissionRejected
+from app.llm.base import LLMMessage
+from app.llm.embeddings import MockEmbeddingClient
+from app.llm.mock_provider import MockProvider
+from app.main import app
+from app.schemas.chat import ChatRequest
+from app.services.entity_resolver import EntityResolver
+from app.services.orchestrator import ChatOrchestrator
+from app.services.query_classifier import QueryClassifier
+from app.services.retrieval import RetrievalService
+
+
+class BlockingProvider(MockProvider):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def generate_chat(self, messages, model, temperature, max_tokens):
+        self.started.set()
+        self.release.wait(5)
+        return super().generate_chat(messages, model, temperature, max_tokens)
+
+
+MESSAGES = [LLMMessage(role="user", content="hi")]
+
+
+def _occupy(controller):
+    provider = BlockingProvider()
+    client = AdmissionControlledLLMClient(provider, controller, provider="mock")
+    thread = threading.Thread(target=client.generate_chat, args=(MESSAGES, "m", 0.0, 10))
+    thread.start()
+    provider.started.wait(5)
+    return provider, thread
+
+
+def test_waiting_past_deadline_is_rejected():
+    controller = AdmissionController(global_limit=1, max_queue=4, max_wait=0.05)
+    provider, thread = _occupy(controller)
+    client = AdmissionControlledLLMClient(MockProvider(), controller, provider="mock")
+
+    with pytest.raises(AdmissionRejected) as exc_info:
+        client.generate_chat(MESSAGES, "m", 0.0, 10)
+    assert exc_info.value.reason == "timeout"
+
+    provider.release.set()
+    thread.join()
+    assert client.generate_chat(MESSAGES, "m", 0.0, 10).content
+    stats = controller.stats()
+    # The provider slot is taken first, so that is where the wait timed out.
+    assert stats["providers"]["mock"]["rejected"] == 1
+    assert stats["global"]["admitted"] == 2
+    assert stats["providers"]["mock"]["in_flight"] == 0
+
+
+def test_full_queue_rejects_without_waiting():
+    controller = AdmissionController(global_limit=1, provider_limits={"mock": 1}, max_queue=0, max_wait=5)
+    provider, thread = _occupy(controller)
+
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as exc_info:
+        controller.precheck("mock")
+    assert exc_info.value.reason == "queue_full"
+    assert time.monotonic() - started < 0.5
+
+    provider.release.set()
+    thread.join()
+
+
+def test_chat_route_sheds_with_503(monkeypatch):
+    controller = AdmissionController(global_limit=1, max_queue=0, max_wait=0.05)
+    provider, thread = _occupy(controller)
+    monkeypatch.setattr(api.routes, "admission_controller", controller)
+
+    client = TestClient(app)
+    response = client.post("/v1/chat", json={"session_id": "s", "message": "hello"})
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+    provider.release.set()
+    thread.join()
+
+
+def test_waiting_on_a_saturated_provider_leaves_global_slots_free():
+    controller = AdmissionController(global_limit=2, provider_limits={"mock": 1}, max_queue=4, max_wait=2)
+    provider, thread = _occupy(controller)
+    queued = threading.Thread(
+        target=AdmissionControlledLLMClient(MockProvider(), controller, provider="mock").generate_chat,
+        args=(MESSAGES, "m", 0.0, 10),
+    )
+    queued.start()
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    other = AdmissionControlledLLMClient(MockProvider(), controller, provider="other")
+    assert other.generate_chat(MESSAGES, "m", 0.0, 10).content
+    assert time.monotonic() - started < 0.5
+
+    provider.release.set()
+    thread.join()
+    queued.join()
+
+
+class RejectingProvider(MockProvider):
+    def stream_chat(self, messages, model, temperature, max_tokens):
+        raise AdmissionRejected("mock", "timeout", 2.5)
+        yield
+
+
+def test_rejection_mid_stream_becomes_503_event(db_session, chat_session_id):
+    orchestrator = ChatOrchestrator(
+        entity_resolver=EntityResolver(),
+        retrieval_service=RetrievalService(),
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=RejectingProvider(),
+        embedding_client=MockEmbeddingClient(),
+    )
+    events = list(orchestrator.stream_events(db_session, ChatRequest(session_id=chat_session_id, message="hello")))
+
+    assert events[-1] == ("error", {"status": 503, "detail": "LLM capacity exhausted for mock (timeout)", "retry_after": 3})
+
+
+def test_rejected_admission_leaves_hold_estimate_unchanged():
+    controller = AdmissionController(global_limit=1, provider_limits={"mock": 2}, max_queue=4, max_wait=0.05)
+    provider = BlockingProvider()
+    busy = AdmissionControlledLLMClient(provider, controller, provider="other")
+    thread = threading.Thread(target=busy.generate_chat, args=(MESSAGES, "m", 0.0, 10))
+    thread.start()
+    provider.started.wait(5)
+    limiter = controller.provider_limiter("mock")
+    limiter.hold_ewma = 1.5
+
+    with pytest.raises(AdmissionRejected):
+        with controller.admit("mock"):
+            pass
+    assert limiter.hold_ewma == 1.5
+    assert limiter.in_flight == 0
+
+    provider.release.set()
+    thread.join()
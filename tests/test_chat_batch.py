@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+
+from fastapi.testclient import TestClient
+
+from app import api
+from app.db.models import ChatSession, Entity
+from app.llm.embeddings import MockEmbeddingClient
+from app.llm.mock_provider import MockProvider
+from app.main import app
+from app.schemas.chat import ChatRequest
+from app.services.entity_resolver import EntityResolver
+from app.services.orchestrator import ChatOrchestrator
+from app.services.query_classifier import QueryClassifier
+
+
+class CountingEmbeddingClient(MockEmbeddingClient):
+    def __init__(self):
+        super().__init__()
+        self.embed_calls = 0
+        self.embed_many_calls = 0
+
+    def embed(self, text):
+        self.embed_calls += 1
+        return super().embed(text)
+
+    def embed_many(self, texts):
+        self.embed_many_calls += 1
+        return super().embed_many(texts)
+
+
+class StubRetrieval:
+    def __init__(self):
+        self.embeddings = []
+
+    def fetch_documents_by_similarity(self, session, entity_id, query, embedding_client, limit=10, query_embedding=None, **kwargs):
+        self.embeddings.append(query_embedding)
+        return [{"id": f"{entity_id}-doc", "title": "Menu", "source_url": None, "content": "Pizza on Friday."}]
+
+
+def _seed(session_factory):
+    with session_factory() as db:
+        db.add(Entity(name="Maple Grove Elementary", entity_type="school", city="Denver", state="CO", slug="maple-grove", meta={}))
+
+
+def _new_sessions(session_factory, count):
+    with session_factory() as db:
+        sessions = [ChatSession() for _ in range(count)]
+        db.add_all(sessions)
+        db.flush()
+        return [str(chat_session.id) for chat_session in sessions]
+
+
+def test_handle_batch_shares_embeddings_and_entity_lookups(session_factory):
+    _seed(session_factory)
+    embeddings = CountingEmbeddingClient()
+    retrieval = StubRetrieval()
+    resolver = EntityResolver(score_cutoff=60)
+    orchestrator = ChatOrchestrator(
+        entity_resolver=resolver,
+        retrieval_service=retrieval,
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=MockProvider(),
+        embedding_client=embeddings,
+    )
+    session_ids = _new_sessions(session_factory, 3)
+    payloads = [
+        ChatRequest(session_id=session_ids[i], message=message, city="Denver", state="CO")
+        for i, message in enumerate(["Maple Grove Elementary lunch menu", "Maple Grove Elementary hours", "Maple Grove Elementary lunch menu"])
+    ]
+
+    results = dict(orchestrator.handle_batch(session_factory, payloads, concurrency=3))
+
+    assert sorted(results) == [0, 1, 2]
+    assert all(result.entity.name == "Maple Grove Elementary" for result in results.values())
+    assert embeddings.embed_many_calls == 1
+    assert embeddings.embed_calls == 0
+    assert all(vector is not None for vector in retrieval.embeddings)
+    # The per-request resolver is untouched; the batch copy carries the shared cache.
+    assert resolver.candidate_cache is None
+
+
+def test_batch_endpoint_streams_ndjson(session_factory):
+    a, b = _new_sessions(session_factory, 2)
+    app.dependency_overrides[api.routes.get_session_factory] = lambda: session_factory
+    try:
+        client = TestClient(app)
+        response = client.post(
+            "/v1/chat/batch",
+            json={"requests": [{"session_id": a, "message": "hello"}, {"session_id": b, "message": "bye"}], "concurrency": 2},
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1]
+    assert {line["response"]["session_id"] for line in lines} == {a, b}
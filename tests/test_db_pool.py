@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import StaticPool
+
+from app.db import session as db_session_module
+from app.db.session import PoolMetrics, RoutingSession, TimedQueuePool, pool_stats, replica_reads
+
+
+def _marked_engine(marker: str):
+    engine = create_engine("sqlite+pysqlite:///:memory:", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE marker (name TEXT)"))
+        conn.execute(text("INSERT INTO marker VALUES (:name)"), {"name": marker})
+    return engine
+
+
+def test_pool_records_waits_timeouts_and_saturation(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    engine.pool.metrics = PoolMetrics("test")
+
+    held = engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    stats = pool_stats(engine)
+    held.close()
+
+    assert stats["checked_out"] == 1
+    assert stats["saturation"] == 1.0
+    assert stats["checkouts"] == 2
+    assert stats["timeouts"] == 1
+    assert stats["wait_max_ms"] >= 50
+
+
+def test_routing_session_sends_reads_to_replica_only_inside_block(monkeypatch):
+    primary, replica = _marked_engine("primary"), _marked_engine("replica")
+    monkeypatch.setattr(db_session_module, "engine", primary)
+    monkeypatch.setattr(db_session_module, "read_engine", replica)
+
+    with RoutingSession(bind=primary) as session:
+        assert session.execute(text("SELECT name FROM marker")).scalar() == "primary"
+        with replica_reads(session):
+            assert session.execute(text("SELECT name FROM marker")).scalar() == "replica"
+        assert session.execute(text("SELECT name FROM marker")).scalar() == "primary"
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from app.core.deadline import Deadline, DeadlineExceeded, bounded_sleep, call_timeout, deadline_scope
+from app.llm.embeddings import MockEmbeddingClient
+from app.llm.mock_provider import MockProvider
+from app.schemas.chat import ChatRequest
+from app.services.entity_resolver import EntityResolver
+from app.services.orchestrator import ChatOrchestrator
+from app.services.query_classifier import QueryClassifier
+from app.services.retrieval import RetrievalService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_deadline_bounds_timeouts_and_trims_max_tokens():
+    clock = FakeClock()
+    deadline = Deadline(10.0, clock=clock)
+    deadline.begin("generation")
+
+    assert deadline.timeout(60.0) == 10.0
+    assert deadline.max_tokens(400, tokens_per_second=50) == 400
+    clock.now = 8.0
+    assert deadline.max_tokens(400, tokens_per_second=50) == 100
+    clock.now = 9.9
+    with pytest.raises(DeadlineExceeded) as exc_info:
+        deadline.max_tokens(400, tokens_per_second=50)
+    assert exc_info.value.stage == "generation"
+
+
+def test_client_helpers_follow_current_deadline():
+    assert call_timeout(60.0) == 60.0
+    with deadline_scope(Deadline(0.05)):
+        assert call_timeout(60.0) <= 0.05
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            bounded_sleep(5)
+        assert time.monotonic() - started < 1
+
+
+class SlowResolver(EntityResolver):
+    def resolve(self, session, query, city=None, state=None, entities=None):
+        time.sleep(0.3)
+        return super().resolve(session, query, city=city, state=state, entities=entities)
+
+
+def test_stream_reports_stage_that_ran_out_of_time(db_session, chat_session_id):
+    orchestrator = ChatOrchestrator(
+        entity_resolver=SlowResolver(),
+        retrieval_service=RetrievalService(),
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=MockProvider(),
+        embedding_client=MockEmbeddingClient(),
+    )
+    events = list(
+        orchestrator.stream_events(
+            db_session,
+            ChatRequest(session_id=chat_session_id, message="hello"),
+            deadline=Deadline(0.1),
+        )
+    )
+
+    name, data = events[-1]
+    assert name == "error"
+    assert data["status"] == 504
+    assert data["stage"] == "entity_resolution"
+    assert "done" not in [event for event, _ in events]
+    # The late stage is reported before retrieval starts.
+    assert {"stage": "retrieval", "status": "started"} not in [data for event, data in events if event == "stage"]
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from app.core.config import settings
 from app.db.models import Entity
 from app.services.entity_resolver import EntityResolver
 
@@ -30,3 +31,23 @@ def test_entity_resolver_matches_best_candidate(db_session):
     assert result.entity is not None
     assert result.entity.name == "Happy Valley School"
     assert any(c["name"] == "Happy Valley School" for c in result.candidates)
+
+
+def test_only_shown_candidates_are_serialized(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "log_candidates_top_k", 3)
+    monkeypatch.setattr(settings, "debug", False)
+    entities = [
+        Entity(name=f"Maple Grove School {i}", entity_type="school", city="Fargo", state="ND", slug=f"maple-{i}", meta={})
+        for i in range(10)
+    ]
+    entities.append(Entity(name="Prairie Rose Elementary", entity_type="school", city="Fargo", state="ND", slug="prairie-rose", meta={}))
+
+    result = EntityResolver(score_cutoff=80).resolve(db_session, "prairie rose elementary", entities=entities)
+
+    assert result.entity is entities[-1]
+    assert [c["name"] for c in result.candidates] == ["Prairie Rose Elementary", "Maple Grove School 0", "Maple Grove School 1"]
+    assert result.candidates[0]["score"] >= 80
+
+    monkeypatch.setattr(settings, "debug", True)
+    monkeypatch.setattr(settings, "debug_candidates_top_k", 0)
+    assert len(EntityResolver(score_cutoff=80).resolve(db_session, "prairie rose", entities=entities).candidates) == 11
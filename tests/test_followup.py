@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import time
+import uuid
+
+from app.db.models import ChatSession, Entity, SessionState
+from app.llm.mock_provider import MockProvider
+from app.schemas.chat import ChatRequest
+from app.services.entity_resolver import EntityCandidateCache, EntityResolver
+from app.services.followup import FollowUpTracker, TurnState
+from app.services.orchestrator import ChatOrchestrator
+from app.services.query_classifier import QueryClassifier
+
+
+class CountingResolver(EntityResolver):
+    def __init__(self):
+        super().__init__(score_cutoff=80)
+        self.calls = 0
+
+    def resolve(self, session, query, city=None, state=None, entities=None):
+        self.calls += 1
+        return super().resolve(session, query, city=city, state=state, entities=entities)
+
+
+class StubRetrieval:
+    def __init__(self):
+        self.limits = []
+
+    def fetch_documents_by_similarity(self, session, entity_id, query, embedding_client, limit=10, query_embedding=None, **kwargs):
+        self.limits.append(limit)
+        return [{"id": f"{query}-{i}", "title": f"Doc {i}", "source_url": None, "content": query} for i in range(limit)]
+
+
+class TableEmbeddingClient:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed(self, text):
+        return self.vectors[text]
+
+    def embed_many(self, texts):
+        return [self.vectors[text] for text in texts]
+
+
+def _setup(db_session, vectors):
+    school = Entity(name="Pinecrest Follow Academy", entity_type="school", city="Boise", state="ID", slug="pinecrest-follow", meta={})
+    chat_session = ChatSession()
+    db_session.add_all([school, chat_session])
+    db_session.commit()
+    resolver = CountingResolver()
+    retrieval = StubRetrieval()
+    orchestrator = ChatOrchestrator(
+        entity_resolver=resolver,
+        retrieval_service=retrieval,
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=MockProvider(),
+        embedding_client=TableEmbeddingClient(vectors),
+        followups=FollowUpTracker(),
+    )
+    return orchestrator, resolver, retrieval, str(chat_session.id), school
+
+
+def test_follow_up_reuses_entity_and_documents(db_session):
+    first, follow_up, unrelated = "pinecrest follow academy lunch", "and on fridays?", "what about sports"
+    vectors = {first: [1.0, 0.0, 0.0], follow_up: [0.9, 0.3, 0.0], unrelated: [0.0, 0.0, 1.0]}
+    orchestrator, resolver, retrieval, session_id, school = _setup(db_session, vectors)
+
+    def ask(message):
+        return orchestrator.handle_chat(db_session, ChatRequest(session_id=session_id, message=message, city="Boise"))
+
+    assert ask(first).entity.name == "Pinecrest Follow Academy"
+    assert (resolver.calls, retrieval.limits) == (1, [10])
+
+    # No school named and a nearby query: skip the resolver, fetch only a few new documents.
+    response = ask(follow_up)
+    assert response.entity.id == str(school.id)
+    assert (resolver.calls, retrieval.limits) == (1, [10, 3])
+    assert len(response.citations) == 10
+
+    # Same query again: reuse the previous documents outright.
+    ask(follow_up)
+    assert retrieval.limits == [10, 3]
+
+    # A distant query still keeps the entity but runs a full search.
+    ask(unrelated)
+    assert (resolver.calls, retrieval.limits) == (1, [10, 3, 10])
+
+
+def test_follow_up_state_is_loaded_from_session_state(db_session):
+    orchestrator, resolver, retrieval, session_id, school = _setup(db_session, {"and lunch?": [1.0, 0.0]})
+    db_session.add(
+        SessionState(
+            session_id=uuid.UUID(session_id),
+            state={"entity_id": str(school.id), "query_type": "general", "doc_ids": ["d1"]},
+        )
+    )
+    db_session.commit()
+
+    previous = orchestrator.followups.previous(db_session, uuid.UUID(session_id))
+    assert previous == TurnState(entity_id=str(school.id), query_type="general", doc_ids=["d1"])
+
+    response = orchestrator.handle_chat(db_session, ChatRequest(session_id=session_id, message="and lunch?"))
+    assert response.entity.name == "Pinecrest Follow Academy"
+    assert resolver.calls == 0
+    # Documents and embedding are not persisted, so retrieval runs in full.
+    assert retrieval.limits == [10]
+
+
+class CountingCache(EntityCandidateCache):
+    def __init__(self, ttl_seconds=None):
+        super().__init__(ttl_seconds=ttl_seconds)
+        self.loads = 0
+
+    def get_or_load(self, session, key, loader):
+        def counted():
+            self.loads += 1
+            return loader()
+
+        return super().get_or_load(session, key, counted)
+
+
+def test_follow_up_check_and_resolver_share_one_candidate_load(db_session):
+    first, named = "pinecrest follow academy lunch", "fees at pinecrest follow"
+    orchestrator, resolver, _, session_id, school = _setup(db_session, {first: [1.0, 0.0], named: [1.0, 0.0]})
+    cache = resolver.candidate_cache = CountingCache()
+
+    def ask(message):
+        return orchestrator.handle_chat(db_session, ChatRequest(session_id=session_id, message=message, city="Boise"))
+
+    ask(first)
+    assert (resolver.calls, cache.loads) == (1, 1)
+    # Scores 80: at the resolver's cutoff, so the name counts and the resolver runs on the cached candidates.
+    assert ask(named).entity.id == str(school.id)
+    assert (resolver.calls, cache.loads) == (2, 1)
+
+
+def test_candidate_cache_reloads_after_ttl(db_session):
+    db_session.add(Entity(name="Ttl Cache School", entity_type="school", city="Ttlville", state="ID", slug="ttl-cache", meta={}))
+    db_session.commit()
+    cache = CountingCache(ttl_seconds=60)
+    resolver = EntityResolver(candidate_cache=cache)
+
+    resolver.candidates(db_session, city="Ttlville")
+    resolver.candidates(db_session, city="Ttlville")
+    assert cache.loads == 1
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert [entity.name for entity in resolver.candidates(db_session, city="Ttlville")] == ["Ttl Cache School"]
+    assert cache.loads == 2
+
+
+def test_candidate_cache_is_bounded_lru(db_session):
+    cache = CountingCache()
+    cache.max_keys = 2
+    resolver = EntityResolver(candidate_cache=cache)
+
+    for city in ("Aville", "Bville", "Aville", "Cville"):
+        resolver.candidates(db_session, city=city)
+
+    # Client-chosen cities cannot grow the cache past max_keys; Bville was least recently used.
+    assert len(cache) == 2
+    resolver.candidates(db_session, city="Aville")
+    assert cache.loads == 3
+    resolver.candidates(db_session, city="Bville")
+    assert cache.loads == 4
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.llm.admission import AdmissionControlledLLMClient, AdmissionController
+from app.llm.base import LLMMessage, stage_scope
+from app.llm.hedged import HedgedLLMClient, LatencyRegistry, LLMBackend, LLMUnavailableError
+from app.llm.mock_provider import LatencyProfile, MockProvider
+
+
+MESSAGES = [LLMMessage(role="user", content="hello")]
+
+
+def slow_provider(delay: float) -> MockProvider:
+    return MockProvider(ttft=LatencyProfile(mean_ms=delay * 1000))
+
+
+def failing_provider() -> MockProvider:
+    return MockProvider(error_rate=1.0)
+
+
+def _client(*backends, **kwargs):
+    kwargs.setdefault("hedge_min_delay", 0.05)
+    kwargs.setdefault("hedge_default_delay", 0.05)
+    return HedgedLLMClient(list(backends), registry=LatencyRegistry(), **kwargs)
+
+
+def test_hedge_returns_fastest_backend():
+    client = _client(
+        LLMBackend(name="slow", client=slow_provider(1.0), model="slow-model"),
+        LLMBackend(name="fast", client=slow_provider(0.0), model="fast-model"),
+    )
+    started = time.monotonic()
+    response = client.generate_chat(MESSAGES, model="default", temperature=0.0, max_tokens=10)
+
+    assert response.model == "fast-model"
+    assert time.monotonic() - started < 0.5
+
+
+def test_failover_skips_failing_backend_and_demotes_it():
+    client = _client(
+        LLMBackend(name="broken", client=failing_provider()),
+        LLMBackend(name="healthy", client=MockProvider()),
+        hedge_enabled=False,
+    )
+    response = client.generate_chat(MESSAGES, model="default", temperature=0.0, max_tokens=10)
+
+    assert "mock answer" in response.content
+    assert [backend.name for backend in client.ranked_backends("total")] == ["healthy", "broken"]
+
+
+def test_all_backends_failing_raises():
+    client = _client(LLMBackend(name="a", client=failing_provider()), LLMBackend(name="b", client=failing_provider()))
+    with pytest.raises(LLMUnavailableError) as exc_info:
+        client.generate_chat(MESSAGES, model="default", temperature=0.0, max_tokens=10)
+    assert set(exc_info.value.errors) == {"a", "b"}
+
+
+def test_stream_hedge_and_failover():
+    client = _client(
+        LLMBackend(name="slow", client=slow_provider(1.0)),
+        LLMBackend(name="broken", client=failing_provider()),
+        LLMBackend(name="fast", client=MockProvider()),
+    )
+    started = time.monotonic()
+    answer = "".join(client.stream_chat(MESSAGES, model="default", temperature=0.0, max_tokens=10))
+
+    assert answer.strip() == "(mock answer) hello"
+    assert time.monotonic() - started < 0.8
+
+
+def test_unmeasured_backends_rank_after_measured_ones():
+    client = _client(LLMBackend(name="primary", client=MockProvider()), LLMBackend(name="cold", client=MockProvider()))
+    client.registry.tracker("primary", "ttft", "answer").record(0.8)
+
+    assert [b.name for b in client.ranked_backends("ttft", "answer")] == ["primary", "cold"]
+    client.registry.tracker("cold", "ttft", "answer").record(0.2)
+    assert [b.name for b in client.ranked_backends("ttft", "answer")] == ["cold", "primary"]
+
+
+def test_latency_is_tracked_per_mode_and_stage():
+    client = _client(LLMBackend(name="a", client=MockProvider()), hedge_enabled=False)
+    with stage_scope("classifier"):
+        client.generate_chat(MESSAGES, model="default", temperature=0.0, max_tokens=10)
+    with stage_scope("answer"):
+        stream = client.stream_chat(MESSAGES, model="default", temperature=0.0, max_tokens=10)
+    "".join(stream)
+
+    snapshot = client.registry.snapshot()["a"]
+    assert set(snapshot) == {"total", "ttft"}
+    assert set(snapshot["total"]) == {"classifier"}
+    assert set(snapshot["ttft"]) == {"answer"}
+
+
+def test_losing_generate_call_is_stopped_and_frees_its_slot():
+    controller = AdmissionController(global_limit=4)
+    slow = MockProvider(ttft=LatencyProfile(mean_ms=50), tokens_per_second=5)
+    client = _client(
+        LLMBackend(name="slow", client=AdmissionControlledLLMClient(slow, controller, provider="slow")),
+        LLMBackend(name="fast", client=AdmissionControlledLLMClient(MockProvider(), controller, provider="fast")),
+    )
+    response = client.generate_chat(MESSAGES, model="default", temperature=0.0, max_tokens=10)
+
+    assert response.content.strip() == "(mock answer) hello"
+    # Stopped after at most one more chunk, long before the slow answer would be complete.
+    time.sleep(0.3)
+    assert controller.stats()["providers"]["slow"]["in_flight"] == 0
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_time_queued_for_a_worker_is_not_provider_latency(streaming):
+    executor = ThreadPoolExecutor(max_workers=1)
+    busy = threading.Event()
+    executor.submit(busy.wait, 5)
+    client = _client(
+        LLMBackend(name="primary", client=MockProvider()),
+        LLMBackend(name="hedge", client=MockProvider()),
+        executor=executor,
+    )
+    threading.Timer(0.3, busy.set).start()
+    if streaming:
+        "".join(client.stream_chat(MESSAGES, model="default", temperature=0.0, max_tokens=10))
+    else:
+        client.generate_chat(MESSAGES, model="default", temperature=0.0, max_tokens=10)
+
+    mode = "ttft" if streaming else "total"
+    assert client.registry.tracker("hedge", mode).sample_count() == 0
+    assert client.registry.tracker("primary", mode).p95() < 0.2
+    executor.shutdown()
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.models import ChatMessage, ChatSession, SessionState
+from app.db.writer import MessageWrite, WriteBehindWriter
+from app.llm.embeddings import MockEmbeddingClient
+from app.llm.mock_provider import MockProvider
+from app.schemas.chat import ChatRequest
+from app.services.entity_resolver import EntityResolver
+from app.services.history import HistoryCache, HistoryService, HistoryTurn
+from app.services.orchestrator import ChatOrchestrator
+from app.services.query_classifier import QueryClassifier
+from app.services.retrieval import RetrievalService
+from app.services.sessions import SessionAccessDenied
+
+
+class CapturingProvider(MockProvider):
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    def generate_chat(self, messages, model, temperature, max_tokens):
+        self.prompts.append(messages)
+        return super().generate_chat(messages, model, temperature, max_tokens)
+
+
+def test_history_warms_from_summary_and_newer_messages(session_factory):
+    start = datetime(2024, 1, 1, 12, 0)
+    with session_factory() as db:
+        chat_session = ChatSession()
+        db.add(chat_session)
+        db.flush()
+        session_id = chat_session.id
+        for i, content in enumerate(["old question", "old answer", "new question", "new answer"]):
+            role = "user" if i % 2 == 0 else "assistant"
+            db.add(ChatMessage(session_id=session_id, role=role, content=content, created_at=start + timedelta(minutes=i), meta={}))
+        db.add(
+            SessionState(
+                session_id=session_id,
+                state={"history_summary": "User asked about lunch.", "history_summary_until": (start + timedelta(minutes=1)).isoformat()},
+            )
+        )
+
+    service = HistoryService(HistoryCache(), max_messages=10)
+    with session_factory() as db:
+        messages = service.messages(db, session_id)
+
+    assert messages[0].role == "system"
+    assert "User asked about lunch." in messages[0].content
+    assert [m.content for m in messages[1:]] == ["new question", "new answer"]
+    # Served from the same cached entry afterwards.
+    entry = service.cache.get(session_id)
+    with session_factory() as db:
+        assert [m.content for m in service.messages(db, session_id)[1:]] == ["new question", "new answer"]
+    assert service.cache.get(session_id) is entry
+
+
+def test_history_compacts_old_turns_into_summary(session_factory):
+    with session_factory() as db:
+        chat_session = ChatSession()
+        db.add(chat_session)
+        db.flush()
+        session_id = chat_session.id
+    writer = WriteBehindWriter(session_factory, flush_interval=60)
+    service = HistoryService(HistoryCache(), llm_client=MockProvider(), writer=writer, token_budget=100, background=False)
+    with session_factory() as db:
+        service.messages(db, session_id)
+
+    now = datetime.utcnow()
+    for i in range(10):
+        service.append(
+            session_id,
+            HistoryTurn("user", f"question {i} " + "x" * 80, now + timedelta(seconds=2 * i)),
+            HistoryTurn("assistant", f"answer {i} " + "y" * 80, now + timedelta(seconds=2 * i + 1)),
+        )
+
+    entry = service.cache.get(session_id)
+    assert entry.summary.startswith("(mock answer)")
+    assert entry.turn_tokens() <= 100
+    assert entry.turns[-1].content.startswith("answer 9")
+    with session_factory() as db:
+        messages = service.messages(db, session_id)
+    assert messages[0].role == "system"
+    assert sum(len(m.content) for m in messages[1:]) // 4 <= 100
+
+    writer.flush()
+    with session_factory() as db:
+        state = db.get(SessionState, session_id).state
+        assert state["history_summary"] == entry.summary
+        assert datetime.fromisoformat(state["history_summary_until"]) == entry.summary_until
+
+
+def test_orchestrator_sends_previous_turns(session_factory):
+    with session_factory() as db:
+        chat_session = ChatSession()
+        db.add(chat_session)
+        db.flush()
+        session_id = str(chat_session.id)
+    llm = CapturingProvider()
+    orchestrator = ChatOrchestrator(
+        entity_resolver=EntityResolver(),
+        retrieval_service=RetrievalService(),
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=llm,
+        embedding_client=MockEmbeddingClient(),
+        history_service=HistoryService(HistoryCache()),
+    )
+
+    with session_factory() as db:
+        orchestrator.handle_chat(db, ChatRequest(session_id=session_id, message="first question"))
+        orchestrator.handle_chat(db, ChatRequest(session_id=session_id, message="second question"))
+
+    contents = [m.content for m in llm.prompts[-1]]
+    assert contents[-3:] == ["first question", "(mock answer) first question", "second question"]
+
+
+def test_warm_includes_turns_still_queued_in_the_writer(session_factory):
+    with session_factory() as db:
+        chat_session = ChatSession()
+        db.add(chat_session)
+        db.flush()
+        session_id = chat_session.id
+        db.add(ChatMessage(session_id=session_id, role="user", content="written", created_at=datetime(2024, 1, 1), meta={}))
+    writer = WriteBehindWriter(session_factory, flush_interval=60)
+    writer.enqueue(
+        MessageWrite(session_id=session_id, role="user", content="queued question"),
+        MessageWrite(session_id=session_id, role="assistant", content="queued answer"),
+    )
+    service = HistoryService(HistoryCache(), writer=writer)
+
+    with session_factory() as db:
+        assert [m.content for m in service.messages(db, session_id)] == ["written", "queued question", "queued answer"]
+
+    # Once flushed, a fresh warm reads the same turns from the table without duplicates.
+    writer.flush()
+    with session_factory() as db:
+        assert [m.content for m in HistoryService(HistoryCache(), writer=writer).messages(db, session_id)] == [
+            "written",
+            "queued question",
+            "queued answer",
+        ]
+
+
+def test_history_of_another_users_session_is_not_loaded(session_factory):
+    with session_factory() as db:
+        chat_session = ChatSession(user_id="owner")
+        db.add(chat_session)
+        db.flush()
+        session_id = str(chat_session.id)
+        db.add(ChatMessage(session_id=chat_session.id, role="user", content="my secret", created_at=datetime(2024, 1, 1), meta={}))
+    llm = CapturingProvider()
+    history = HistoryService(HistoryCache())
+    orchestrator = ChatOrchestrator(
+        entity_resolver=EntityResolver(),
+        retrieval_service=RetrievalService(),
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=llm,
+        embedding_client=MockEmbeddingClient(),
+        history_service=history,
+    )
+
+    with session_factory() as db, pytest.raises(SessionAccessDenied):
+        orchestrator.handle_chat(db, ChatRequest(session_id=session_id, user_id="intruder", message="what did I say?"))
+
+    assert llm.prompts == []
+    assert history.cache.get(uuid.UUID(session_id)) is None
+
+
+def test_entry_behind_another_worker_is_warmed_again(session_factory):
+    with session_factory() as db:
+        chat_session = ChatSession()
+        db.add(chat_session)
+        db.flush()
+        session_id = chat_session.id
+    service = HistoryService(HistoryCache())
+    now = datetime.utcnow()
+    with session_factory() as db:
+        service.messages(db, session_id)
+    service.append(session_id, HistoryTurn("user", "hi", now), HistoryTurn("assistant", "hello", now, message_id=uuid.uuid4()))
+
+    # Another worker answers in the same session.
+    with session_factory() as db:
+        answer = ChatMessage(session_id=session_id, role="assistant", content="from elsewhere", created_at=now + timedelta(seconds=1), meta={})
+        db.add(answer)
+        db.flush()
+        db.add(SessionState(session_id=session_id, state={"last_message_id": str(answer.id)}))
+
+    with session_factory() as db:
+        assert [m.content for m in service.messages(db, session_id)] == ["from elsewhere"]
+        # Current again: the next hit keeps the entry.
+        entry = service.cache.get(session_id)
+        service.messages(db, session_id)
+        assert service.cache.get(session_id) is entry
+
+
+def test_folded_turns_stay_until_the_summary_is_ready(session_factory):
+    with session_factory() as db:
+        chat_session = ChatSession()
+        db.add(chat_session)
+        db.flush()
+        session_id = chat_session.id
+    seen = []
+
+    class PeekingService(HistoryService):
+        def _summarize(self, previous, turns):
+            # What a prompt built while the summary is being written would get.
+            with session_factory() as db:
+                seen.append([m.content[:10] for m in self.messages(db, session_id)])
+            return "summary"
+
+    service = PeekingService(HistoryCache(), token_budget=100, background=False)
+    with session_factory() as db:
+        service.messages(db, session_id)
+    now = datetime.utcnow()
+    turns = [HistoryTurn("user", f"question {i} " + "x" * 80, now + timedelta(seconds=i)) for i in range(4)]
+    service.append(session_id, *turns)
+
+    # The newest turns that fit the budget, none of them lost to the pending fold.
+    assert seen == [["question 1", "question 2", "question 3"]]
+    entry = service.cache.get(session_id)
+    assert entry.summary == "summary"
+    assert [turn.content for turn in entry.turns] == [turns[-1].content]
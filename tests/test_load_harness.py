@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+import random
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from benchmarks import load, synthetic
+
+
+def test_synthetic_corpus_is_deterministic_and_links_csv_by_title():
+    first = list(synthetic.generate_entities(random.Random(3), 50))
+    second = list(synthetic.generate_entities(random.Random(3), 50))
+    assert first == second
+    assert len({entity["name"] for entity in first}) == 50
+
+    school = next(entity for entity in first if entity["entity_type"] == "school")
+    documents = synthetic.generate_documents(random.Random(0), school, 3)
+    csv = next(doc for doc in documents if doc["source_type"] == "csv")
+    chunks = synthetic.generate_chunks(random.Random(0), csv, 2)
+    assert all(chunk["entity_id"] is None and chunk["section_title"] == csv["title"] for chunk in chunks)
+    assert len(synthetic.chunk_text("a b c d e", 2)) == 2
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert load.percentile(values, 50) == 50
+    assert load.percentile(values, 99) == 99
+    assert load.percentile([], 50) is None
+
+
+def test_load_driver_reports_latency_and_ttft():
+    app = FastAPI()
+    created, used = [], set()
+
+    @app.post("/v1/sessions")
+    async def create_session():
+        created.append(f"s{len(created)}")
+        return {"session_id": created[-1]}
+
+    @app.post("/v1/chat")
+    async def chat(payload: dict):
+        used.add(payload["session_id"])
+        if not payload["stream"]:
+            return {"answer": "ok"}
+        frames = ['data: {"event":"token","data":"o"}\n\n', 'data: {"event":"done","data":{}}\n\n']
+        return StreamingResponse(iter(frames), media_type="text/event-stream")
+
+    questions = [{"message": "hi", "city": None, "state": None}]
+    samples = asyncio.run(
+        load.run("http://test", questions, 20, 4, stream_ratio=0.5, transport=httpx.ASGITransport(app=app), sessions=3)
+    )
+    report = {"results": load.summarize(samples, wall=1.0)}
+
+    assert report["results"]["all"]["requests"] == 20
+    assert report["results"]["all"]["errors"] == 0
+    # Chats reuse the sessions created up front instead of inventing ids.
+    assert len(created) == 3 and used <= set(created)
+    assert report["results"]["stream"]["ttft_ms"]["p50"] is not None
+    assert report["results"]["non_stream"]["ttft_ms"]["p50"] is None
+    assert load.compare(report, report)[0].endswith("(+0.0%)")
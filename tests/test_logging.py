@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import logging
+import queue
+
+import pytest
+import structlog
+
+from app.core.logging import DroppingQueueHandler, log_records_dropped, sample_events, top_candidates
+
+
+def test_top_candidates_keeps_best_scores_in_order():
+    candidates = [{"name": name, "score": score} for name, score in [("a", 0), ("b", 90), ("c", 0), ("d", 75)]]
+
+    assert [c["name"] for c in top_candidates(candidates, 3)] == ["b", "d", "a"]
+    assert top_candidates(candidates, 0) == candidates
+
+
+def test_sample_events_drops_only_configured_events():
+    draws = iter([0.05, 0.5])
+    processor = sample_events({"noisy": 0.1}, rng=lambda: next(draws))
+
+    assert processor(None, "info", {"event": "noisy"}) == {"event": "noisy"}
+    with pytest.raises(structlog.DropEvent):
+        processor(None, "info", {"event": "noisy"})
+    assert processor(None, "info", {"event": "other"}) == {"event": "other"}
+
+
+def test_queue_handler_drops_instead_of_blocking_when_full():
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=1)
+    handler = DroppingQueueHandler(records)
+    before = log_records_dropped.labels().value
+
+    for message in ("first", "second"):
+        handler.handle(logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None))
+
+    assert records.get_nowait().msg == "first"
+    assert log_records_dropped.labels().value == before + 1
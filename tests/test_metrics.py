@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from fastapi.testclient import TestClient
+
+from app.core.metrics import MetricsRegistry
+from app.llm.embeddings import MockEmbeddingClient
+from app.llm.mock_provider import MockProvider
+from app.main import app
+from app.schemas.chat import ChatRequest
+from app.services.entity_resolver import EntityResolver
+from app.services.orchestrator import ChatOrchestrator
+from app.services.query_classifier import QueryClassifier
+from app.services.retrieval import RetrievalService
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram("op_seconds", "Op latency", ["op"], buckets=(0.1, 1.0))
+    hits = registry.counter("lookups", "Lookups", ["result"])
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.labels("read").observe(value)
+    hits.labels(result="hit").inc()
+
+    text = registry.render()
+
+    assert 'op_seconds_bucket{op="read",le="0.1"} 2' in text
+    assert 'op_seconds_bucket{op="read",le="1.0"} 3' in text
+    assert 'op_seconds_bucket{op="read",le="+Inf"} 4' in text
+    assert 'op_seconds_count{op="read"} 4' in text
+    assert 'lookups_total{result="hit"} 1.0' in text
+
+
+def test_metrics_endpoint_reports_pipeline_stages(db_session, chat_session_id):
+    orchestrator = ChatOrchestrator(
+        entity_resolver=EntityResolver(),
+        retrieval_service=RetrievalService(),
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=MockProvider(),
+        embedding_client=MockEmbeddingClient(),
+    )
+    list(orchestrator.stream_events(db_session, ChatRequest(session_id=chat_session_id, message="hello")))
+
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for series in (
+        'chat_stage_seconds_count{stage="entity_resolution"}',
+        'chat_stage_seconds_count{stage="generation"}',
+        "llm_time_to_first_token_seconds_count",
+        "llm_tokens_per_second_count",
+    ):
+        assert series in response.text
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from app.llm.base import LLMMessage
+from app.llm.embeddings import MockEmbeddingClient
+from app.llm.fixtures import FixtureStore, RecordingEmbeddingClient, RecordingLLMClient
+from app.llm.mock_provider import LatencyProfile, MockProvider, MockProviderError
+from app.utils.tokens import estimate_message_tokens, estimate_tokens
+
+
+MESSAGES = [LLMMessage(role="system", content="be nice"), LLMMessage(role="user", content="when is lunch")]
+
+
+def test_mock_provider_simulates_ttft_and_throughput():
+    provider = MockProvider(ttft=LatencyProfile(mean_ms=50), tokens_per_second=100)
+    started = time.monotonic()
+    stream = iter(provider.stream_chat(MESSAGES, "m", 0.0, 10))
+    next(stream)
+    ttft = time.monotonic() - started
+    rest = list(stream)
+
+    assert ttft >= 0.05
+    # "(mock answer) when is lunch" -> 5 chunks, 4 of them paced at 10ms each.
+    assert len(rest) == 4
+    assert time.monotonic() - started >= 0.09
+
+
+def test_mock_provider_reports_usage_in_estimated_tokens():
+    response = MockProvider().generate_chat(MESSAGES, "m", 0.0, 10)
+
+    assert response.usage["prompt_tokens"] == estimate_message_tokens(MESSAGES)
+    assert response.usage["completion_tokens"] == estimate_tokens(response.content)
+
+
+def test_mock_provider_injects_errors_and_timeouts():
+    with pytest.raises(MockProviderError):
+        MockProvider(error_rate=1.0).generate_chat(MESSAGES, "m", 0.0, 10)
+    with pytest.raises(TimeoutError):
+        MockProvider(timeout_rate=1.0, timeout_seconds=0.01).generate_chat(MESSAGES, "m", 0.0, 10)
+
+
+def test_record_then_replay(tmp_path):
+    recorder = RecordingLLMClient(MockProvider(), FixtureStore(tmp_path))
+    recorded = "".join(recorder.stream_chat(MESSAGES, "gpt-test", 0.0, 10))
+    RecordingEmbeddingClient(MockEmbeddingClient(dim=4), FixtureStore(tmp_path)).embed("lunch")
+
+    store = FixtureStore(tmp_path)
+    replayed = MockProvider(fixtures=store).generate_chat(
+        [LLMMessage(role="system", content="other docs"), MESSAGES[-1]], "m", 0.0, 10
+    )
+    assert replayed.content == recorded
+    assert replayed.usage["replayed"] is True
+    assert MockEmbeddingClient(dim=1536, fixtures=store).embed("lunch") == MockEmbeddingClient(dim=4).embed("lunch")
+    assert len(MockEmbeddingClient(dim=1536).embed("lunch")) == 1536
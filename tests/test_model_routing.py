@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from app.core.config import settings
+from app.llm.mock_provider import MockProvider
+from app.llm.routing import ModelRouter
+from app.services.query_classifier import QueryClassifier
+
+
+RULES = [
+    {"stage": "classifier", "model": "tiny-model", "max_tokens": 20},
+    {"stage": "answer", "query_type": "school_performance_report", "min_prompt_tokens": 1000, "model": "big-model"},
+    {"stage": "answer", "name": "answer-small", "model": "small-model", "temperature": 0.5},
+]
+
+
+def test_router_falls_back_to_stage_defaults():
+    route = ModelRouter(rules=[]).route("classifier")
+
+    assert route.model == settings.llm_model
+    assert route.temperature == 0.0
+    assert route.max_tokens == 50
+    assert route.name == "classifier:default"
+
+
+def test_router_matches_stage_query_type_and_prompt_size():
+    router = ModelRouter(rules=RULES)
+
+    assert router.route("classifier").model == "tiny-model"
+    assert router.route("answer", "school_performance_report", prompt_tokens=5000).model == "big-model"
+
+    small = router.route("answer", "school_performance_report", prompt_tokens=200)
+    assert small.model == "small-model"
+    assert small.name == "answer-small"
+    assert small.max_tokens == settings.llm_max_tokens
+
+
+def test_classifier_reports_route():
+    classifier = QueryClassifier(MockProvider(), router=ModelRouter(rules=RULES))
+    query_type, route = classifier.classify_with_route("what are the test scores?")
+
+    assert query_type == "general"
+    assert route == "classifier:*#0"
+
+
+def test_prompt_size_rules_apply_to_classifier():
+    rules = [
+        {"stage": "classifier", "name": "classifier-short", "max_prompt_tokens": 150, "model": "tiny-model"},
+        {"stage": "classifier", "name": "classifier-long", "model": "small-model"},
+    ]
+    classifier = QueryClassifier(MockProvider(), router=ModelRouter(rules=rules))
+
+    assert classifier.classify_with_route("what are the test scores?")[1] == "classifier-short"
+    assert classifier.classify_with_route("what are the test scores? " * 100)[1] == "classifier-long"
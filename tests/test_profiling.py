@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.core import profiling
+from app.core.config import settings
+
+
+def _busy(seconds: float) -> None:
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+
+def test_write_profile_keeps_newest_profiles(tmp_path):
+    profile = profiling.RequestProfile("GET /x", interval=0.001)
+    profile.stacks["app.main;app.handler"] = 3
+
+    for _ in range(4):
+        profiling.write_profile(profile, tmp_path, max_profiles=2)
+
+    assert len(list(tmp_path.glob("*.folded"))) == 2
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    assert next(tmp_path.glob("*.folded")).read_text() == "app.main;app.handler 3\n"
+
+
+def test_profiled_request_writes_stacks_and_sql(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profiling_token", "secret")
+    monkeypatch.setattr(settings, "profiling_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "profiling_interval_ms", 1.0)
+    engine = create_engine("sqlite:///:memory:")
+    app = FastAPI()
+
+    @app.get("/work")
+    def work():
+        with profiling.attach(), engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            _busy(0.05)
+        return {"ok": True}
+
+    profiling.configure_profiling(app, [engine])
+    client = TestClient(app)
+
+    assert client.get("/work").status_code == 200
+    assert client.get("/work", headers={"X-Profile-Token": "wrong"}).status_code == 200
+    assert not list(tmp_path.iterdir())
+
+    assert client.get("/work", headers={"X-Profile-Token": "secret"}).status_code == 200
+    (folded,) = tmp_path.glob("*.folded")
+    summary = json.loads(folded.with_suffix(".json").read_text())
+    assert "test_profiling._busy" in folded.read_text()
+    assert summary["request"] == "GET /work"
+    assert summary["samples"] > 0
+    assert summary["sql"][0]["statement"] == "SELECT 1"
+    assert summary["sql"][0]["count"] == 1
+
+
+def test_slot_is_freed_when_body_is_never_sent(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profiling_token", "secret")
+    monkeypatch.setattr(settings, "profiling_dir", str(tmp_path))
+    app = FastAPI()
+
+    @app.get("/fail")
+    def fail():
+        raise RuntimeError("boom")
+
+    profiling.configure_profiling(app, [])
+    client = TestClient(app, raise_server_exceptions=False)
+    assert client.get("/fail", headers={"X-Profile-Token": "secret"}).status_code == 500
+    assert not profiling._active.locked()
+
+    dispatch = app.user_middleware[0].kwargs["dispatch"]
+    request = Request({"type": "http", "method": "GET", "path": "/work", "headers": [(b"x-profile-token", b"secret")]})
+
+    async def call_next(request):
+        return StreamingResponse(iter([b"never sent"]))
+
+    async def disconnected_before_body():
+        response = await dispatch(request, call_next)
+        assert profiling._active.locked()
+        await response.background()
+
+    asyncio.run(disconnected_before_body())
+    assert not profiling._active.locked()
+    assert len(list(tmp_path.glob("*.folded"))) == 2
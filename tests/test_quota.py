@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import pytest
+
+from app.core.rate_limit import InMemoryRateLimitStore
+from app.db.models import ChatMessage
+from app.llm.base import LLMMessage
+from app.llm.mock_provider import MockProvider
+from app.llm.routing import ModelRouter
+from app.schemas.chat import ChatRequest
+from app.services.orchestrator import ChatOrchestrator
+from app.services.quota import QuotaExceeded, TokenQuota
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_reservation_settles_to_actual_usage():
+    quota = TokenQuota(InMemoryRateLimitStore(clock=FakeClock()), tokens=1000, window=3600)
+    keys = quota.keys(user="u1", session="s1", ip="1.2.3.4")
+    assert keys == ["tokens:user:u1", "tokens:session:s1"]
+
+    reservation = quota.reserve(keys, 800)
+    with pytest.raises(QuotaExceeded) as exc_info:
+        quota.reserve(keys, 300)
+    assert exc_info.value.available == 200
+    assert exc_info.value.status_code == 429
+
+    reservation.settle(100)
+    quota.reserve(keys, 800)
+
+
+def test_over_quota_turn_is_downgraded_before_the_llm_call():
+    quota = TokenQuota(InMemoryRateLimitStore(clock=FakeClock()), tokens=600, window=3600)
+    orchestrator = ChatOrchestrator(None, None, None, MockProvider(), None, token_quota=quota)
+    payload = ChatRequest(session_id="s1", user_id="u1", message="hi")
+    user_message = ChatMessage(role="user", content="hi")
+    history = [LLMMessage(role="user", content="x" * 400), LLMMessage(role="assistant", content="y" * 400)]
+    documents = [{"id": str(i), "title": f"Doc {i}", "content": "z" * 400, "source_url": None} for i in range(4)]
+    route = ModelRouter(rules=[]).route("answer")
+
+    messages, kept, trimmed_route, reservation = orchestrator._reserve_tokens(
+        payload, None, history, documents, user_message, route
+    )
+
+    assert len(kept) < len(documents)
+    assert all(message.content != "x" * 400 for message in messages)
+    assert trimmed_route.max_tokens == route.max_tokens
+    assert reservation.tokens <= 600
+
+    with pytest.raises(QuotaExceeded):
+        orchestrator._reserve_tokens(payload, None, [], [], user_message, route)
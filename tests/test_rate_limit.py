@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import hashlib
+import socketserver
+import threading
+import time
+
+import pytest
+
+from app.core.rate_limit import (
+    InMemoryRateLimitStore,
+    RateLimitExceeded,
+    RateLimiter,
+    RedisRateLimitStore,
+    RespClient,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_gcra_allows_burst_then_paces():
+    clock = FakeClock()
+    limiter = RateLimiter(InMemoryRateLimitStore(clock=clock), limit=60, burst=3)
+
+    for _ in range(3):
+        limiter.check("ip:a")
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        limiter.check("ip:a")
+    assert exc_info.value.retry_after == pytest.approx(1.0)
+    assert exc_info.value.headers["Retry-After"] == "1"
+
+    limiter.check("ip:b")
+    clock.now += 1.0
+    limiter.check("ip:a")
+
+
+def test_memory_store_evicts_idle_and_excess_keys():
+    clock = FakeClock()
+    store = InMemoryRateLimitStore(shards=1, max_keys=10, clock=clock)
+
+    for i in range(50):
+        store.acquire(f"k{i}", emission=1.0, tolerance=5.0, cost=1)
+    assert len(store) == 10
+
+    clock.now += 10
+    store.acquire("fresh", emission=1.0, tolerance=5.0, cost=1)
+    assert len(store) == 1
+
+
+def test_check_scopes_limits_each_identity_separately():
+    limiter = RateLimiter(InMemoryRateLimitStore(), limit=60, burst=1, scopes=["ip", "user"])
+
+    limiter.check_scopes(ip="1.2.3.4", user="u1", session="ignored")
+    limiter.check_scopes(ip="5.6.7.8", user="u2")
+    with pytest.raises(RateLimitExceeded):
+        limiter.check_scopes(ip="9.9.9.9", user="u1")
+
+
+class RespStandIn(socketserver.ThreadingTCPServer):
+    """Just enough of a Redis server for the GCRA script: EVALSHA/EVAL with TTL'd keys."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RespHandler)
+        self.values = {}
+        self.scripts = set()
+        self.lock = threading.Lock()
+
+    def run_gcra(self, key, emission, tolerance, cost, force):
+        # Python transcription of GCRA_SCRIPT.
+        with self.lock:
+            now = time.time()
+            value, expires = self.values.get(key, (None, 0))
+            tat = float(value) if value is not None and expires > now else now
+            tat = max(tat, now)
+            new_tat = max(tat + emission * cost, now)
+            if new_tat - tolerance > now and not force:
+                return str(new_tat - tolerance - now)
+            self.values[key] = (str(new_tat), new_tat)
+            return "0"
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            header = self.rfile.readline()
+            if not header:
+                return
+            args = []
+            for _ in range(int(header[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2].decode())
+            command = args[0].upper()
+            if command == "EVAL":
+                self.server.scripts.add(hashlib.sha1(args[1].encode()).hexdigest())
+            elif command == "EVALSHA" and args[1] not in self.server.scripts:
+                self.wfile.write(b"-NOSCRIPT No matching script\r\n")
+                continue
+            result = self.server.run_gcra(args[3], float(args[4]), float(args[5]), float(args[6]), args[7] == "1").encode()
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(result), result))
+
+
+@pytest.fixture
+def resp_server():
+    server = RespStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_redis_store_shares_limits_between_limiters(resp_server):
+    url = f"redis://127.0.0.1:{resp_server.server_address[1]}/0"
+    first = RateLimiter(RedisRateLimitStore(RespClient(url)), limit=60, burst=2)
+    second = RateLimiter(RedisRateLimitStore(RespClient(url)), limit=60, burst=2)
+
+    first.check("user:u1")
+    second.check("user:u1")
+    with pytest.raises(RateLimitExceeded):
+        first.check("user:u1")
+    assert len(resp_server.scripts) == 1
+    assert set(resp_server.values) == {"rl:user:u1"}
+
+
+def test_redis_store_fails_open_when_unreachable():
+    limiter = RateLimiter(RedisRateLimitStore(RespClient("redis://127.0.0.1:1/0")), limit=1, burst=1)
+
+    limiter.check("ip:a")
+    limiter.check("ip:a")
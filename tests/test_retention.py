@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import ast
+import importlib.util
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from app.db.models import ChatMessage
+from app.db.retention import Partition, add_months, expired_partitions
+
+
+def test_month_arithmetic_wraps_years():
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+
+
+def test_partition_naming_and_bounds():
+    partition = Partition.for_month(date(2024, 12, 17))
+
+    assert partition.name == "chat_messages_p202412"
+    assert Partition.from_name(partition.name) == partition
+    assert Partition.from_name("chat_messages_default") is None
+    assert partition.create_sql() == (
+        "CREATE TABLE IF NOT EXISTS chat_messages_p202412 PARTITION OF chat_messages "
+        "FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')"
+    )
+
+
+def test_expired_partitions_keep_whole_retention_window():
+    partitions = [Partition.for_month(date(2024, month, 1)) for month in (5, 1, 3, 4, 2)]
+
+    expired = expired_partitions(partitions, keep_months=2, today=date(2024, 5, 20))
+
+    # Cutoff is 2024-03-01: January and February are entirely older than that.
+    assert [p.name for p in expired] == ["chat_messages_p202401", "chat_messages_p202402"]
+
+
+def test_chat_messages_ddl_is_partitioned():
+    ddl = str(CreateTable(ChatMessage.__table__).compile(dialect=postgresql.dialect()))
+
+    assert "PARTITION BY RANGE (created_at)" in ddl
+    assert "PRIMARY KEY (id, created_at)" in ddl
+
+
+def test_partition_is_built_from_default_rows_before_attaching():
+    partition = Partition.for_month(date(2024, 12, 1))
+    in_range = "created_at >= '2024-12-01' AND created_at < '2025-01-01'"
+
+    assert partition.move_from_default_sql() == [
+        "CREATE TABLE chat_messages_p202412 (LIKE chat_messages INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        f"ALTER TABLE chat_messages_p202412 ADD CONSTRAINT chat_messages_p202412_range CHECK ({in_range})",
+        f"INSERT INTO chat_messages_p202412 SELECT * FROM chat_messages_default WHERE {in_range}",
+        f"DELETE FROM chat_messages_default WHERE {in_range}",
+        "ALTER TABLE chat_messages ATTACH PARTITION chat_messages_p202412 FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')",
+        "ALTER TABLE chat_messages_p202412 DROP CONSTRAINT chat_messages_p202412_range",
+    ]
+    assert partition.detach_sql(concurrently=True) == (
+        "ALTER TABLE chat_messages DETACH PARTITION chat_messages_p202412 CONCURRENTLY"
+    )
+
+
+def test_migration_creates_partitions_like_the_maintenance_job():
+    path = Path(__file__).parents[1] / "app/db/migrations/versions/0002_partition_chat_messages.py"
+    spec = importlib.util.spec_from_file_location("migration_0002", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    month = date(2024, 12, 1)
+    assert migration._create_partition_sql(month) == Partition.for_month(month).create_sql()
+    imported = [node.module for node in ast.walk(ast.parse(path.read_text())) if isinstance(node, ast.ImportFrom)]
+    assert not [module for module in imported if module.startswith("app")]
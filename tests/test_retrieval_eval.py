@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import random
+
+from app.llm.embeddings import MockEmbeddingClient
+from benchmarks import retrieval_eval, synthetic
+
+
+def test_score_recall_and_mrr():
+    truth = [["a", "b"], ["c", "d"], []]
+    found = [["b", "a"], ["d", "x"], ["z"]]
+
+    result = retrieval_eval.score(found, truth, k=2)
+
+    assert result == {"recall_at_k": 0.75, "mrr": 0.25, "evaluated": 2}
+
+
+def test_inprocess_exact_config_matches_ground_truth_and_maps_csv_chunks():
+    corpus = retrieval_eval.build_inprocess_corpus(entities=20, dim=32)
+    queries = synthetic.generate_questions(random.Random(1), corpus["entities"], 15, report_share=1.0)
+    vectors = MockEmbeddingClient(dim=32).embed_many([q["message"] for q in queries])
+    for query, vector in zip(queries, vectors):
+        query["embedding"] = vector
+    rank, exact_rank = retrieval_eval.inprocess_rankers(corpus)
+
+    report = retrieval_eval.evaluate(
+        rank, exact_rank, queries, [{"name": "exact", "k": 5}, {"name": "dims8", "k": 5, "dims": 8}]
+    )
+
+    assert report[0]["recall_at_k"] == 1.0 and report[0]["mrr"] == 1.0
+    assert report[1]["recall_at_k"] <= 1.0
+    assert report[0]["latency_ms"]["p50"] is not None
+    csv_ids = {str(doc["id"]) for doc in corpus["documents"] if doc["source_type"] == "csv"}
+    school = next(q for q in queries if q["query_type"] == "school_performance_report")
+    ranked = exact_rank(school, {"k": 20, "include_types": ["csv"]})
+    assert ranked and set(ranked) <= csv_ids
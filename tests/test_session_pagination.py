@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app import api
+from app.db.models import ChatMessage, ChatSession
+from app.main import app
+from app.services.sessions import decode_cursor, encode_cursor, load_session_page
+
+
+@pytest.fixture
+def seeded_session(engine):
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as db:
+        chat_session = ChatSession(user_id="u1")
+        db.add(chat_session)
+        db.flush()
+        start = datetime(2024, 3, 1, 9, 0)
+        for i in range(7):
+            # Two messages share each timestamp so paging has to break ties on id.
+            db.add(ChatMessage(session_id=chat_session.id, role="user", content=f"m{i}", created_at=start + timedelta(minutes=i // 2), meta={"i": i}))
+        db.commit()
+        session_id = chat_session.id
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[api.routes.get_db] = override_get_db
+    try:
+        yield SessionLocal, session_id
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 3, 1, 9, 30)
+    message_id = uuid.uuid4()
+
+    assert decode_cursor(encode_cursor(created_at, message_id)) == (created_at, message_id)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_session_page_is_one_query(engine, seeded_session):
+    SessionLocal, session_id = seeded_session
+    statements = []
+
+    @contextmanager
+    def counting():
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            yield
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+    with SessionLocal() as db, counting():
+        page = load_session_page(db, session_id, limit=3)
+
+    assert len(statements) == 1
+    assert page.session["user_id"] == "u1"
+    assert len(page.messages) == 3
+    assert page.next_cursor is not None
+
+
+def test_messages_endpoint_pages_backwards_without_gaps(seeded_session):
+    _, session_id = seeded_session
+    client = TestClient(app)
+
+    seen = []
+    before = None
+    while True:
+        params = {"limit": 3, "user_id": "u1", **({"before": before} if before else {})}
+        body = client.get(f"/v1/sessions/{session_id}/messages", params=params).json()
+        seen = [m["content"] for m in body["messages"]] + seen
+        before = body["next_cursor"]
+        if before is None:
+            break
+
+    assert sorted(seen) == [f"m{i}" for i in range(7)]
+    assert seen[-1] == "m6"
+
+
+def test_session_detail_returns_first_page(seeded_session):
+    _, session_id = seeded_session
+    client = TestClient(app)
+
+    body = client.get(f"/v1/sessions/{session_id}", params={"limit": 2, "user_id": "u1"}).json()
+
+    assert body["id"] == str(session_id)
+    assert len(body["messages"]) == 2
+    assert body["messages"][0]["created_at"] <= body["messages"][1]["created_at"]
+    assert body["next_cursor"]
+    assert client.get("/v1/sessions/00000000-0000-0000-0000-000000000000").status_code == 404
+    assert client.get(f"/v1/sessions/{session_id}/messages", params={"before": "bad", "user_id": "u1"}).status_code == 400
+
+
+def test_another_users_transcript_is_not_readable(seeded_session):
+    _, session_id = seeded_session
+    client = TestClient(app)
+
+    for path in (f"/v1/sessions/{session_id}", f"/v1/sessions/{session_id}/messages"):
+        for params in ({"user_id": "intruder"}, {}):
+            response = client.get(path, params=params)
+            assert response.status_code == 403
+            assert "messages" not in response.json()
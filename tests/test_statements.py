@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import pytest
+
+from app.db.statements import (
+    ENTITY_CANDIDATES,
+    PREPARE_OPTION,
+    SIMILARITY_SEARCH,
+    SIMILARITY_SEARCH_EXCLUDE,
+    SIMILARITY_SEARCH_INCLUDE,
+    connect_args,
+    entity_candidates_statement,
+    similarity_params,
+    similarity_statement,
+)
+
+
+def test_connect_args_per_prepare_mode():
+    url = "postgresql+psycopg://u:p@db/app"
+
+    assert connect_args(url, "auto") == {}
+    # Neither mode lets psycopg prepare arbitrary statements; server prepares only the marked ones.
+    assert connect_args(url, "server") == {"prepare_threshold": None}
+    assert connect_args(url, "transaction") == {"prepare_threshold": None}
+    assert connect_args("sqlite:///:memory:", "server") == {}
+    with pytest.raises(ValueError):
+        connect_args(url, "session")
+
+
+def test_similarity_params_keep_statement_text_fixed():
+    included = similarity_params("e1", (0.1, 0.2), 5, include_types=["web"], exclude_types=["csv"])
+    excluded = similarity_params("e1", (0.1, 0.2), 5, exclude_types=("csv",))
+    plain = similarity_params("e1", (0.1, 0.2), 5)
+
+    assert (included["include_types"], included["exclude_types"]) == (["web"], None)
+    assert (excluded["include_types"], excluded["exclude_types"]) == (None, ["csv"])
+    assert plain["query_embedding"] == [0.1, 0.2]
+    assert similarity_statement(included) is SIMILARITY_SEARCH_INCLUDE
+    assert similarity_statement(excluded) is SIMILARITY_SEARCH_EXCLUDE
+    assert similarity_statement(plain) is SIMILARITY_SEARCH
+    assert set(SIMILARITY_SEARCH.compile().params) == {"entity_id", "query_embedding", "limit"}
+    assert set(SIMILARITY_SEARCH_INCLUDE.compile().params) == {"entity_id", "query_embedding", "limit", "include_types"}
+
+
+def test_every_filter_shape_has_its_own_hot_statement():
+    statements = [SIMILARITY_SEARCH, SIMILARITY_SEARCH_INCLUDE, SIMILARITY_SEARCH_EXCLUDE, *ENTITY_CANDIDATES.values()]
+
+    assert all("IS NULL OR" not in statement.text for statement in statements)
+    assert all(statement.get_execution_options()[PREPARE_OPTION] for statement in statements)
+    assert set(entity_candidates_statement("boise", None).compile().params) == {"city", "limit"}
+    assert set(entity_candidates_statement(None, None).compile().params) == {"limit"}
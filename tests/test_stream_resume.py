@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import api
+from app.core.config import settings
+from app.main import app
+from app.services.stream_buffer import InMemoryStreamBuffer, ResumableStreams, StreamsBusy, parse_last_event_id
+
+
+def _frames(body: str):
+    frames = []
+    for block in body.split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "data" in lines:
+            frames.append((lines.get("id"), json.loads(lines["data"])))
+    return frames
+
+
+def test_buffer_replays_after_seq_and_reports_gaps():
+    buffer = InMemoryStreamBuffer(max_events=3)
+    buffer.create("s1")
+    for index in range(5):
+        buffer.append("s1", "token", str(index))
+    buffer.finish("s1")
+
+    tail = buffer.read("s1", after_seq=2, timeout=0)
+    assert [event.data for event in tail.events] == ["3", "4"]
+    assert tail.missed is None and tail.finished
+
+    gap = buffer.read("s1", after_seq=-1, timeout=0)
+    assert gap.missed == (0, 1)
+    assert [event.seq for event in gap.events] == [2, 3, 4]
+    assert buffer.read("unknown", after_seq=-1, timeout=0) is None
+
+
+def test_buffer_expires_idle_streams():
+    buffer = InMemoryStreamBuffer(ttl_seconds=0.0)
+    buffer.create("old")
+    buffer._last_sweep = 0.0
+    assert not buffer.exists("old")
+
+
+def test_subscriber_attaches_to_running_producer():
+    streams = ResumableStreams(InMemoryStreamBuffer(), heartbeat_interval=0.01)
+
+    def events():
+        yield "token", "a"
+        yield "token", "b"
+        yield "done", {"answer": "ab"}
+
+    streams.start("s2", events)
+    frames = _frames("".join(streams.subscribe("s2", after_seq=0)))
+
+    assert [frame[0] for frame in frames] == ["s2:1", "s2:2"]
+    assert frames[-1][1]["event"] == "done"
+    assert parse_last_event_id("s2:1") == ("s2", 1)
+    assert parse_last_event_id("garbage") is None
+
+
+def test_start_refuses_when_every_producer_is_busy():
+    streams = ResumableStreams(InMemoryStreamBuffer(), heartbeat_interval=0.01, max_producers=1)
+    release = threading.Event()
+
+    def blocked():
+        release.wait(5)
+        yield "done", {}
+
+    streams.start("busy", blocked)
+    with pytest.raises(StreamsBusy):
+        streams.start("refused", blocked)
+    assert not streams.exists("refused")
+    assert streams.stats() == {"producers": 1, "max_producers": 1, "rejected": 1}
+
+    release.set()
+    list(streams.subscribe("busy"))
+    assert streams.stats()["producers"] == 0
+
+
+def test_reconnect_with_last_event_id_resumes_without_regenerating(session_factory, chat_session_id, monkeypatch):
+    monkeypatch.setattr(settings, "stream_coalesce_chars", 1)
+
+    app.dependency_overrides[api.routes.get_session_factory] = lambda: session_factory
+    try:
+        client = TestClient(app)
+        body = {"session_id": chat_session_id, "message": "what time is pickup today", "stream": True}
+        first = client.post("/v1/chat", json=body)
+        frames = _frames(first.text)
+        stream_id = first.headers["X-Stream-Id"]
+        tokens = [frame for frame in frames if frame[1]["event"] == "token"]
+        resume_from = tokens[1][0]
+
+        calls = []
+        monkeypatch.setattr(api.routes.resumable_streams, "start", lambda *args: calls.append(args))
+        resumed = client.post("/v1/chat", json=body, headers={"Last-Event-ID": resume_from})
+        via_get = client.get(f"/v1/chat/streams/{stream_id}", params={"after": 0})
+        missing = client.get("/v1/chat/streams/nope")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert calls == []
+    resumed_frames = _frames(resumed.text)
+    assert resumed_frames[0][0] == f"{stream_id}:{int(resume_from.split(':')[1]) + 1}"
+    assert resumed_frames[-1][1] == frames[-1][1]
+    assert _frames(via_get.text)[-1][1]["event"] == "done"
+    assert missing.status_code == 404
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import json
+
+from fastapi.testclient import TestClient
+
+from app import api
+from app.core.config import settings
+from app.llm.embeddings import MockEmbeddingClient
+from app.llm.mock_provider import MockProvider
+from app.main import app
+from app.schemas.chat import ChatRequest
+from app.services.entity_resolver import EntityResolver
+from app.services.orchestrator import ChatOrchestrator
+from app.services.query_classifier import QueryClassifier
+from app.services.retrieval import RetrievalService
+from app.utils.sse import TokenCoalescer
+
+
+def _events(body: str):
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_token_coalescer_batches_after_first_chunk():
+    coalescer = TokenCoalescer(max_chars=10, max_delay=60)
+
+    assert coalescer.add("Hi") == "Hi"
+    assert coalescer.add(" there") is None
+    assert coalescer.add(" friend") == " there friend"
+    assert coalescer.add("!") is None
+    assert coalescer.flush() == "!"
+    assert coalescer.flush() is None
+
+
+def test_stream_sends_metadata_before_tokens(session_factory, chat_session_id, monkeypatch):
+    monkeypatch.setattr(settings, "stream_coalesce_chars", 1000)
+    monkeypatch.setattr(settings, "stream_coalesce_ms", 60_000)
+
+    app.dependency_overrides[api.routes.get_session_factory] = lambda: session_factory
+    try:
+        client = TestClient(app)
+        response = client.post("/v1/chat", json={"session_id": chat_session_id, "message": "what time is pickup", "stream": True})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    events = _events(response.text)
+    names = [event["event"] for event in events]
+    assert names.index("entity") < names.index("citations") < names.index("token")
+    assert {"stage": "entity_resolution", "status": "started"} in [e["data"] for e in events if e["event"] == "stage"]
+    # One frame for the first chunk, the rest coalesced into a single frame.
+    tokens = [event["data"] for event in events if event["event"] == "token"]
+    assert len(tokens) == 2
+    done = events[-1]
+    assert done["event"] == "done"
+    assert done["data"]["answer"] == "".join(tokens)
+
+
+def test_stream_for_unknown_session_is_404(session_factory):
+    app.dependency_overrides[api.routes.get_session_factory] = lambda: session_factory
+    try:
+        response = TestClient(app).post(
+            "/v1/chat", json={"session_id": "00000000-0000-0000-0000-000000000000", "message": "hi", "stream": True}
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 404
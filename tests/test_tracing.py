@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from app.core import tracing
+from app.llm.base import LLMMessage
+from app.llm.embeddings import MockEmbeddingClient
+from app.llm.mock_provider import MockProvider
+from app.llm.routing import ModelRoute
+from app.schemas.chat import ChatRequest
+from app.services.entity_resolver import EntityResolver
+from app.services.orchestrator import ChatOrchestrator
+from app.services.query_classifier import QueryClassifier
+from app.services.retrieval import RetrievalService
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(tracing, "_tracer", provider.get_tracer("test"))
+    return exporter
+
+
+def test_span_is_shared_noop_when_disabled():
+    assert tracing._tracer is None
+    with tracing.span("anything", {"a": 1}) as current:
+        current.set_attribute("b", 2)
+    assert tracing.span("other") is tracing.start_span("other")
+
+
+def test_llm_span_carries_model_and_token_counts(exporter):
+    route = ModelRoute(name="default", stage="answer", model="mock-model", temperature=0.0, max_tokens=64)
+    route.generate(MockProvider(), [LLMMessage(role="user", content="hello there")])
+
+    (finished,) = exporter.get_finished_spans()
+    assert finished.name == "llm.generate"
+    assert finished.attributes["llm.model"] == "mock-model"
+    assert finished.attributes["llm.completion_tokens"] > 0
+
+
+def test_sql_statements_are_child_spans(exporter):
+    engine = create_engine("sqlite:///:memory:")
+    tracing.instrument_engine(engine)
+
+    with tracing.span("parent"), engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    assert spans["db.query"].attributes["db.statement"] == "SELECT 1"
+    assert spans["db.query"].parent.span_id == spans["parent"].context.span_id
+
+
+def test_stream_emits_stage_and_llm_spans(exporter, db_session, chat_session_id):
+    orchestrator = ChatOrchestrator(
+        entity_resolver=EntityResolver(),
+        retrieval_service=RetrievalService(),
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=MockProvider(),
+        embedding_client=MockEmbeddingClient(),
+    )
+    list(orchestrator.stream_events(db_session, ChatRequest(session_id=chat_session_id, message="hello")))
+
+    names = {s.name for s in exporter.get_finished_spans()}
+    assert {"chat.entity_resolution", "chat.retrieval", "chat.history", "llm.stream"} <= names
+
+
+def test_request_span_continues_incoming_trace(exporter):
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        with tracing.span("inner"):
+            return {"ok": True}
+
+    tracing._instrument_requests(app)
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    response = TestClient(app).get("/ping", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+
+    assert response.status_code == 200
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    assert format(spans["GET /ping"].context.trace_id, "032x") == trace_id
+    assert spans["GET /ping"].attributes["http.status_code"] == 200
+    assert spans["inner"].context.trace_id == spans["GET /ping"].context.trace_id
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app import api
+from app.core.config import settings
+from app.db.models import ChatSession, Entity
+from app.llm.embeddings import MockEmbeddingClient
+from app.llm.mock_provider import MockProvider
+from app.main import app
+from app.services.entity_resolver import EntityResolver
+from app.services.orchestrator import ChatOrchestrator
+from app.services.query_classifier import QueryClassifier
+
+
+class StubRetrieval:
+    def __init__(self):
+        self.calls = 0
+
+    def fetch_documents_by_similarity(self, session, entity_id, query, embedding_client, limit=10, query_embedding=None, **kwargs):
+        self.calls += 1
+        return [{"id": f"{entity_id}-doc", "title": "Menu", "source_url": None, "content": "Pizza on Friday."}]
+
+
+@pytest.fixture
+def ws_app(session_factory):
+    with session_factory() as db:
+        db.add(Entity(name="Lakeside Socket School", entity_type="school", city="Duluth", state="MN", slug="lakeside-socket", meta={}))
+        chat_session = ChatSession(user_id="u1")
+        db.add(chat_session)
+        db.flush()
+        session_id = str(chat_session.id)
+
+    retrieval = StubRetrieval()
+    orchestrator = ChatOrchestrator(
+        entity_resolver=EntityResolver(score_cutoff=50),
+        retrieval_service=retrieval,
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=MockProvider.from_settings(),
+        embedding_client=MockEmbeddingClient(),
+    )
+    app.dependency_overrides[api.routes.get_session_factory] = lambda: session_factory
+    app.dependency_overrides[api.routes.get_orchestrator] = lambda: orchestrator
+    try:
+        yield TestClient(app), session_id, retrieval
+    finally:
+        app.dependency_overrides.clear()
+
+
+def _turn(ws):
+    turn_id = ws.receive_json()["turn_id"]
+    events = []
+    while True:
+        message = ws.receive_json()
+        assert message["turn_id"] == turn_id
+        events.append((message["event"], message["data"]))
+        if message["event"] in ("done", "error", "cancelled"):
+            return events
+
+
+def test_websocket_runs_turns_with_warm_context(ws_app):
+    client, session_id, retrieval = ws_app
+    with client.websocket_connect("/v1/ws/chat") as ws:
+        ws.send_json({"type": "bind", "session_id": session_id, "user_id": "u1"})
+        assert ws.receive_json()["type"] == "bound"
+
+        ws.send_json({"type": "chat", "message": "lakeside socket school lunch", "city": "Duluth"})
+        first = _turn(ws)
+        ws.send_json({"type": "chat", "message": "what about pickup?", "city": "Duluth"})
+        second = _turn(ws)
+        ws.send_json({"type": "chat", "message": "what about pickup?", "city": "Duluth"})
+        _turn(ws)
+
+    entities = [dict(first)["entity"]["entity"], dict(second)["entity"]["entity"]]
+    assert entities[0]["name"] == "Lakeside Socket School"
+    # The follow-up names no school and stays on the entity from the first turn.
+    assert entities[1] == entities[0]
+    assert first[-1][0] == second[-1][0] == "done"
+    # The repeated question is served from the connection's retrieval cache.
+    assert retrieval.calls == 2
+
+
+def test_websocket_rejects_unknown_session_and_wrong_user(ws_app):
+    client, session_id, _ = ws_app
+    with client.websocket_connect("/v1/ws/chat") as ws:
+        ws.send_json({"type": "bind", "session_id": "00000000-0000-0000-0000-000000000000"})
+        assert ws.receive_json()["status"] == 404
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == 4404
+
+    with client.websocket_connect("/v1/ws/chat") as ws:
+        ws.send_json({"type": "bind", "session_id": session_id, "user_id": "someone-else"})
+        assert ws.receive_json()["status"] == 403
+
+
+def test_websocket_cancels_generation(ws_app, monkeypatch):
+    monkeypatch.setattr(settings, "mock_llm_tokens_per_second", 20.0)
+    client, session_id, _ = ws_app
+    app.dependency_overrides[api.routes.get_orchestrator] = lambda: ChatOrchestrator(
+        entity_resolver=EntityResolver(score_cutoff=50),
+        retrieval_service=StubRetrieval(),
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=MockProvider.from_settings(),
+        embedding_client=MockEmbeddingClient(),
+    )
+    with client.websocket_connect("/v1/ws/chat") as ws:
+        ws.send_json({"type": "bind", "session_id": session_id, "user_id": "u1"})
+        ws.receive_json()
+        ws.send_json({"type": "chat", "message": "lakeside socket school " + "tell me everything " * 20})
+        turn_id = ws.receive_json()["turn_id"]
+        while ws.receive_json()["event"] != "token":
+            pass
+        ws.send_json({"type": "cancel"})
+        events = []
+        while True:
+            message = ws.receive_json()
+            events.append(message["event"])
+            if message["event"] in ("done", "cancelled"):
+                break
+
+        assert events[-1] == "cancelled"
+        assert message["turn_id"] == turn_id
+        # The connection stays usable after a cancelled turn.
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json()["status"] == 400
+
+
+def test_websocket_rejects_malformed_deadline_and_keeps_the_connection(ws_app):
+    client, session_id, _ = ws_app
+    with client.websocket_connect("/v1/ws/chat") as ws:
+        ws.send_json({"type": "bind", "session_id": session_id, "user_id": "u1"})
+        ws.receive_json()
+        for bad in ("5000", "abc", 1.5):
+            ws.send_json({"type": "chat", "message": "lakeside socket school lunch", "deadline_ms": bad})
+            error = ws.receive_json()
+            assert error["type"] == "error"
+            assert error["status"] == 422
+
+        ws.send_json({"type": "chat", "message": "lakeside socket school lunch", "deadline_ms": 5000})
+        assert _turn(ws)[-1][0] == "done"
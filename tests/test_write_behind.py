@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import select
+
+from app.db.models import ChatMessage, ChatSession, SessionState
+from app.db.writer import MessageWrite, StateWrite, WriteBehindWriter
+from app.llm.embeddings import MockEmbeddingClient
+from app.llm.mock_provider import MockProvider, MockProviderError
+from app.schemas.chat import ChatRequest
+from app.services.entity_resolver import EntityResolver
+from app.services.orchestrator import ChatOrchestrator
+from app.services.query_classifier import QueryClassifier
+from app.services.retrieval import RetrievalService
+from app.services.sessions import SessionAccessDenied
+
+
+def _new_session(session_factory, user_id=None) -> uuid.UUID:
+    with session_factory() as db:
+        chat_session = ChatSession(user_id=user_id)
+        db.add(chat_session)
+        db.flush()
+        return chat_session.id
+
+
+def test_writer_batches_messages_and_merges_state(session_factory):
+    session_id = _new_session(session_factory)
+    writer = WriteBehindWriter(session_factory, batch_size=100, flush_interval=60)
+
+    writer.enqueue(
+        MessageWrite(session_id=session_id, role="user", content="hi"),
+        StateWrite(session_id=session_id, patch={"entity_id": "e1", "turns": 1}),
+    )
+    writer.enqueue(StateWrite(session_id=session_id, patch={"turns": 2}))
+    assert writer.stats()["pending"] == 3
+    writer.flush()
+    writer.enqueue(StateWrite(session_id=session_id, patch={"last_message_id": "m1"}))
+    assert writer.close(timeout=5)
+
+    with session_factory() as db:
+        assert [m.content for m in db.scalars(select(ChatMessage).where(ChatMessage.session_id == session_id))] == ["hi"]
+        assert db.get(SessionState, session_id).state == {"entity_id": "e1", "turns": 2, "last_message_id": "m1"}
+    stats = writer.stats()
+    assert stats["pending"] == 0
+    assert stats["written"] == 4
+    assert stats["batches"] == 2
+
+
+def test_writer_flushes_inline_when_queue_is_full(session_factory):
+    session_id = _new_session(session_factory)
+    writer = WriteBehindWriter(session_factory, batch_size=2, flush_interval=60, max_queue=2)
+    # Hold the worker off so only the callers can drain the queue.
+    writer._ensure_worker_locked = lambda: None
+
+    for i in range(5):
+        writer.enqueue(MessageWrite(session_id=session_id, role="user", content=f"m{i}"))
+
+    assert writer.stats()["pending"] <= 2
+    assert writer.stats()["inline_flushes"] == 2
+    writer.flush()
+    with session_factory() as db:
+        rows = db.scalars(select(ChatMessage).where(ChatMessage.session_id == session_id).order_by(ChatMessage.created_at))
+        assert [m.content for m in rows] == [f"m{i}" for i in range(5)]
+
+
+def test_writer_isolates_failing_rows(session_factory):
+    session_id = _new_session(session_factory)
+    writer = WriteBehindWriter(session_factory, batch_size=10, flush_interval=60)
+
+    writer.enqueue(
+        MessageWrite(session_id=session_id, role="user", content="ok"),
+        MessageWrite(session_id=session_id, role=None, content="missing role"),
+    )
+    writer.close(timeout=5)
+
+    stats = writer.stats()
+    assert stats["failed"] == 1
+    assert stats["written"] == 1
+
+
+def test_writer_retries_a_failed_batch_before_dropping_rows(session_factory):
+    session_id = _new_session(session_factory)
+    attempts = []
+
+    @contextmanager
+    def flaky_factory():
+        attempts.append(1)
+        if len(attempts) <= 2:
+            raise ConnectionError("database restarting")
+        with session_factory() as db:
+            yield db
+
+    writer = WriteBehindWriter(flaky_factory, batch_size=10, flush_interval=60, retry_backoff=0.01)
+    writer.enqueue(
+        MessageWrite(session_id=session_id, role="user", content="first"),
+        MessageWrite(session_id=session_id, role="assistant", content="second"),
+    )
+    writer.flush()
+
+    stats = writer.stats()
+    assert (stats["written"], stats["failed"], stats["retried_batches"]) == (2, 0, 2)
+    with session_factory() as db:
+        contents = db.scalars(select(ChatMessage.content).where(ChatMessage.session_id == session_id)).all()
+    assert sorted(contents) == ["first", "second"]
+
+
+def test_handle_chat_queues_turn(session_factory):
+    session_id = _new_session(session_factory)
+    writer = WriteBehindWriter(session_factory, batch_size=100, flush_interval=60)
+    orchestrator = ChatOrchestrator(
+        entity_resolver=EntityResolver(),
+        retrieval_service=RetrievalService(),
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=MockProvider(),
+        embedding_client=MockEmbeddingClient(),
+        writer=writer,
+    )
+
+    with session_factory() as db:
+        response = orchestrator.handle_chat(db, ChatRequest(session_id=str(session_id), user_id="u7", message="hello"))
+    # The owner is claimed on the request path; the turn queues two messages and a state patch.
+    assert writer.stats()["pending"] == 3
+    writer.flush()
+
+    with session_factory() as db:
+        messages = db.scalars(
+            select(ChatMessage).where(ChatMessage.session_id == session_id).order_by(ChatMessage.created_at)
+        ).all()
+        assert [(m.role, m.content) for m in messages] == [("user", "hello"), ("assistant", response.answer)]
+        assert messages[1].meta["provider"] == "mock"
+        assert db.get(SessionState, session_id).state["last_message_id"] == str(messages[1].id)
+        assert db.get(ChatSession, session_id).user_id == "u7"
+
+
+def test_handle_chat_refuses_unknown_or_foreign_sessions_without_queueing(session_factory):
+    owned = _new_session(session_factory, user_id="owner")
+    writer = WriteBehindWriter(session_factory, batch_size=100, flush_interval=60)
+    orchestrator = ChatOrchestrator(
+        entity_resolver=EntityResolver(),
+        retrieval_service=RetrievalService(),
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=MockProvider(),
+        embedding_client=MockEmbeddingClient(),
+        writer=writer,
+    )
+
+    with session_factory() as db:
+        with pytest.raises(SessionAccessDenied) as missing:
+            orchestrator.handle_chat(db, ChatRequest(session_id=str(uuid.uuid4()), user_id="u1", message="hi"))
+        with pytest.raises(SessionAccessDenied) as foreign:
+            orchestrator.handle_chat(db, ChatRequest(session_id=str(owned), user_id="intruder", message="hi"))
+
+    assert (missing.value.status_code, foreign.value.status_code) == (404, 403)
+    assert writer.stats()["pending"] == 0
+
+
+def test_failed_generation_still_records_the_question(session_factory):
+    session_id = _new_session(session_factory)
+    writer = WriteBehindWriter(session_factory, batch_size=100, flush_interval=60)
+    orchestrator = ChatOrchestrator(
+        entity_resolver=EntityResolver(),
+        retrieval_service=RetrievalService(),
+        query_classifier=QueryClassifier(MockProvider()),
+        llm_client=MockProvider(error_rate=1.0),
+        embedding_client=MockEmbeddingClient(),
+        writer=writer,
+    )
+
+    with session_factory() as db, pytest.raises(MockProviderError):
+        orchestrator.handle_chat(db, ChatRequest(session_id=str(session_id), message="are you there"))
+    writer.flush()
+
+    with session_factory() as db:
+        messages = db.scalars(select(ChatMessage).where(ChatMessage.session_id == session_id)).all()
+        assert [(m.role, m.content) for m in messages] == [("user", "are you there")]